@@ -1,74 +1,309 @@
+import os
 import streamlit as st
 import pandas as pd
 import gspread
 from google.oauth2.service_account import Credentials
 from datetime import datetime, timedelta
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, every process may refresh the snapshot
+    fcntl = None
+from cities import cities
+from snapshot import SNAPSHOT_DIR, read_manifest, read_snapshot, write_snapshot
+from dashboard_data import (AlertIndex, BackgroundRefresher, CityPanel, CityStore, add_display_columns,
+                            add_local_time, compact_frame, group_index, local_wall_clock)
+from dashboard_queries import WeatherQueries
+from dashboard_render import card_grid, summary_panel
+from dashboard_charts import comparison_figure, history_figure, hourly_figure, trend_figure
+from dashboard_profiler import RerunProfiler, breakdown_html, profiling_requested
 
 # --- 1. PAGE CONFIGURATION ---
 st.set_page_config(page_title="Weather Operations Dashboard", layout="wide", initial_sidebar_state="collapsed")
 
-# --- 2. WEATHER ICONS & SESSION STATE ---
-weather_icons = {
-    "clouds": "☁️", "rain": "🌧️", "clear": "☀️", "thunderstorm": "⛈️",
-    "snow": "❄️", "drizzle": "🌦️", "mist": "🌫️", "fog": "🌫️", "haze": "🌫️",
-    "smoke": "🌫️", "dust": "💨", "sand": "💨", "ash": "🌋", "squall": "🌬️", "tornado": "🌪️",
-    "clear sky": "☀️", "few clouds": "🌤️", "scattered clouds": "⛅", "broken clouds": "☁️",
-    "overcast clouds": "🌥️", "shower rain": "🌦️", "light rain": "🌦️", "moderate rain": "🌧️",
-}
-
+# --- 2. SESSION STATE ---
 if 'page' not in st.session_state:
     st.session_state.page = 'General Dashboard'
 if 'selected_city' not in st.session_state:
     st.session_state.selected_city = None
+# Opt-in rerun profiling (?profile=1 or [dashboard] profile = true in the secrets); sticky for the session
+if not st.session_state.get('profile'):
+    st.session_state.profile = profiling_requested(st.query_params, st.secrets)
+profiler = RerunProfiler(st.session_state.profile)
 
 # --- 3. DATA LOADING ---
-@st.cache_data(ttl=600)
+DASHBOARD_TZ = 'America/Mexico_City'  # Only for cities without a zone in cities.py
+CITY_TIMEZONES = {city: coords[2] for city, coords in cities.items()}
+SHEETS_PROBE_SECONDS = 60
+FIGURE_CACHE_ENTRIES = 256
+HISTORY_RANGES = [3, 7, 14, 30]  # Days of hourly history ending with the selected date
+# City comparison: metric -> (axis title, aggregation when resampled), and resolution -> pandas rule
+COMPARISON_METRICS = {'temp': ("Temperature (°C)", "mean"), 'rain_probability': ("Rain Probability (%)", "max")}
+RESOLUTIONS = {"Hourly": None, "3 hours": "3h", "Daily": "D"}
+MAX_COMPARISON_CITIES = 50
+
+def load_from_snapshot():
+    """
+    Attach to the shared Arrow snapshot (zero-copy memory map, so every session and process reads the
+    same pages). Returns None if there is none yet.
+    """
+    result = read_snapshot()
+    if result is None:
+        return None
+    data_dict, _ = result
+    return data_dict
+
+@st.cache_resource
+def get_spreadsheet():
+    creds_dict = st.secrets["gcp_service_account"]
+    creds = Credentials.from_service_account_info(creds_dict, scopes=["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"])
+    client = gspread.authorize(creds)
+    return client.open("Weather_Dashboard")
+
+def load_from_sheets():
+    spreadsheet = get_spreadsheet()
+    data_dict = {}
+    sheets_to_load = {"daily": "Data", "hourly": "Hourly Forecast", "alerts": "Weather Alerts", "clusters": "City_Team_Cluster"}
+    for key, name in sheets_to_load.items():
+        ws = spreadsheet.worksheet(name)
+        df = pd.DataFrame(ws.get_all_records())
+        data_dict[key] = df
+
+    # Data Type and Timezone Processing
+    daily_df = data_dict['daily']
+    daily_df["date"] = pd.to_datetime(daily_df["date"]).dt.date
+    numeric_cols_daily = ["temp", "feels_like", "humidity", "rain_probability", "wind_speed", "total_rain_mm", "temp_max", "temp_min", "uvi"]
+    for col in numeric_cols_daily: daily_df[col] = pd.to_numeric(daily_df[col], errors='coerce')
+    data_dict['daily'] = daily_df
+
+    hourly_df = data_dict['hourly']
+    hourly_df["forecast_time"] = pd.to_datetime(hourly_df["forecast_time"]).dt.tz_localize('UTC')
+    numeric_cols_hourly = ["temp", "feels_like", "humidity", "rain_probability", "rain_1h", "wind_speed"]
+    for col in numeric_cols_hourly: hourly_df[col] = pd.to_numeric(hourly_df[col], errors='coerce')
+    data_dict['hourly'] = hourly_df
+
+    alerts_df = data_dict['alerts']
+    if not alerts_df.empty and 'start_time' in alerts_df.columns:
+        alerts_df["start_time"] = pd.to_datetime(alerts_df["start_time"]).dt.tz_localize('UTC')
+        alerts_df["end_time"] = pd.to_datetime(alerts_df["end_time"]).dt.tz_localize('UTC')
+    data_dict['alerts'] = alerts_df
+
+    return data_dict
+
+def build_indexes(data_dict):
+    # Compact dtypes first (categoricals, float32, int8, datetime64) so every derived structure shares them
+    for name, table in list(data_dict.items()):
+        if isinstance(table, pd.DataFrame):
+            data_dict[name] = compact_frame(table)
+    # Icons and display strings are resolved once per data version, not per card on every rerun
+    data_dict['daily'] = add_display_columns(data_dict['daily'])
+    # Times are UTC; alerts and hourly rows get each city's own wall clock once here, one pass per time zone
+    alerts = data_dict['alerts']
+    if not alerts.empty and 'start_time' in alerts.columns:
+        alerts = alerts.assign(**{col: local_wall_clock(alerts[col], alerts['city'], CITY_TIMEZONES, DASHBOARD_TZ)
+                                  for col in ("start_time", "end_time")})
+    data_dict['alerts'] = alerts
+    data_dict['alert_index'] = AlertIndex(alerts)
+    data_dict['daily_by_city'] = CityStore(data_dict['daily'], 'date')
+    # The hourly table is only read per city, so only the partitioned copy is kept; local days are row ranges
+    hourly = add_local_time(data_dict.pop('hourly'), 'forecast_time', CITY_TIMEZONES, DASHBOARD_TZ)
+    data_dict['hourly_by_city'] = CityStore(hourly, 'forecast_time', day_col='local_date')
+    # Column-per-city matrices of the same rows for the comparison view
+    data_dict['hourly_panel'] = CityPanel(hourly, 'forecast_time', list(COMPARISON_METRICS))
+    # Merged with the clusters and sorted by rain once, so each overview is a filtered slice already in card order
+    data_dict['daily_merged'] = compact_frame(pd.merge(data_dict['daily'], data_dict['clusters'], on="city", how="left").sort_values(
+        "rain_probability", ascending=False, kind="stable", ignore_index=True))
+    # Group summaries and top-N rankings materialized by the extractor (absent when loading from Sheets)
+    group_keys = ["date", "country_code", "team", "cluster"]
+    summary = data_dict.pop('summary', None)
+    data_dict['summary_index'] = {} if summary is None else {
+        tuple(key): row for key, row in zip(summary[group_keys].itertuples(index=False), summary.to_dict("records"))}
+    data_dict['rankings_index'] = group_index(data_dict.pop('rankings', None), group_keys)
+    return data_dict
+
+@st.cache_data(ttl=SHEETS_PROBE_SECONDS, show_spinner=False)
+def sheets_version():
+    return get_spreadsheet().get_lastUpdateTime()
+
+def data_version():
+    """
+    Cheap freshness probe run on every rerun. An extractor-published snapshot is the source of truth;
+    otherwise the spreadsheet's last update decides, and the snapshot is only a shared copy of it.
+    """
+    manifest = read_manifest()
+    if manifest is not None and manifest.get("source", "extractor") != "sheets":
+        return ("snapshot", manifest["version"])
+    try:
+        return ("sheets", str(sheets_version()))
+    except Exception:
+        return None if manifest is None else ("snapshot", manifest["version"])
+
+def publish_sheets_snapshot(version):
+    """
+    Make sure the shared snapshot holds the spreadsheet at `version`. Only one process reads Sheets per
+    version: the others wait on the lock, then find the manifest already current and just attach to it.
+    """
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    with open(os.path.join(SNAPSHOT_DIR, ".refresh.lock"), "w") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        manifest = read_manifest()
+        if manifest is None or manifest["version"] != version:
+            write_snapshot(load_from_sheets(), version=version, source="sheets")
+
+def load_data(version):
+    # Runs in a background thread on refreshes, so problems are reported through the returned dict
+    warning = None
+    try:
+        if version is not None and version[0] == "sheets":
+            publish_sheets_snapshot(version[1])
+        data_dict = load_from_snapshot()
+        if data_dict is not None:
+            data_dict['version'] = version
+            return build_indexes(data_dict)
+    except Exception as e:
+        warning = f"Could not use the shared data snapshot, loading Google Sheets directly: {e}"
+    data_dict = build_indexes(load_from_sheets())
+    data_dict['version'] = version
+    data_dict['load_warning'] = warning
+    return data_dict
+
+@st.cache_resource
+def get_refresher():
+    # Shared by all sessions: everyone is served the same tables until the data version moves
+    return BackgroundRefresher(load_data)
+
 def load_all_data():
+    refresher = get_refresher()
     try:
-        creds_dict = st.secrets["gcp_service_account"]
-        creds = Credentials.from_service_account_info(creds_dict, scopes=["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"])
-        client = gspread.authorize(creds)
-        spreadsheet = client.open("Weather_Dashboard")
-        data_dict = {}
-        sheets_to_load = {"daily": "Data", "hourly": "Hourly Forecast", "alerts": "Weather Alerts", "clusters": "City_Team_Cluster"}
-        for key, name in sheets_to_load.items():
-            ws = spreadsheet.worksheet(name)
-            df = pd.DataFrame(ws.get_all_records())
-            data_dict[key] = df
-        
-        # Data Type and Timezone Processing
-        daily_df = data_dict['daily']
-        daily_df["date"] = pd.to_datetime(daily_df["date"]).dt.date
-        numeric_cols_daily = ["temp", "feels_like", "humidity", "rain_probability", "wind_speed", "total_rain_mm", "temp_max", "temp_min", "uvi"]
-        for col in numeric_cols_daily: daily_df[col] = pd.to_numeric(daily_df[col], errors='coerce')
-        data_dict['daily'] = daily_df
-        
-        hourly_df = data_dict['hourly']
-        hourly_df["forecast_time"] = pd.to_datetime(hourly_df["forecast_time"]).dt.tz_localize('UTC').dt.tz_convert('America/Mexico_City')
-        numeric_cols_hourly = ["temp", "feels_like", "humidity", "rain_probability", "rain_1h", "wind_speed"]
-        for col in numeric_cols_hourly: hourly_df[col] = pd.to_numeric(hourly_df[col], errors='coerce')
-        data_dict['hourly'] = hourly_df
-        
-        alerts_df = data_dict['alerts']
-        if not alerts_df.empty and 'start_time' in alerts_df.columns:
-            alerts_df["start_time"] = pd.to_datetime(alerts_df["start_time"]).dt.tz_localize('UTC').dt.tz_convert('America/Mexico_City')
-            alerts_df["end_time"] = pd.to_datetime(alerts_df["end_time"]).dt.tz_localize('UTC').dt.tz_convert('America/Mexico_City')
-        data_dict['alerts'] = alerts_df
-        
-        return data_dict
+        data_dict = refresher.get(data_version())
     except Exception as e:
         st.error(f"❌ Error loading data from Google Sheets: {e}")
         return None
+    if data_dict.get('load_warning'):
+        st.warning(f"⚠️ {data_dict['load_warning']}")
+    if refresher.error is not None:
+        st.warning(f"⚠️ Could not refresh the data, showing the previous version: {refresher.error}")
+    elif refresher.loading is not None:
+        st.caption("🔄 Newer data is loading; showing the previous version until it is ready.")
+    return data_dict
+
+@st.cache_resource
+def get_queries():
+    """Pooled prepared-statement access to Postgres when WEATHER_PG_DSN is set; None keeps the in-memory lookups."""
+    try:
+        return WeatherQueries.from_env()
+    except Exception as e:
+        st.warning(f"⚠️ Could not connect to the weather database, using the loaded tables: {e}")
+        return None
+
+def city_overview(day, country, team, cluster):
+    queries = get_queries()
+    if queries:
+        return add_display_columns(queries.overview(day, country, team, cluster))
+    df = daily_df_merged[daily_df_merged["date"] == pd.Timestamp(day)]
+    if country != "All": df = df[df["country_code"] == country]
+    if team != "All": df = df[df["team"] == team]
+    if cluster != "All": df = df[df["cluster"] == cluster]
+    return df
+
+def group_summary(day, country, team, cluster):
+    """(summary row or None, top-N rankings) for one filter combination, as materialized by the extractor."""
+    queries = get_queries()
+    if queries:
+        try:
+            return queries.group_summary(day, country, team, cluster), queries.rankings(day, country, team, cluster)
+        except Exception:
+            return None, None  # summary tables not materialized yet
+    key = (pd.Timestamp(day), country, team, cluster)
+    return all_data['summary_index'].get(key), all_data['rankings_index'].get(key)
+
+def daily_window(city, start, days):
+    queries = get_queries()
+    if queries:
+        return add_display_columns(queries.daily_window(city, start, start + timedelta(days=days)))
+    return all_data['daily_by_city'].window(city, start=start).head(days)
+
+def city_timezone(city):
+    return CITY_TIMEZONES.get(city, DASHBOARD_TZ)
+
+def hourly_range(city, first_day, end_day):
+    """Hourly rows for `city` from local midnight of `first_day` to local midnight of `end_day`."""
+    start = pd.Timestamp(first_day).tz_localize(city_timezone(city))
+    end = pd.Timestamp(end_day).tz_localize(city_timezone(city))
+    queries = get_queries()
+    if queries:
+        df = queries.hourly_window(city, start, end)
+        df = df.assign(forecast_time=pd.to_datetime(df["forecast_time"]).dt.tz_localize('UTC'))
+        return add_local_time(df, 'forecast_time', CITY_TIMEZONES, DASHBOARD_TZ)
+    return all_data['hourly_by_city'].window(city, start, end)
+
+def hourly_day(city, day):
+    """Hourly rows for `city` on its own local calendar `day`, with local_time/local_date columns."""
+    if get_queries():
+        return hourly_range(city, day, day + timedelta(days=1))
+    return all_data['hourly_by_city'].day(city, day)
+
+def figure_version():
+    """Data version the figures are memoized under: the loaded tables', plus the database's when it serves the rows."""
+    queries = get_queries()
+    return all_data['version'], queries.data_version() if queries else None
+
+# Figures are built once per (city, date, data version) and shared by every rerun and session; None without rows
+@st.cache_resource(max_entries=FIGURE_CACHE_ENTRIES, show_spinner=False)
+def hourly_chart(city, day, version):
+    df = hourly_day(city, day)
+    return None if df.empty else hourly_figure(df, city_timezone(city))
+
+@st.cache_resource(max_entries=FIGURE_CACHE_ENTRIES, show_spinner=False)
+def trend_chart(city, day, version):
+    df = daily_window(city, day, 8)
+    return None if df.empty else trend_figure(df)
+
+@st.cache_resource(max_entries=FIGURE_CACHE_ENTRIES, show_spinner=False)
+def history_chart(city, day, days, version):
+    # Weeks of hours are downsampled (LTTB), so the chart payload is bounded whatever the range
+    df = hourly_range(city, day - timedelta(days=days - 1), day + timedelta(days=1))
+    return None if df.empty else history_figure(df, city_timezone(city))
+
+def comparison_zone(selected):
+    """The cities' shared time zone, or UTC when they span several."""
+    zones = {city_timezone(city) for city in selected}
+    return zones.pop() if len(zones) == 1 else 'UTC'
+
+@st.cache_resource(max_entries=FIGURE_CACHE_ENTRIES, show_spinner=False)
+def comparison_chart(selected, first_day, last_day, metric, resolution, version):
+    # Resampled server side from the wide matrices: the browser gets at most one point per bucket and city
+    tz = comparison_zone(selected)
+    y_title, how = COMPARISON_METRICS[metric]
+    df = all_data['hourly_panel'].frame(list(selected), metric, pd.Timestamp(first_day).tz_localize(tz),
+                                        (pd.Timestamp(last_day) + timedelta(days=1)).tz_localize(tz),
+                                        rule=RESOLUTIONS[resolution], how=how, tz=tz)
+    if df.empty or df.isna().all().all():
+        return None
+    return comparison_figure(df, f"{y_title} ({resolution.lower()})", y_title, tz)
 
 # --- 4. MAIN LOGIC ---
 all_data = load_all_data()
+profiler.lap("load_data")
 
 def set_page(page_name, city_name=None):
     st.session_state.page = page_name
     st.session_state.selected_city = city_name
 
+def show_profile(run_profiler):
+    record = run_profiler.finish()
+    if record:
+        with st.expander(f"⏱️ Rerun profile: {record['total'] * 1000:.0f} ms", expanded=True):
+            st.markdown(breakdown_html(record), unsafe_allow_html=True)
+
+def detail_link_params():
+    # The "Details" links reload the page into a new session; the profiling flag travels in the URL
+    return {"profile": "1"} if st.session_state.profile else {}
+
+# The "Details" links of the overview cards navigate with ?city=<name>
+if "city" in st.query_params:
+    set_page('Detailed Analysis', st.query_params.pop("city"))
+
 # --- HEADER BAR ---
 header = st.container()
 with header:
@@ -77,9 +312,13 @@ with header:
         if st.button("🏠 General Dashboard", use_container_width=True):
             set_page('General Dashboard', None)
             st.rerun()
+    with cols[2]:
+        if st.button("📊 Compare Cities", use_container_width=True):
+            set_page('City Comparison', None)
+            st.rerun()
     if all_data:
         with cols[1]:
-            daily_df_merged = pd.merge(all_data['daily'], all_data['clusters'], on="city", how="left")
+            daily_df_merged = all_data['daily_merged']
             all_cities = [""] + sorted(daily_df_merged['city'].unique().tolist())
             current_city_index = all_cities.index(st.session_state.selected_city) if st.session_state.selected_city in all_cities else 0
             search_city = st.selectbox("Search for a city...", all_cities, index=current_city_index, label_visibility="collapsed", placeholder="Type to search for a city...")
@@ -88,10 +327,14 @@ with header:
                 st.rerun()
 
 st.markdown("---")
+profiler.lap("header")
 
 # --- VIEW 1: GENERAL DASHBOARD ---
-if st.session_state.page == 'General Dashboard' and all_data:
-    st.title("🌍 General Weather Dashboard")
+@st.fragment
+def general_dashboard():
+    # A fragment: changing a filter reruns only the filters and the card grid
+    # On a fragment-only rerun this is a profiler of its own; on a full run, the script's
+    prof = profiler.fragment("general_dashboard")
     with st.expander("🔍 Show Advanced Filters"):
         filter_cols = st.columns(4)
         with filter_cols[0]: selected_date_main = st.date_input("📅 Date", datetime.today().date())
@@ -104,49 +347,37 @@ if st.session_state.page == 'General Dashboard' and all_data:
         with filter_cols[3]:
             clusters = ["All"] + sorted(daily_df_merged['cluster'].dropna().unique().tolist())
             selected_cluster = st.selectbox("📍 Cluster", clusters)
+    prof.lap("filters")
 
-    filtered_df = daily_df_merged[daily_df_merged["date"] == selected_date_main]
-    if selected_country != "All": filtered_df = filtered_df[filtered_df["country_code"] == selected_country]
-    if selected_team != "All": filtered_df = filtered_df[filtered_df["team"] == selected_team]
-    if selected_cluster != "All": filtered_df = filtered_df[filtered_df["cluster"] == selected_cluster]
+    filtered_df = city_overview(selected_date_main, selected_country, selected_team, selected_cluster)
+    prof.lap("city_overview")
     
+    summary, rankings = group_summary(selected_date_main, selected_country, selected_team, selected_cluster)
+    if summary is not None or rankings is not None:
+        st.subheader("⚠️ Top Risk Cities")
+        st.markdown(summary_panel(summary, rankings, link_params=detail_link_params()), unsafe_allow_html=True)
+    prof.lap("summary_panel")
+
     st.subheader(f"🏙️ City Overview for {selected_date_main.strftime('%b %d, %Y')}")
     if not filtered_df.empty:
-        weather_df_sorted = filtered_df.sort_values(by="rain_probability", ascending=False)
-        alerts_df = all_data['alerts']
-        num_columns = 4
-        columns = st.columns(num_columns)
-        
-        for i, row in enumerate(weather_df_sorted.itertuples()):
-            col = columns[i % num_columns]
-            with col:
-                with st.container(border=True, height=300):
-                    main_cond = str(row.main_condition).lower().strip()
-                    weather_cond = str(row.weather_condition).lower().strip()
-                    weather_icon = weather_icons.get(weather_cond, weather_icons.get(main_cond, "🌎"))
-                    active_alert = alerts_df[(alerts_df['city'] == row.city) & (alerts_df['start_time'].dt.date <= selected_date_main) & (alerts_df['end_time'].dt.date >= selected_date_main)]
-                    alert_icon = " 🚨" if not active_alert.empty else ""
-
-                    st.markdown(f"<h6>{weather_icon} {row.city}{alert_icon}</h6>", unsafe_allow_html=True)
-                    st.markdown(f"""
-                        <p style="font-size: 14px; margin-bottom: 5px;">
-                        🌡️ Temp: <b>{row.temp_min}°C / {row.temp_max}°C</b><br>
-                        ☀️ UV Index: <b>{row.uvi}</b><br>
-                        💧 Humidity: {row.humidity}%<br>
-                        🌧️ Rain: <b>{row.rain_probability}%</b> ({row.total_rain_mm} mm)
-                        </p>
-                    """, unsafe_allow_html=True)
-
-                    if not active_alert.empty:
-                        with st.expander("View Alert"):
-                            st.warning(f"**{active_alert.iloc[0]['event']}**\n\n_{active_alert.iloc[0]['description']}_")
-                    
-                    st.markdown("<br>", unsafe_allow_html=True)
-                    if st.button("Details 📈", key=f"btn_{row.Index}", use_container_width=True):
-                        set_page('Detailed Analysis', row.city)
-                        st.rerun()
+        alert_index = all_data['alert_index']
+        alerts = {}
+        for city in alert_index.cities_active_on(selected_date_main):
+            active_alert = alert_index.active(city, selected_date_main).iloc[0]
+            alerts[city] = (active_alert['event'], active_alert['description'])
+        prof.lap("alerts")
+        # The whole grid is a single element, however many cities pass the filters
+        # Rows come already in rain-probability order (see build_indexes / WeatherQueries.overview)
+        st.markdown(card_grid(filtered_df, alerts, num_columns=4, link_params=detail_link_params()), unsafe_allow_html=True)
     else:
         st.warning("No weather data available for the selected filters.")
+    prof.lap("card_grid")
+    if prof is not profiler:
+        show_profile(prof)
+
+if st.session_state.page == 'General Dashboard' and all_data:
+    st.title("🌍 General Weather Dashboard")
+    general_dashboard()
 
 # --- VIEW 2: DETAILED ANALYSIS ---
 elif st.session_state.page == 'Detailed Analysis' and all_data:
@@ -158,8 +389,7 @@ elif st.session_state.page == 'Detailed Analysis' and all_data:
         with title_cols[1]:
             selected_date_detail = st.date_input("Select Date", datetime.today().date(), label_visibility="collapsed")
 
-        alerts_df = all_data['alerts']
-        city_active_alerts = alerts_df[(alerts_df['city'] == selected_city) & (alerts_df['start_time'].dt.date <= selected_date_detail) & (alerts_df['end_time'].dt.date >= selected_date_detail)]
+        city_active_alerts = all_data['alert_index'].active(selected_city, selected_date_detail)
         if not city_active_alerts.empty:
             st.subheader("🚨 Active Alert(s) for this Day")
             for _, alert in city_active_alerts.iterrows():
@@ -167,62 +397,96 @@ elif st.session_state.page == 'Detailed Analysis' and all_data:
                            f"**Description:** {alert['description']}\n\n"
                            f"**Active from:** {alert['start_time'].strftime('%Y-%m-%d')} **to** {alert['end_time'].strftime('%Y-%m-%d')}")
             st.markdown("---")
+        profiler.lap("detail_alerts")
         
-        city_daily_df = all_data['daily'][all_data['daily']['city'] == selected_city]
+        city_daily_from_date = daily_window(selected_city, selected_date_detail, 8)
         
         st.subheader(f"🗓️ 7-Day Summary from {selected_date_detail.strftime('%b %d')}")
-        future_forecast_preview = city_daily_df[city_daily_df['date'] >= selected_date_detail].head(7)
+        future_forecast_preview = city_daily_from_date.head(7)
         if not future_forecast_preview.empty:
             forecast_cols = st.columns(len(future_forecast_preview))
-            for idx, (_, row) in enumerate(future_forecast_preview.iterrows()):
+            for idx, row in enumerate(future_forecast_preview.itertuples(index=False)):
                 with forecast_cols[idx]:
                     with st.container(border=True):
-                        main_cond = str(row['main_condition']).lower().strip()
-                        weather_cond = str(row['weather_condition']).lower().strip()
-                        forecast_icon = weather_icons.get(weather_cond, weather_icons.get(main_cond, "🌎"))
                         st.markdown(f"""<div style="text-align: center; height: 150px;">
-                                        <h6>{row['date'].strftime('%a, %d')}</h6>
-                                        <p style="font-size: 35px; margin-top: -10px; margin-bottom: 0px;">{forecast_icon}</p>
-                                        <p style="margin-bottom: 2px;"><b>{row['temp_max']}°</b> / {row['temp_min']}°</p>
-                                        <p style="font-size: 12px;">{str(row['weather_condition']).capitalize()}</p>
+                                        <h6>{row.day_label}</h6>
+                                        <p style="font-size: 35px; margin-top: -10px; margin-bottom: 0px;">{row.icon}</p>
+                                        <p style="margin-bottom: 2px;"><b>{row.temp_max}°</b> / {row.temp_min}°</p>
+                                        <p style="font-size: 12px;">{row.condition_label}</p>
                                     </div>""", unsafe_allow_html=True)
         else:
             st.warning("No summary data available from the selected date.")
         st.markdown("---") 
+        profiler.lap("daily_tiles")
 
         # ⭐ CAMBIO FINAL: Lógica del gráfico por hora
         st.subheader(f"🕒 Hourly Breakdown for {selected_date_detail.strftime('%b %d, %Y')}")
-        city_hourly_df = all_data['hourly'][all_data['hourly']['city'] == selected_city]
-        
-        # Filtra los datos por hora para el día completo seleccionado
-        start_of_day = pd.Timestamp(selected_date_detail, tz='America/Mexico_City')
-        end_of_day = start_of_day + timedelta(days=1)
-        hourly_data_for_day = city_hourly_df[(city_hourly_df['forecast_time'] >= start_of_day) & (city_hourly_df['forecast_time'] < end_of_day)]
+        # The city's own calendar day, whatever its time zone; the figure is memoized per data version
+        version = figure_version()
+        fig_hourly = hourly_chart(selected_city, selected_date_detail, version)
         
-        if not hourly_data_for_day.empty:
-            rain_text_labels = hourly_data_for_day['rain_1h'].apply(lambda x: f'{x:.1f} mm' if x > 0 else '')
-            fig_hourly = go.Figure()
-            fig_hourly.add_trace(go.Scatter(x=hourly_data_for_day['forecast_time'], y=hourly_data_for_day['temp'], mode='lines+markers', name='Temperature (°C)', yaxis='y1', line=dict(color='orange')))
-            fig_hourly.add_trace(go.Bar(x=hourly_data_for_day['forecast_time'], y=hourly_data_for_day['rain_probability'], name='Rain Probability (%)', yaxis='y2', marker_color='blue', opacity=0.6, text=rain_text_labels, textposition='outside'))
-            fig_hourly.update_layout(title_text="Hourly Temperature & Rain Probability", yaxis=dict(title="Temperature (°C)", color='orange'), yaxis2=dict(title="Rain Probability (%)", overlaying='y', side='right', range=[0, 100], color='blue'), legend=dict(x=0, y=1.2, orientation="h"))
-            fig_hourly.update_xaxes(title_text="Time (America/Mexico_City)")
+        if fig_hourly is not None:
             st.plotly_chart(fig_hourly, use_container_width=True)
         else:
             st.info("No hourly data is available for the selected date.")
+        profiler.lap("hourly_chart")
 
         st.subheader(f"📈 8-Day Trend: Temperature & UV Index")
-        future_forecast_trend = city_daily_df[city_daily_df['date'] >= selected_date_detail].head(8)
-        if not future_forecast_trend.empty:
-            fig = make_subplots(specs=[[{"secondary_y": True}]])
-            fig.add_trace(go.Scatter(x=future_forecast_trend['date'], y=future_forecast_trend['temp_max'], mode='lines+markers', name='Max Temp', line=dict(color='red')), secondary_y=False)
-            fig.add_trace(go.Scatter(x=future_forecast_trend['date'], y=future_forecast_trend['temp_min'], mode='lines+markers', name='Min Temp', line=dict(color='lightblue'), fill='tonexty', fillcolor='rgba(255, 165, 0, 0.2)'), secondary_y=False)
-            fig.add_trace(go.Bar(x=future_forecast_trend['date'], y=future_forecast_trend['uvi'], name='UV Index', marker_color='purple', opacity=0.5, text=future_forecast_trend['uvi'].round(1)), secondary_y=True)
-            fig.update_layout(title_text="Temperature Range & UV Index", legend=dict(x=0, y=1.2, orientation="h"))
-            fig.update_yaxes(title_text="Temperature (°C)", secondary_y=False)
-            fig.update_yaxes(title_text="UV Index", secondary_y=True, range=[0, future_forecast_trend['uvi'].max() + 2])
+        fig = trend_chart(selected_city, selected_date_detail, version)
+        if fig is not None:
             st.plotly_chart(fig, use_container_width=True)
+        profiler.lap("trend_chart")
+
+        st.subheader("📉 Hourly History")
+        history_days = st.select_slider("History range", HISTORY_RANGES, value=7, format_func=lambda d: f"{d} days")
+        fig_history = history_chart(selected_city, selected_date_detail, history_days, version)
+        if fig_history is not None:
+            st.plotly_chart(fig_history, use_container_width=True)
+        else:
+            st.info("No hourly history is available for the selected range.")
+        profiler.lap("history_chart")
 
     else:
         st.info("Use the search bar in the header to find a city.")
+# --- VIEW 3: CITY COMPARISON ---
+elif st.session_state.page == 'City Comparison' and all_data:
+    st.title("📊 City Comparison")
+    clusters_df = all_data['clusters']
+    panel_cities = set(all_data['hourly_panel'].cities())
+    filter_cols = st.columns([1, 3])
+    with filter_cols[0]:
+        cluster_options = ["All"] + sorted(clusters_df['cluster'].dropna().unique().tolist())
+        selected_cluster = st.selectbox("📍 Cluster", cluster_options)
+    in_cluster = clusters_df if selected_cluster == "All" else clusters_df[clusters_df['cluster'] == selected_cluster]
+    city_options = sorted(panel_cities.intersection(in_cluster['city'].dropna().tolist()))
+    with filter_cols[1]:
+        selected_cities = st.multiselect("🏙️ Cities", city_options, default=city_options[:10] if selected_cluster != "All" else [],
+                                         max_selections=MAX_COMPARISON_CITIES, placeholder=f"Choose up to {MAX_COMPARISON_CITIES} cities")
+    range_cols = st.columns([2, 2, 3])
+    with range_cols[0]:
+        date_range = st.date_input("📅 Dates", (datetime.today().date() - timedelta(days=6), datetime.today().date() + timedelta(days=1)))
+    with range_cols[1]:
+        selected_metric = st.selectbox("📈 Metric", list(COMPARISON_METRICS), format_func=lambda m: COMPARISON_METRICS[m][0])
+    with range_cols[2]:
+        selected_resolution = st.radio("⏱️ Resolution", list(RESOLUTIONS), horizontal=True)
+    profiler.lap("comparison_filters")
+
+    if not selected_cities:
+        st.info("Choose the cities to compare.")
+    elif len(date_range) < 2:
+        st.info("Choose the last day of the range.")
+    else:
+        fig_comparison = comparison_chart(tuple(selected_cities), date_range[0], date_range[1], selected_metric,
+                                          selected_resolution, all_data['version'])
+        if fig_comparison is not None:
+            st.caption(f"Times in {comparison_zone(selected_cities)}.")
+            st.plotly_chart(fig_comparison, use_container_width=True)
+        else:
+            st.info("No hourly data is available for the selected cities and dates.")
+    profiler.lap("comparison_chart")
+
 elif not all_data:
     st.error("Could not load data. Please check the connection to Google Sheets and the configuration.")
+
+profiler.page = st.session_state.page
+show_profile(profiler)
@@ -1,8 +1,9 @@
 import streamlit as st
 import pandas as pd
-import psycopg2
 from datetime import datetime
 import plotly.express as px
+from dashboard_queries import WeatherQueries
+from dashboard_data import add_display_columns
 
 # PostgreSQL Configuration
 PG_CONFIG = {
@@ -12,72 +13,22 @@ PG_CONFIG = {
     "password": "lazzeeli1"
 }
 
-# Weather Icons Dictionary
-weather_icons = {
-    "Clear": "☀️",
-    "Clouds": "☁️",
-    "Drizzle": "🌦️",
-    "Rain": "🌧️",
-    "Thunderstorm": "⛈️",
-    "Snow": "❄️",
-    "Mist": "🌫️",
-    "Fog": "🌫️",
-    "Haze": "🌁"
-}
+@st.cache_resource
+def get_queries():
+    # One pool of prepared connections shared by every session of this process
+    return WeatherQueries(**PG_CONFIG)
 
 
 # Function to Fetch Weather Data
 def fetch_weather_data(selected_date, selected_team, selected_cluster):
-    conn = psycopg2.connect(**PG_CONFIG)
-    cursor = conn.cursor()
-
-    query = """
-        SELECT w.date, w.city, w.weather_condition, w.temp, w.feels_like, w.wind_speed, 
-               w.humidity, w.rain_probability, w.rain_hours, w.main_condition
-        FROM weather_data w
-        JOIN city_team_cluster c ON w.city = c.city
-        WHERE w.date = %s
-    """
-    params = [selected_date]
-
-    if selected_team != "All":
-        query += " AND c.team = %s"
-        params.append(selected_team)
-    if selected_cluster != "All":
-        query += " AND c.cluster = %s"
-        params.append(selected_cluster)
-
-    query += " ORDER BY w.city"
-
-    cursor.execute(query, params)
-    data = cursor.fetchall()
-    conn.close()
-
-    return pd.DataFrame(data, columns=[
-        "date", "city", "weather_condition", "temp", "feels_like", "wind_speed",
-        "humidity", "rain_probability", "rain_hours", "main_condition"
-    ])
-
-
-# Function to Fetch 5-Day Forecast for a Specific City
-def fetch_city_forecast(city):
-    conn = psycopg2.connect(**PG_CONFIG)
-    cursor = conn.cursor()
-
-    query = """
-        SELECT date, temp, feels_like, wind_speed, humidity, rain_probability, rain_hours, weather_condition
-        FROM weather_data
-        WHERE city = %s
-        ORDER BY date
-    """
-    cursor.execute(query, [city])
-    data = cursor.fetchall()
-    conn.close()
-
-    return pd.DataFrame(data, columns=[
-        "date", "temp", "feels_like", "wind_speed", "humidity",
-        "rain_probability", "rain_hours", "weather_condition"
-    ])
+    # Icons and display strings come precomputed, so the card loops only read ready values
+    return add_display_columns(get_queries().overview(selected_date, team=selected_team, cluster=selected_cluster))
+
+
+# Function to Fetch the Forecast for a Specific City, starting on the selected date
+def fetch_city_forecast(city, start_date, days=8):
+    start_date = pd.Timestamp(start_date)
+    return add_display_columns(get_queries().daily_window(city, start_date, start_date + pd.Timedelta(days=days)))
 
 
 # Streamlit UI
@@ -103,17 +54,16 @@ if page == "🌍 City Overview":
     if not weather_df.empty:
         cols = st.columns(3)  # 3 ciudades por fila
         for idx, row in weather_df.iterrows():
-            weather_icon = weather_icons.get(row['main_condition'], "🌎")  # Default icon
             with cols[idx % 3]:
                 st.markdown(
                     f"""
                     <div style="border-radius: 10px; padding: 15px; background-color: #1E1E1E; color: white; margin-bottom: 10px;">
-                        <h3>{weather_icon} {row['city']}</h3>
+                        <h3>{row['icon']} {row['city']}</h3>
                         <p>🌡️ Temperature: {row['temp']}°C | Feels Like: {row['feels_like']}°C</p>
                         <p>🌬️ Wind Speed: {row['wind_speed']} km/h</p>
                         <p>💧 Humidity: {row['humidity']}%</p>
                         <p>🌧️ Rain Probability: {row['rain_probability']}</p>
-                        <p>⏳ Rain Hours: {row['rain_hours'] if row['rain_hours'] else 'No Rain Expected'}</p>
+                        <p>⏳ Rain Total: {f"{row['total_rain_mm']} mm" if row['total_rain_mm'] else 'No Rain Expected'}</p>
                     </div>
                     """, unsafe_allow_html=True
                 )
@@ -129,48 +79,22 @@ elif page == "📊 Detailed Forecast":
         "city"].unique().tolist()
     selected_city = st.selectbox("🏙️ Choose a City", city_list)
 
-    weather_icons = {
-        "clear sky": "☀️",
-        "few clouds": "🌤️",
-        "scattered clouds": "⛅",
-        "broken clouds": "☁️",
-        "overcast clouds": "🌥️",
-        "drizzle": "🌦️",
-        "light rain": "🌦️",
-        "moderate rain": "🌧️",
-        "heavy rain": "🌧️",
-        "thunderstorm": "⛈️",
-        "snow": "❄️",
-        "mist": "🌫️",
-        "fog": "🌫️",
-        "haze": "🌁",
-        "smoke": "🌫️",
-        "dust": "💨",
-        "sand": "💨",
-        "volcanic ash": "🌋",
-        "squalls": "🌬️",
-        "tornado": "🌪️"
-    }
-
     if selected_city != "Select a City":
-        city_forecast_df = fetch_city_forecast(selected_city)
+        city_forecast_df = fetch_city_forecast(selected_city, selected_date)
 
         if not city_forecast_df.empty:
-            # 🔹 Normalizamos la condición climática para asegurar coincidencias con los íconos
+            # 🔹 El ícono ya viene resuelto desde la condición normalizada (add_display_columns)
             today_weather = city_forecast_df.iloc[0]
-            normalized_condition = today_weather[
-                "weather_condition"].strip().lower()  # ✅ Convertimos a minúsculas y eliminamos espacios
-            weather_icon = weather_icons.get(normalized_condition, "🌎")  # 🔹 Usa ícono si existe, si no, pone 🌎
 
             # Tarjeta de clima principal
             st.markdown(f"""
                 <div style="border-radius: 10px; padding: 15px; background-color: #1E1E1E; color: white; text-align: center;">
                     <h2 style="color: #00AEEF;">{selected_city} - {today_weather['date']}</h2>
-                    <h1 style="font-size: 60px;">{weather_icon} {today_weather['temp']}°C</h1>
+                    <h1 style="font-size: 60px;">{today_weather['icon']} {today_weather['temp_label']}</h1>
                     <p style="font-size: 20px;">Feels Like: {today_weather['feels_like']}°C</p>
                     <p style="font-size: 18px;">{today_weather['weather_condition']}</p>
                     <p style="font-size: 18px;">🌬️ Wind Speed: {today_weather['wind_speed']} km/h | 💧 Humidity: {today_weather['humidity']}%</p>
-                    <p style="font-size: 18px;">🌧️ Rain Probability: {today_weather['rain_probability']} | ⏳ Rain Hours: {today_weather['rain_hours'] if today_weather['rain_hours'] else 'No Rain Expected'}</p>
+                    <p style="font-size: 18px;">🌧️ Rain Probability: {today_weather['rain_probability']} | ⏳ Rain Total: {f"{today_weather['total_rain_mm']} mm" if today_weather['total_rain_mm'] else 'No Rain Expected'}</p>
                 </div>
             """, unsafe_allow_html=True)
 
@@ -181,15 +105,13 @@ elif page == "📊 Detailed Forecast":
             forecast_cols = st.columns(len(city_forecast_df))  # Crear columnas dinámicas
 
             for idx, row in city_forecast_df.iterrows():
-                forecast_icon = weather_icons.get(row["weather_condition"],
-                                                  "🌎")  # Obtener icono basado en la condición climática
                 with forecast_cols[idx]:  # Ubicar en la columna correspondiente
                     st.markdown(f"""
                 <div style="border-radius: 10px; padding: 20px; background-color: #2E2E2E; color: white; text-align: center;
                             width: 150px; height: 160px; margin-left: 50px;">
-                    <h4 style="margin: 0; font-size: 20px; margin-bottom: -10px;">{row['date'].strftime('%a')}</h4>
-                    <p style="font-size: 40px; margin: -10px 0;">{forecast_icon}</p>
-                    <h4 style="margin: 0; font-size: 18px; margin-top: -10px;">{row['temp']}°C</h4>
+                    <h4 style="margin: 0; font-size: 20px; margin-bottom: -10px;">{row['day_label']}</h4>
+                    <p style="font-size: 40px; margin: -10px 0;">{row['icon']}</p>
+                    <h4 style="margin: 0; font-size: 18px; margin-top: -10px;">{row['temp_label']}</h4>
                 </div>
 
                     """, unsafe_allow_html=True)
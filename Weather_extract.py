@@ -1,22 +1,76 @@
+import argparse
+import asyncio
+import os
+import signal
+import threading
 import time
-import requests
 import psycopg2
+from concurrent.futures import ThreadPoolExecutor
+from psycopg2.pool import ThreadedConnectionPool
 from datetime import datetime
-import concurrent.futures
 import pandas as pd
 import gspread
 from oauth2client.service_account import ServiceAccountCredentials
 from cities import cities
+from fetch_engine import DEFAULT_PARAMS, WeatherFetcher
+from pipeline import stream_to_db
+from scheduler import RefreshScheduler
+from response_cache import ResponseCache
+from bulk_loader import TABLES, bulk_upsert
+from transform import iter_frames
+from storage import DAILY_RETENTION_DAYS, HOURLY_RETENTION_DAYS, apply_retention, prepare_partitions
+from snapshot import SNAPSHOT_DIR, write_snapshot
+from metrics import METRICS, METRICS_ENV
+from summaries import refresh_summaries
+from sheets_sync import SheetsWriter, load_state, save_state, sync_worksheet
 
 # --- 1. CONFIGURACIÓN GENERAL ---
 API_KEY = 'your api key'
-BASE_URL = 'https://api.openweathermap.org/data/3.0/onecall'
+BASE_URL = os.environ.get('OPENWEATHER_BASE_URL', 'https://api.openweathermap.org/data/3.0/onecall')
+CALLS_PER_MINUTE = 600  # Cuota del plan One Call
+MAX_CONCURRENCY = 20
+CACHE_DIR = ".weather_cache"
+CACHE_TTL_SECONDS = 30 * 60  # Respuestas más jóvenes se consideran frescas y no se vuelven a pedir
+LOAD_METHOD = "copy"  # "copy", "values" o "row" (INSERT por fila)
+# Modo daemon
+BASE_REFRESH_SECONDS = 60 * 60
+FAST_REFRESH_SECONDS = 15 * 60  # Ciudades con alerta vigente o lluvia probable en las próximas horas
+FAST_REFRESH_RAIN_PROBABILITY = 60
+SYNC_INTERVAL_SECONDS = 15 * 60  # Frecuencia de PASO 2 (snapshot + Google Sheets)
+DAEMON_TICK_SECONDS = 10
+# Escritor por lotes: guarda cada FLUSH_ROWS filas o FLUSH_SECONDS segundos, lo que ocurra primero
+FLUSH_ROWS = 5000
+FLUSH_SECONDS = 5.0
+DB_POOL_SIZE = 4
 PG_CONFIG = {"host": "localhost", "database": "weather_db", "user": "postgres", "password": "password"}
 SHEET_NAME = "Weather_Dashboard"
 DAILY_SHEET_NAME = "Data"
 HOURLY_SHEET_NAME = "Hourly Forecast"
 ALERTS_SHEET_NAME = "Weather Alerts"
 CLUSTER_SHEET_NAME = "City_Team_Cluster"
+SYNC_STATE_PATH = ".sheets_sync_state.json"
+SHEETS_WRITES_PER_MINUTE = 60  # Cuota de escritura de Sheets por usuario
+SHEETS_CHUNK_ROWS = 5000  # Tamaño máximo de cada escritura por rango
+
+# Tabla del snapshot, hoja destino, consulta origen y llave natural de cada fila
+SHEET_SOURCES = [
+    # Los filtros por fecha permiten que Postgres lea solo las particiones vivas
+    ("daily", DAILY_SHEET_NAME,
+     f"SELECT * FROM weather_data WHERE date >= CURRENT_DATE - {DAILY_RETENTION_DAYS} ORDER BY city, date",
+     ["city", "date"]),
+    ("hourly", HOURLY_SHEET_NAME,
+     f"SELECT * FROM hourly_weather_data WHERE forecast_time >= CURRENT_DATE - {HOURLY_RETENTION_DAYS} "
+     "ORDER BY city, forecast_time", ["city", "forecast_time"]),
+    ("alerts", ALERTS_SHEET_NAME, "SELECT * FROM weather_alerts ORDER BY city, start_time",
+     ["city", "event", "start_time"]),
+    ("clusters", CLUSTER_SHEET_NAME, "SELECT * FROM city_team_cluster ORDER BY city", ["city"]),
+]
+
+# Tablas que solo van al snapshot del dashboard (ver summaries.py)
+SNAPSHOT_SOURCES = [
+    ("summary", "SELECT * FROM weather_group_summary ORDER BY date, country_code, team, cluster"),
+    ("rankings", "SELECT * FROM weather_rankings ORDER BY date, country_code, team, cluster, metric, rank"),
+]
 
 
 # --- 2. FUNCIONES DEL PIPELINE ---
@@ -31,108 +85,237 @@ def connect_db():
 
 
 
-def fetch_weather_data(city, lat, lon):
-    params = {'lat': lat, 'lon': lon, 'appid': API_KEY, 'units': 'metric', 'exclude': 'minutely', 'lang': 'en'}
+def store_results(db_conn, results, fetched_at):
+    """
+    Transforma los payloads y los guarda en una sola transacción. Devuelve {tabla: filas escritas}.
+    """
+    with METRICS.span("parse"):
+        frames = {table: [] for table in TABLES}
+        for batch in iter_frames(results, fetched_at):
+            for table, df in batch.items():
+                frames[table].append(df)
+        frames = {table: pd.concat(dfs, ignore_index=True) for table, dfs in frames.items() if dfs}
+    with METRICS.span("db_partitions"):
+        prepare_partitions(db_conn, frames)
+    written = {}
+    for table, df in frames.items():
+        with METRICS.span("db_write", table=table):
+            written[table], _ = bulk_upsert(db_conn, table, df, method=LOAD_METHOD)
+    with METRICS.span("db_commit"):
+        db_conn.commit()
+    for table, rows in written.items():
+        METRICS.count("rows_written", rows, table=table)
+    return written
+
+
+def make_batch_writer(db_conn, fetched_at):
+    """Escritor de lotes para pipeline.stream_to_db: un lote fallido se revierte y se reporta."""
+    def write_batch(results):
+        try:
+            store_results(db_conn, results, fetched_at)
+        except Exception:
+            db_conn.rollback()
+            raise
+    return write_batch
+
+
+def run_retention(db_conn):
     try:
-        response = requests.get(BASE_URL, params=params, timeout=15)
-        response.raise_for_status()
-        return city, response.json()
-    except requests.exceptions.RequestException as e:
-        print(f"❌ Error en la API para {city}: {e}")
-        return city, None
+        dropped, rolled_up = apply_retention(db_conn)
+        if any(dropped.values()):
+            print(f"🧹 Retención: {dropped} particiones borradas, {rolled_up} filas en hourly_weather_rollup.")
+    except Exception as e:
+        # Los datos nuevos ya están guardados; la retención se reintenta en la próxima corrida
+        db_conn.rollback()
+        print(f"⚠️ No se pudo aplicar la retención: {e}")
 
 
 def fetch_and_store_weather_data():
     print("--- INICIANDO PASO 1: Actualizar Base de Datos desde API ---")
     start_time = time.time()
-    all_hourly_data, all_alerts_data, all_daily_data = [], [], []
+    fetched_at = datetime.now()
     city_items = list(cities.items())
-    with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-        future_to_city = {executor.submit(fetch_weather_data, city, coords[0], coords[1]): city for city, coords in
-                          city_items}
-        for i, future in enumerate(concurrent.futures.as_completed(future_to_city)):
-            city, data = future.result()
-            print(f"({i + 1}/{len(city_items)}) Obteniendo datos para: {city}")
-            if data:
-                if 'hourly' in data:
-                    for hour_data in data['hourly']: all_hourly_data.append(
-                        {'city': city, 'forecast_time': datetime.fromtimestamp(hour_data['dt']),
-                         'temp': round(hour_data.get('temp', 0), 2),
-                         'feels_like': round(hour_data.get('feels_like', 0), 2),
-                         'humidity': round(hour_data.get('humidity', 0), 2),
-                         'weather_condition': hour_data['weather'][0].get('description', ''),
-                         'main_condition': hour_data['weather'][0].get('main', ''),
-                         'rain_probability': round(hour_data.get('pop', 0) * 100, 2),
-                         'rain_1h': hour_data.get('rain', {}).get('1h', 0),
-                         'wind_speed': round(hour_data.get('wind_speed', 0) * 3.6, 2), 'fetched_at': datetime.now()})
-                if 'alerts' in data:
-                    for alert in data['alerts']: all_alerts_data.append(
-                        {'city': city, 'event': alert.get('event', 'Alerta'),
-                         'start_time': datetime.fromtimestamp(alert['start']),
-                         'end_time': datetime.fromtimestamp(alert['end']), 'description': alert.get('description', ''),
-                         'sender_name': alert.get('sender_name', 'Fuente desconocida'), 'fetched_at': datetime.now()})
-                if 'daily' in data:
-                    for day_data in data['daily']:
-                        summary_text = day_data.get('summary', day_data['weather'][0].get('description', ''))
-                        all_daily_data.append({"date": datetime.fromtimestamp(day_data['dt']).date(), "city": city,
-                                               "temp": round(day_data['temp'].get('day', 0), 2),
-                                               "feels_like": round(day_data['feels_like'].get('day', 0), 2),
-                                               "humidity": day_data.get('humidity', 0),
-                                               "weather_condition": summary_text.capitalize(),
-                                               "main_condition": day_data['weather'][0].get('main', ''),
-                                               "rain_probability": round(day_data.get('pop', 0) * 100, 2),
-                                               "wind_speed": round(day_data.get('wind_speed', 0) * 3.6, 2),
-                                               "fetched_at": datetime.now(), "total_rain_mm": day_data.get('rain', 0),
-                                               "temp_max": round(day_data['temp'].get('max', 0), 2),
-                                               "temp_min": round(day_data['temp'].get('min', 0), 2),
-                                               "uvi": day_data.get('uvi', 0),
-                                               "sunrise": datetime.fromtimestamp(day_data.get('sunrise', 0)),
-                                               "sunset": datetime.fromtimestamp(day_data.get('sunset', 0))})
+    cache = ResponseCache(CACHE_DIR, CACHE_TTL_SECONDS)
+    requests_to_make, groups = cache.plan(city_items, DEFAULT_PARAMS)
+    print(f"Pidiendo {len(requests_to_make)} celdas para {len(city_items)} ciudades ({cache.summary()}).")
     db_conn = connect_db()
     if not db_conn: return False
+
+    async def _run():
+        async with WeatherFetcher(API_KEY, BASE_URL, calls_per_minute=CALLS_PER_MINUTE,
+                                  concurrency=MAX_CONCURRENCY) as fetcher:
+            # Solo se marcan como frescas en la caché las respuestas que ya quedaron guardadas
+            return await stream_to_db(fetcher, requests_to_make, groups, make_batch_writer(db_conn, fetched_at),
+                                      flush_rows=FLUSH_ROWS, flush_seconds=FLUSH_SECONDS, on_written=cache.mark)
+
     try:
-        with db_conn.cursor() as cursor:
-            print("Guardando datos en PostgreSQL...")
-            for row in all_hourly_data: cursor.execute(
-                "INSERT INTO hourly_weather_data (city, forecast_time, temp, feels_like, humidity, weather_condition, main_condition, rain_probability, rain_1h, wind_speed, fetched_at) VALUES (%(city)s, %(forecast_time)s, %(temp)s, %(feels_like)s, %(humidity)s, %(weather_condition)s, %(main_condition)s, %(rain_probability)s, %(rain_1h)s, %(wind_speed)s, %(fetched_at)s) ON CONFLICT (city, forecast_time) DO UPDATE SET temp=EXCLUDED.temp, feels_like=EXCLUDED.feels_like, humidity=EXCLUDED.humidity, weather_condition=EXCLUDED.weather_condition, main_condition=EXCLUDED.main_condition, rain_probability=EXCLUDED.rain_probability, rain_1h=EXCLUDED.rain_1h, wind_speed=EXCLUDED.wind_speed, fetched_at=EXCLUDED.fetched_at;",
-                row)
-            for row in all_alerts_data: cursor.execute(
-                "INSERT INTO weather_alerts (city, event, start_time, end_time, description, sender_name, fetched_at) VALUES (%(city)s, %(event)s, %(start_time)s, %(end_time)s, %(description)s, %(sender_name)s, %(fetched_at)s) ON CONFLICT (city, event, start_time) DO NOTHING;",
-                row)
-            for row in all_daily_data: cursor.execute(
-                "INSERT INTO weather_data (date, city, temp, feels_like, humidity, weather_condition, main_condition, rain_probability, wind_speed, fetched_at, total_rain_mm, temp_max, temp_min, uvi, sunrise, sunset) VALUES (%(date)s, %(city)s, %(temp)s, %(feels_like)s, %(humidity)s, %(weather_condition)s, %(main_condition)s, %(rain_probability)s, %(wind_speed)s, %(fetched_at)s, %(total_rain_mm)s, %(temp_max)s, %(temp_min)s, %(uvi)s, %(sunrise)s, %(sunset)s) ON CONFLICT (date, city) DO UPDATE SET temp=EXCLUDED.temp, feels_like=EXCLUDED.feels_like, humidity=EXCLUDED.humidity, weather_condition=EXCLUDED.weather_condition, main_condition=EXCLUDED.main_condition, rain_probability=EXCLUDED.rain_probability, wind_speed=EXCLUDED.wind_speed, fetched_at=EXCLUDED.fetched_at, total_rain_mm=EXCLUDED.total_rain_mm, temp_max=EXCLUDED.temp_max, temp_min=EXCLUDED.temp_min, uvi=EXCLUDED.uvi, sunrise=EXCLUDED.sunrise, sunset=EXCLUDED.sunset;",
-                row)
-        db_conn.commit()
+        print("Guardando datos en PostgreSQL a medida que llegan...")
+        with METRICS.span("step", step="fetch_and_store"):
+            stats = asyncio.run(_run())
+        print(f"Resultado: {stats.summary()}.")
+        METRICS.count("cities_written", stats.cities_written)
+        METRICS.count("cities_failed", stats.cities_failed)
+        METRICS.count("cities_without_data", stats.cities_without_data)
+        run_retention(db_conn)
+        if requests_to_make and not stats.cities_written:
+            print("❌ No se guardó ninguna ciudad.")
+            return False
         print(f"✅ PASO 1 completado en {round(time.time() - start_time, 2)} segundos.")
         return True
     except Exception as e:
         print(f"❌ Error al guardar en PostgreSQL: {e}")
+        METRICS.count("errors", stage="fetch_and_store")
         db_conn.rollback()
         return False
     finally:
         if db_conn: db_conn.close()
 
 
-def upload_df_to_gsheet_full_refresh(worksheet, df):
+def publish_snapshot(tables):
     """
-    Realiza un reemplazo completo de la hoja con los datos de un DataFrame.
+    Publica el snapshot Arrow que lee el dashboard. La versión es el último fetched_at cargado.
     """
-    print(f"Iniciando reemplazo completo para la hoja '{worksheet.title}'...")
     try:
-        # Limpiar la hoja y subir los nuevos datos
-        worksheet.clear()
-        df = df.fillna('').astype(str)
-        worksheet.update([df.columns.values.tolist()] + df.values.tolist(), value_input_option='USER_ENTERED')
-        print(f"✅ Reemplazo completado para la hoja '{worksheet.title}'.")
+        version = str(tables["daily"]["fetched_at"].max()) if not tables["daily"].empty else None
+        with METRICS.span("snapshot"):
+            write_snapshot(tables, version=version)
+        print(f"✅ Snapshot publicado en '{SNAPSHOT_DIR}' (versión {version}).")
+    except Exception as e:
+        # El snapshot es una optimización: si falla, el dashboard sigue leyendo de Google Sheets
+        METRICS.count("errors", stage="snapshot")
+        print(f"⚠️ No se pudo publicar el snapshot: {e}")
+
+
+def _refresh_summaries(pool):
+    conn = pool.getconn()
+    try:
+        with METRICS.span("summaries"):
+            written = refresh_summaries(conn)
+        print(f"✅ Resúmenes materializados: {written['weather_group_summary']} grupos, "
+              f"{written['weather_rankings']} filas de ranking.")
+    except Exception as e:
+        conn.rollback()
+        METRICS.count("errors", stage="summaries")
+        print(f"⚠️ No se pudieron recalcular los resúmenes (se publican los anteriores): {e}")
+    finally:
+        pool.putconn(conn)
+
+
+def _read_table(pool, name, query):
+    # Cada tabla se lee en su propio hilo con una conexión prestada del pool
+    started = time.perf_counter()
+    conn = pool.getconn()
+    try:
+        with METRICS.span("db_read", table=name):
+            df = pd.read_sql(query, conn)
+        conn.rollback()
+    except Exception:
+        conn.rollback()  # La conexión vuelve al pool sin la transacción abortada
+        raise
+    finally:
+        pool.putconn(conn)
+    METRICS.count("rows_read", len(df), table=name)
+    return name, df, time.perf_counter() - started
+
+
+def _sync_sheet(spreadsheet, writer, state, state_lock, name, sheet_name, df, key_columns):
+    started = time.perf_counter()
+    try:
+        worksheet = spreadsheet.worksheet(sheet_name)
+    except gspread.exceptions.WorksheetNotFound:
+        print(f"❌ Error: La hoja '{sheet_name}' no existe. Por favor, créala manualmente.")
+        METRICS.count("errors", stage="sheets_sync")
+        return None
+    # La huella de la hoja se saca del estado compartido mientras se sincroniza, para que los otros
+    # hilos puedan guardar el archivo de estado sin recorrerla a medio modificar
+    with state_lock:
+        sheet_state = {worksheet.title: state.pop(worksheet.title, None)}
+    if sheet_state[worksheet.title] is None:
+        del sheet_state[worksheet.title]
+    try:
+        with METRICS.span("sheets_sync", sheet=name):
+            stats = sync_worksheet(worksheet, df, key_columns, sheet_state, writer)
     except Exception as e:
-        print(f"❌ Error durante el reemplazo completo en la hoja '{worksheet.title}': {e}")
+        # La huella ya no es confiable para esta hoja: no se devuelve al estado y la próxima vez
+        # se hace reemplazo completo
+        print(f"❌ Error sincronizando la hoja '{sheet_name}': {e}")
+        stats, sheet_state = None, {}
+    with state_lock:
+        state.update(sheet_state)
+        save_state(SYNC_STATE_PATH, state)
+    if stats is None:
+        return None
+    METRICS.count("sheets_rows_sent", stats["sent"], sheet=name)
+    METRICS.count("sheets_rows_deleted", stats["deleted"], sheet=name)
+    mode = "reemplazo completo" if stats["full_refresh"] else "incremental"
+    print(f"✅ '{sheet_name}' ({mode}): {stats['sent']} filas enviadas, {stats['skipped']} sin cambios, "
+          f"{stats['deleted']} borradas.")
+    return time.perf_counter() - started
+
+
+def _print_timings(timings, tables, writer, read_elapsed, snapshot_elapsed, sync_elapsed):
+    quota = f" ({writer.calls} llamadas de escritura, {writer.retries} reintentos por cuota)" if writer else ""
+    print(f"⏱️ Tiempos PASO 2{quota}:")
+    print(f"   {'tabla':<10} {'filas':>8} {'lectura':>9} {'sheets':>9}")
+    for name, timing in timings.items():
+        sync = "-" if timing["sync"] is None else f"{timing['sync']:.2f}s"
+        print(f"   {name:<10} {len(tables[name]):>8} {timing['read']:>8.2f}s {sync:>9}")
+    sheets = "-" if sync_elapsed is None else f"{sync_elapsed:.2f}s"
+    print(f"   total: resúmenes + lectura {read_elapsed:.2f}s, snapshot {snapshot_elapsed:.2f}s, sheets {sheets}")
 
 
-def extract_and_upload_data():
+def extract_and_upload_data(pool=None):
     """
-    PASO 2: Extrae los datos de PostgreSQL y los sube a Google Sheets.
+    PASO 2: Extrae los datos de PostgreSQL, publica el snapshot del dashboard y los sincroniza con Google Sheets.
+    Antes de leer se recalculan las tablas de resumen y rankings (summaries.py), que van solo al snapshot.
+    Las tablas se leen en paralelo (una conexión del pool por tabla) y las hojas se sincronizan en paralelo
+    compartiendo un SheetsWriter que respeta la cuota de escritura. Solo se envían las filas nuevas o
+    modificadas desde la última corrida (ver sheets_sync.py). Si se recibe `pool` (modo daemon) no se cierra.
     """
-    print("\n--- INICIANDO PASO 2: Subir Datos a Google Sheets (Método: Reemplazo Completo) ---")
+    print("\n--- INICIANDO PASO 2: Subir Datos a Google Sheets (Método: Sincronización Incremental) ---")
+    own_pool = pool is None
+    if own_pool:
+        try:
+            pool = ThreadedConnectionPool(1, DB_POOL_SIZE, **PG_CONFIG)
+        except Exception as e:
+            print(f"❌ Error al conectar con PostgreSQL: {e}")
+            return
+
+    sources = [(name, query) for name, _, query, _ in SHEET_SOURCES] + SNAPSHOT_SOURCES
+    optional = {name for name, _ in SNAPSHOT_SOURCES}
+    timings = {name: {"read": None, "sync": None} for name, _ in sources}
+    started = time.perf_counter()
+    try:
+        _refresh_summaries(pool)
+        # Como mucho DB_POOL_SIZE lecturas a la vez: el pool no espera, falla si se agota
+        with ThreadPoolExecutor(max_workers=DB_POOL_SIZE) as executor:
+            futures = {name: executor.submit(_read_table, pool, name, query) for name, query in sources}
+            tables = {}
+            for name, future in futures.items():
+                try:
+                    _, df, elapsed = future.result()
+                except Exception as e:
+                    # Resúmenes y rankings son opcionales: sin ellos se publica igual y se sincroniza Sheets
+                    if name not in optional:
+                        raise
+                    print(f"⚠️ No se pudo leer '{name}', el snapshot se publica sin esa tabla: {e}")
+                    METRICS.count("errors", stage="db_read_optional")
+                    del timings[name]
+                    continue
+                tables[name] = df
+                timings[name]["read"] = elapsed
+    except Exception as e:
+        print(f"❌ Error durante la extracción desde PostgreSQL: {e}")
+        METRICS.count("errors", stage="db_read")
+        return
+    finally:
+        if own_pool: pool.closeall()
+    read_elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    publish_snapshot(tables)
+    snapshot_elapsed = time.perf_counter() - started
+
     try:
         SCOPE = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
         CREDS = ServiceAccountCredentials.from_json_keyfile_name("credentials.json", SCOPE)
@@ -141,53 +324,142 @@ def extract_and_upload_data():
         print("✅ Conexión exitosa con Google Sheets.")
     except Exception as e:
         print(f"❌ Error fatal al conectar con Google Sheets: {e}")
+        METRICS.count("errors", stage="sheets_connect")
+        _print_timings(timings, tables, None, read_elapsed, snapshot_elapsed, None)
         return
 
-    db_conn = connect_db()
-    if not db_conn: return
+    state = load_state(SYNC_STATE_PATH)
+    state_lock = threading.Lock()
+    writer = SheetsWriter(requests_per_minute=SHEETS_WRITES_PER_MINUTE, chunk_rows=SHEETS_CHUNK_ROWS)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(SHEET_SOURCES)) as executor:
+        futures = {name: executor.submit(_sync_sheet, spreadsheet, writer, state, state_lock, name, sheet_name,
+                                         tables[name], key_columns)
+                   for name, sheet_name, _, key_columns in SHEET_SOURCES}
+        for name, future in futures.items():
+            timings[name]["sync"] = future.result()
+    sync_elapsed = time.perf_counter() - started
+
+    _print_timings(timings, tables, writer, read_elapsed, snapshot_elapsed, sync_elapsed)
+
 
+def _release(pool, conn, error=None):
+    # Una conexión caída (p. ej. tras reiniciar Postgres) se descarta; el pool abre otra en el próximo ciclo
+    if conn is not None:
+        broken = bool(conn.closed) or isinstance(error, (psycopg2.OperationalError, psycopg2.InterfaceError))
+        pool.putconn(conn, close=broken)
+
+
+async def run_daemon():
+    """
+    Modo daemon: refresca cada ciudad según su propio intervalo (ver scheduler.py) manteniendo abiertas
+    la sesión HTTP y el pool de conexiones entre ciclos. PASO 2 corre cada SYNC_INTERVAL_SECONDS si hubo
+    datos nuevos. SIGINT/SIGTERM terminan el ciclo en curso y cierran todo ordenadamente.
+    """
+    print("🛰️ Iniciando extractor en modo daemon.")
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    scheduler = RefreshScheduler(cities.items(), BASE_REFRESH_SECONDS, FAST_REFRESH_SECONDS,
+                                 rain_threshold=FAST_REFRESH_RAIN_PROBABILITY, now=time.time())
+    # Sin TTL: el planificador decide cuándo pedir; la caché solo fusiona celdas y deja marcadores para las
+    # corridas --once, que se borran al cumplir CACHE_TTL_SECONDS
+    cache = ResponseCache(CACHE_DIR, 0, retention=CACHE_TTL_SECONDS)
+    pool = ThreadedConnectionPool(1, DB_POOL_SIZE, **PG_CONFIG)
+    last_sync, pending_sync = 0.0, False
     try:
-        # Para cada tabla, se extraen todos los datos y se reemplaza la hoja completamente
-
-        # 1. Datos diarios ('weather_data')
-        daily_worksheet = spreadsheet.worksheet(DAILY_SHEET_NAME)
-        daily_df = pd.read_sql(f"SELECT * FROM weather_data ORDER BY city, date", db_conn)
-        upload_df_to_gsheet_full_refresh(daily_worksheet, daily_df)
-
-        # 2. Datos por hora ('hourly_weather_data')
-        hourly_worksheet = spreadsheet.worksheet(HOURLY_SHEET_NAME)
-        hourly_df = pd.read_sql(f"SELECT * FROM hourly_weather_data ORDER BY city, forecast_time", db_conn)
-        upload_df_to_gsheet_full_refresh(hourly_worksheet, hourly_df)
-
-        # 3. Alertas ('weather_alerts')
-        alerts_worksheet = spreadsheet.worksheet(ALERTS_SHEET_NAME)
-        alerts_df = pd.read_sql(f"SELECT * FROM weather_alerts ORDER BY city, start_time", db_conn)
-        upload_df_to_gsheet_full_refresh(alerts_worksheet, alerts_df)
-
-        # 4. Clusters ('city_team_cluster')
-        cluster_worksheet = spreadsheet.worksheet(CLUSTER_SHEET_NAME)
-        cluster_df = pd.read_sql("SELECT * FROM city_team_cluster ORDER BY city", db_conn)
-        upload_df_to_gsheet_full_refresh(cluster_worksheet, cluster_df)
-
-    except gspread.exceptions.WorksheetNotFound as e:
-        # El error se maneja dentro de la función de subida, pero por si acaso
-        print(f"❌ Error: La hoja '{e.sheet_name}' no existe. Por favor, créala manualmente.")
-    except Exception as e:
-        print(f"❌ Error durante la extracción y subida a Sheets: {e}")
+        async with WeatherFetcher(API_KEY, BASE_URL, calls_per_minute=CALLS_PER_MINUTE,
+                                  concurrency=MAX_CONCURRENCY) as fetcher:
+            while not stop.is_set():
+                now = time.time()
+                due = scheduler.due(now)
+                results = []
+                if due:
+                    requests_to_make, groups = cache.plan(due, DEFAULT_PARAMS)
+                    # Solo las ciudades cuyo lote hizo commit; aunque el ciclo se corte a la mitad
+                    written = {}
+
+                    def on_written(key, data):
+                        cache.mark(key)
+                        written.update(dict.fromkeys(groups.get(key, ()), data))
+
+                    db_conn, error = None, None
+                    try:
+                        db_conn = pool.getconn()
+                        with METRICS.span("step", step="refresh_cycle"):
+                            stats = await stream_to_db(
+                                fetcher, requests_to_make, groups, make_batch_writer(db_conn, datetime.now()),
+                                flush_rows=FLUSH_ROWS, flush_seconds=FLUSH_SECONDS, on_written=on_written)
+                        METRICS.count("cities_written", stats.cities_written)
+                        METRICS.count("cities_failed", stats.cities_failed)
+                        METRICS.count("cities_without_data", stats.cities_without_data)
+                    except Exception as e:
+                        error = e
+                        print(f"❌ Error en el ciclo de refresco (se reintenta en el próximo ciclo): {e}")
+                        METRICS.count("errors", stage="refresh_cycle")
+                    finally:
+                        _release(pool, db_conn, error)
+                        pending_sync = pending_sync or bool(written)
+                        # Las que no llegaron a PostgreSQL (API o escritura fallida) se reintentan con el intervalo rápido
+                        for city, _ in due:
+                            scheduler.mark_refreshed(city, written.get(city), now)
+                    print(f"🔄 {len(due)} ciudades refrescadas ({len(scheduler.fast_cities)} en refresco rápido).")
+                    METRICS.write()
+
+                if pending_sync and now - last_sync >= SYNC_INTERVAL_SECONDS:
+                    with METRICS.span("step", step="extract_and_upload"):
+                        await asyncio.to_thread(extract_and_upload_data, pool)
+                    db_conn, error = None, None
+                    try:
+                        db_conn = pool.getconn()
+                        await asyncio.to_thread(run_retention, db_conn)
+                    except Exception as e:
+                        error = e
+                        print(f"⚠️ No se pudo aplicar la retención (se reintenta en el próximo ciclo): {e}")
+                    finally:
+                        _release(pool, db_conn, error)
+                    last_sync, pending_sync = now, False
+                    METRICS.write()
+
+                # Esperar al próximo vencimiento (mínimo DAEMON_TICK_SECONDS para agrupar ciudades por ciclo)
+                wait = max(DAEMON_TICK_SECONDS, scheduler.seconds_until_next(time.time()))
+                try:
+                    await asyncio.wait_for(stop.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
     finally:
-        if db_conn: db_conn.close()
+        pool.closeall()
+        print("👋 Extractor detenido.")
 
 
 # --- 3. EJECUCIÓN DEL PIPELINE ---
 
 if __name__ == "__main__":
-    print("🚀 Iniciando pipeline de actualización de datos del clima.")
+    parser = argparse.ArgumentParser(description="Pipeline de actualización de datos del clima.")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--once", action="store_true", help="Una sola corrida completa (comportamiento por defecto).")
+    mode.add_argument("--daemon", action="store_true", help="Proceso continuo con refresco escalonado por ciudad.")
+    parser.add_argument("--metrics-dir", help="Escribe métricas Prometheus y un reporte JSON de cada corrida aquí "
+                                              f"(también con ${METRICS_ENV}).")
+    args = parser.parse_args()
+    if args.metrics_dir:
+        METRICS.enable(args.metrics_dir)
 
-    success = fetch_and_store_weather_data()
-
-    if success:
-        extract_and_upload_data()
-        print("\n✨ Pipeline completado exitosamente.")
+    if args.daemon:
+        asyncio.run(run_daemon())
     else:
-        print(
-            "\n❌ Pipeline fallido. La base de datos no fue actualizada, por lo tanto no se subieron datos a Google Sheets.")
+        print("🚀 Iniciando pipeline de actualización de datos del clima.")
+
+        success = fetch_and_store_weather_data()
+
+        if success:
+            with METRICS.span("step", step="extract_and_upload"):
+                extract_and_upload_data()
+            print("\n✨ Pipeline completado exitosamente.")
+        else:
+            print(
+                "\n❌ Pipeline fallido. La base de datos no fue actualizada, por lo tanto no se subieron datos a Google Sheets.")
+        if METRICS.write():
+            print(f"📊 Métricas de la corrida en '{METRICS.directory}'.")
@@ -0,0 +1,87 @@
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Tiempo de render del General Dashboard según el número de tarjetas.
+# Para cada tamaño genera un snapshot sintético y ejecuta Weather_Dashboard.py con AppTest en un
+# proceso aparte (el caché de Streamlit es por proceso): una corrida en frío y varios reruns.
+# Uso: python benchmarks/bench_dashboard.py --cards 45 100 500 1000 --reruns 5
+
+
+def synthetic_snapshot(directory, n_cities, alert_ratio=0.1, seed=7):
+    import pandas as pd
+    from mock_onecall_server import build_payload
+    from snapshot import write_snapshot
+    from transform import iter_frames
+
+    rng = random.Random(seed)
+    cities = [(f"City {i:04d}", rng.uniform(-40, 40), rng.uniform(-110, -40)) for i in range(n_cities)]
+    results = [(name, build_payload(lat, lon, with_alert=rng.random() < alert_ratio)) for name, lat, lon in cities]
+    frames = {"hourly_weather_data": [], "weather_alerts": [], "weather_data": []}
+    for batch in iter_frames(results):
+        for table, df in batch.items():
+            frames[table].append(df)
+    clusters = pd.DataFrame({"city": [name for name, _, _ in cities],
+                             "country_code": [rng.choice(["MX", "CO", "CL", "PE"]) for _ in cities],
+                             "team": [rng.choice(["MX", "POC", "CASA"]) for _ in cities],
+                             "cluster": [rng.choice(["Growers", "Heros", "Rocket"]) for _ in cities]})
+    write_snapshot({"daily": pd.concat(frames["weather_data"], ignore_index=True),
+                    "hourly": pd.concat(frames["hourly_weather_data"], ignore_index=True),
+                    "alerts": pd.concat(frames["weather_alerts"], ignore_index=True),
+                    "clusters": clusters}, directory=directory, version=f"bench-{n_cities}")
+
+
+def worker(reruns):
+    # WEATHER_SNAPSHOT_DIR ya apunta al snapshot sintético
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(os.path.join(ROOT, "Weather_Dashboard.py"), default_timeout=300)
+    start = time.perf_counter()
+    app.run()
+    cold = time.perf_counter() - start
+    times = []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        app.run()
+        times.append(time.perf_counter() - start)
+    payload = sum(len(m.value) for m in app.markdown)
+    cards = sum(m.value.count("Details 📈") for m in app.markdown)
+    print(json.dumps({"cold": cold, "rerun_p50": statistics.median(times), "rerun_max": max(times),
+                      "cards": cards, "elements": len(list(app.main)), "payload_kb": payload / 1024,
+                      "exception": bool(app.exception)}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiempo de render del General Dashboard por número de tarjetas.")
+    parser.add_argument("--cards", type=int, nargs="+", default=[45, 100, 500, 1000])
+    parser.add_argument("--reruns", type=int, default=5)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        worker(args.reruns)
+        return
+
+    print(f"{'tarjetas':>8} {'frío':>8} {'rerun p50':>10} {'rerun máx':>10} {'elementos':>10} {'payload':>10}")
+    for n in args.cards:
+        with tempfile.TemporaryDirectory() as directory:
+            synthetic_snapshot(directory, n)
+            env = dict(os.environ, WEATHER_SNAPSHOT_DIR=directory)
+            out = subprocess.run([sys.executable, "-W", "ignore", os.path.abspath(__file__), "--worker",
+                                  "--reruns", str(args.reruns)], env=env, capture_output=True, text=True, check=True)
+            result = json.loads(out.stdout.strip().splitlines()[-1])
+        flag = "  ⚠️ excepción" if result["exception"] else ""
+        print(f"{result['cards']:>8} {result['cold']:>7.2f}s {result['rerun_p50']:>9.3f}s {result['rerun_max']:>9.3f}s "
+              f"{result['elements']:>10} {result['payload_kb']:>8.0f}KB{flag}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import psycopg2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bulk_loader import bulk_upsert
+
+# Benchmark del cargador: INSERT por fila vs execute_values vs COPY + upsert, en filas/s.
+# Crea un esquema desechable en el Postgres local y lo borra al terminar.
+# Uso: python benchmarks/bench_loader.py --dsn "dbname=weather_db user=postgres" --cities 500
+
+SCHEMA = "bench_loader"
+DDL = """
+CREATE TABLE hourly_weather_data (
+    city TEXT, forecast_time TIMESTAMP, temp REAL, feels_like REAL, humidity REAL, weather_condition TEXT,
+    main_condition TEXT, rain_probability REAL, rain_1h REAL, wind_speed REAL, fetched_at TIMESTAMP,
+    PRIMARY KEY (city, forecast_time));
+CREATE TABLE weather_alerts (
+    city TEXT, event TEXT, start_time TIMESTAMP, end_time TIMESTAMP, description TEXT, sender_name TEXT,
+    fetched_at TIMESTAMP, PRIMARY KEY (city, event, start_time));
+CREATE TABLE weather_data (
+    date DATE, city TEXT, temp REAL, feels_like REAL, humidity REAL, weather_condition TEXT, main_condition TEXT,
+    rain_probability REAL, wind_speed REAL, fetched_at TIMESTAMP, total_rain_mm REAL, temp_max REAL, temp_min REAL,
+    uvi REAL, sunrise TIMESTAMP, sunset TIMESTAMP, PRIMARY KEY (date, city));
+"""
+
+
+def synthetic_rows(n_cities, hours=48, days=8):
+    now = datetime.now().replace(minute=0, second=0, microsecond=0)
+    rng = random.Random(42)
+    hourly, alerts, daily = [], [], []
+    for c in range(n_cities):
+        city = f"City {c}"
+        for h in range(hours):
+            hourly.append({"city": city, "forecast_time": now + timedelta(hours=h), "temp": rng.uniform(0, 35),
+                           "feels_like": rng.uniform(0, 35), "humidity": rng.randint(20, 100),
+                           "weather_condition": "light rain", "main_condition": "Rain",
+                           "rain_probability": rng.uniform(0, 100), "rain_1h": rng.uniform(0, 5),
+                           "wind_speed": rng.uniform(0, 40), "fetched_at": now})
+        for d in range(days):
+            daily.append({"date": (now + timedelta(days=d)).date(), "city": city, "temp": 20.0, "feels_like": 20.0,
+                          "humidity": 60, "weather_condition": "Light rain", "main_condition": "Rain",
+                          "rain_probability": 40.0, "wind_speed": 10.0, "fetched_at": now, "total_rain_mm": 2.5,
+                          "temp_max": 25.0, "temp_min": 15.0, "uvi": 6.0, "sunrise": now, "sunset": now})
+        if c % 10 == 0:
+            alerts.append({"city": city, "event": "Heavy rain", "start_time": now, "end_time": now + timedelta(days=1),
+                           "description": "Synthetic", "sender_name": "Bench", "fetched_at": now})
+    return {"hourly_weather_data": hourly, "weather_alerts": alerts, "weather_data": daily}
+
+
+def run(conn, tables, method):
+    with conn.cursor() as cursor:
+        cursor.execute(f"TRUNCATE {', '.join(tables)}")
+    conn.commit()
+    total = sum(len(rows) for rows in tables.values())
+    start = time.perf_counter()
+    for table, rows in tables.items():
+        bulk_upsert(conn, table, rows, method=method)
+    conn.commit()
+    elapsed = time.perf_counter() - start
+    return total, elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark del cargador masivo.")
+    parser.add_argument("--dsn", default="host=localhost dbname=weather_db user=postgres password=password")
+    parser.add_argument("--cities", type=int, default=200)
+    parser.add_argument("--methods", default="row,values,copy")
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(args.dsn)
+    with conn.cursor() as cursor:
+        cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE; CREATE SCHEMA {SCHEMA}; SET search_path TO {SCHEMA}")
+        cursor.execute(DDL)
+    conn.commit()
+    try:
+        tables = synthetic_rows(args.cities)
+        print(f"{'método':<8} {'filas':>8} {'segundos':>9} {'filas/s':>10}")
+        for method in args.methods.split(","):
+            rows, elapsed = run(conn, tables, method)
+            print(f"{method:<8} {rows:>8} {elapsed:>9.3f} {rows / elapsed:>10.0f}")
+    finally:
+        with conn.cursor() as cursor:
+            cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        conn.commit()
+        conn.close()
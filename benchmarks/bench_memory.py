@@ -0,0 +1,78 @@
+import argparse
+import os
+import pickle
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pandas as pd
+from dashboard_data import compact_frame, memory_report
+from snapshot import SNAPSHOT_DIR, read_snapshot
+
+# Memoria de las tablas del dashboard con el esquema original vs compact_frame, y costo de copiarlas
+# (pickle ida y vuelta, lo que hace st.cache_data en cada acierto).
+# Desde user-019 read_snapshot ya devuelve tablas compactas, así que el "antes" se reconstruye con el
+# esquema que produce load_from_sheets: textos como object, mediciones float64, enteros int64 y fechas
+# como datetime.date.
+# Uso: python benchmarks/bench_memory.py                    (snapshot publicado)
+#      python benchmarks/bench_memory.py --cities 1000      (snapshot sintético)
+
+
+def original_schema(df):
+    """Misma tabla con los tipos de load_from_sheets (sin compactar)."""
+    columns = {}
+    for col in df.columns:
+        series = df[col]
+        if isinstance(series.dtype, pd.CategoricalDtype) or pd.api.types.is_string_dtype(series.dtype):
+            columns[col] = series.astype(object).where(series.notna(), None)
+        elif pd.api.types.is_float_dtype(series.dtype):
+            columns[col] = series.astype("float64")
+        elif pd.api.types.is_integer_dtype(series.dtype):
+            columns[col] = series.astype("int64")
+        elif col == "date":
+            columns[col] = pd.Series([None if pd.isna(v) else pd.Timestamp(v).date() for v in series],
+                                     index=series.index, dtype=object)
+    return pd.DataFrame({col: columns.get(col, df[col]) for col in df.columns})
+
+
+def _copy_cost(tables):
+    start = time.perf_counter()
+    payload = pickle.dumps(tables, protocol=pickle.HIGHEST_PROTOCOL)
+    pickle.loads(payload)
+    return len(payload), time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reporte de memoria de las tablas del dashboard.")
+    parser.add_argument("--snapshot", default=SNAPSHOT_DIR)
+    parser.add_argument("--cities", type=int, help="Genera un snapshot sintético con este número de ciudades.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        if args.cities:
+            from bench_dashboard import synthetic_snapshot
+            synthetic_snapshot(directory, args.cities)
+            args.snapshot = directory
+        result = read_snapshot(args.snapshot)
+    if result is None:
+        sys.exit(f"No hay snapshot en {args.snapshot}")
+    tables = {name: original_schema(df) for name, df in result[0].items()}
+
+    compact = {name: compact_frame(df) for name, df in tables.items()}
+    before, after = memory_report(tables), memory_report(compact)
+    print(f"{'tabla':<10} {'filas':>9} {'antes':>10} {'después':>10} {'factor':>7}")
+    for name in tables:
+        print(f"{name:<10} {len(tables[name]):>9} {before[name] / 2**20:>8.2f}MB {after[name] / 2**20:>8.2f}MB "
+              f"{before[name] / max(after[name], 1):>6.1f}x")
+    total_before, total_after = sum(before.values()), sum(after.values())
+    print(f"{'total':<10} {'':>9} {total_before / 2**20:>8.2f}MB {total_after / 2**20:>8.2f}MB "
+          f"{total_before / max(total_after, 1):>6.1f}x")
+
+    for label, frames in (("antes", tables), ("después", compact)):
+        size, elapsed = _copy_cost(frames)
+        print(f"copia por acierto de caché ({label}): {size / 2**20:.2f}MB en {elapsed * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,554 @@
+import argparse
+import contextlib
+import json
+import os
+import pickle
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Windows: sin RSS máximo
+    resource = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Benchmark de punta a punta: fetch_and_store_weather_data (PASO 1), extract_and_upload_data (PASO 2) y
+# load_all_data (carga en frío del dashboard), con N ciudades sintéticas.
+#  - La API es el servidor local de mock_onecall_server.py, que reproduce respuestas grabadas (--fixtures)
+#    o las genera si no hay grabación. El repositorio NO incluye una grabación (hace falta una API key para
+#    hacerla): sin --fixtures, $WEATHER_BENCH_FIXTURES ni benchmarks/fixtures.jsonl, las respuestas son las
+#    sintéticas del mock, con la misma forma que One Call pero sin su variedad real (alertas, campos que faltan).
+#    El modo queda en la salida y en la referencia, y no se comparan referencias de modos distintos.
+#  - PostgreSQL es desechable: un esquema temporal en --dsn, o un clúster nuevo con initdb si no hay --dsn.
+#  - Google Sheets es una hoja falsa en memoria (FakeSpreadsheet) que se guarda entre etapas.
+# Cada etapa corre en su propio proceso para medir su RSS máximo por separado.
+# Uso:
+#   python benchmarks/bench_pipeline.py --record benchmarks/fixtures.jsonl --api-key KEY (grabar; se usa por defecto)
+#   python benchmarks/bench_pipeline.py --fixtures fixtures.jsonl --cities 1000 10000 --repeats 3
+#   python benchmarks/bench_pipeline.py --cities 1000 --save-baseline base.json
+#   python benchmarks/bench_pipeline.py --cities 1000 --baseline base.json --threshold 0.25   (falla si hay regresión)
+
+SCHEMA = "bench_pipeline"
+DEFAULT_FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures.jsonl")
+FIXTURES_ENV = "WEATHER_BENCH_FIXTURES"
+STAGES = ("fetch_and_store_weather_data", "extract_and_upload_data", "load_all_data")
+STAGE_UNITS = {  # Qué mide la latencia por unidad de cada etapa
+    "fetch_and_store_weather_data": "llamada a la API",
+    "extract_and_upload_data": "lectura/hoja",
+    "load_all_data": "rerun",
+}
+
+ALERTS_DDL = """CREATE TABLE weather_alerts (
+    city TEXT NOT NULL, event TEXT NOT NULL, start_time TIMESTAMP NOT NULL, end_time TIMESTAMP, description TEXT,
+    sender_name TEXT, fetched_at TIMESTAMP, PRIMARY KEY (city, event, start_time))"""
+CLUSTERS_DDL = """CREATE TABLE city_team_cluster (
+    city TEXT PRIMARY KEY, country_code TEXT, team TEXT, cluster TEXT)"""
+
+
+# --- 1. DATOS SINTÉTICOS ---
+
+def synthetic_cities(n_cities, seed=7):
+    """{ciudad: (lat, lon, zona horaria)} alrededor de las ciudades reales de cities.py."""
+    from cities import cities
+
+    rng = random.Random(seed)
+    base = list(cities.values())
+    result = {}
+    for i in range(n_cities):
+        lat, lon, tz = rng.choice(base)
+        result[f"City {i:05d}"] = (round(lat + rng.uniform(-1, 1), 4), round(lon + rng.uniform(-1, 1), 4), tz)
+    return result
+
+
+def synthetic_clusters(city_names, seed=7):
+    rng = random.Random(seed)
+    return [(city, rng.choice(["MX", "CO", "CL", "PE"]), rng.choice(["MX", "POC", "CASA"]),
+             rng.choice(["Growers", "Heros", "Rocket"])) for city in city_names]
+
+
+def record_fixtures(path, source_url, api_key, n_cities):
+    """Graba las respuestas One Call de las primeras `n_cities` ciudades reales en `path` (JSON Lines)."""
+    from cities import cities
+    from fetch_engine import fetch_all
+
+    results = fetch_all(list(cities.items())[:n_cities], api_key, source_url, calls_per_minute=60)
+    recorded = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for _, data in results:
+            if data:
+                f.write(json.dumps(data) + "\n")
+                recorded += 1
+    print(f"✅ {recorded} respuestas grabadas en '{path}'.")
+
+
+# --- 2. GOOGLE SHEETS FALSO ---
+
+class FakeWorksheet:
+    """Lo mínimo de gspread.Worksheet que usan sheets_sync.py y el dashboard, con las filas en memoria."""
+
+    def __init__(self, spreadsheet, title, sheet_id, rows=None):
+        self.spreadsheet = spreadsheet
+        self.title = title
+        self.id = sheet_id
+        self.rows = rows or []
+
+    def _write(self, start_row, values):
+        self.spreadsheet.touch()
+        end = start_row - 1 + len(values)
+        if end > len(self.rows):
+            self.rows.extend([] for _ in range(end - len(self.rows)))
+        for offset, row in enumerate(values):
+            self.rows[start_row - 1 + offset] = [str(v) for v in row]
+
+    def clear(self):
+        self.spreadsheet.touch()
+        self.rows = []
+
+    def resize(self, rows=None, cols=None):
+        self.spreadsheet.touch()
+        self.rows = (self.rows + [[] for _ in range(max(0, rows - len(self.rows)))])[:rows]
+
+    def update(self, values, range_name="A1", value_input_option=None):
+        from gspread.utils import a1_to_rowcol
+
+        self._write(a1_to_rowcol(range_name.split(":")[0])[0], values)
+
+    def batch_update(self, data, value_input_option=None):
+        from gspread.utils import a1_to_rowcol
+
+        for item in data:
+            self._write(a1_to_rowcol(item["range"].split(":")[0])[0], item["values"])
+
+    def append_rows(self, values, value_input_option=None, table_range=None):
+        self._write(len(self.rows) + 1, values)
+
+    def get_all_records(self):
+        from gspread.utils import numericise_all
+
+        if not self.rows:
+            return []
+        header = self.rows[0]
+        return [dict(zip(header, numericise_all(row))) for row in self.rows[1:]]
+
+
+class FakeSpreadsheet:
+    """Libro falso persistido con pickle en `path`, para que PASO 2 y el dashboard lo compartan entre procesos."""
+
+    def __init__(self, path, latency=0.0):
+        self.path = path
+        self.latency = latency
+        self.sheets = {}
+        self.last_update = "never"
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                stored = pickle.load(f)
+            self.last_update = stored["last_update"]
+            for i, (title, rows) in enumerate(stored["sheets"].items()):
+                self.sheets[title] = FakeWorksheet(self, title, i, rows)
+
+    def touch(self):
+        # Cada escritura simula el viaje de ida y vuelta a la API
+        if self.latency:
+            time.sleep(self.latency)
+        self.last_update = f"{time.time():.6f}"
+
+    def worksheet(self, title):
+        if title not in self.sheets:
+            self.sheets[title] = FakeWorksheet(self, title, len(self.sheets))
+        return self.sheets[title]
+
+    def batch_update(self, body):
+        for request in body["requests"]:
+            target = request["deleteDimension"]["range"]
+            worksheet = next(ws for ws in self.sheets.values() if ws.id == target["sheetId"])
+            self.touch()
+            del worksheet.rows[target["startIndex"]:target["endIndex"]]
+
+    def get_lastUpdateTime(self):
+        return self.last_update
+
+    def save(self):
+        with open(self.path, "wb") as f:
+            pickle.dump({"last_update": self.last_update,
+                         "sheets": {title: ws.rows for title, ws in self.sheets.items()}}, f)
+
+
+def patch_gspread(spreadsheet):
+    """Hace que gspread.authorize(...).open(...) devuelva `spreadsheet` en este proceso."""
+    import gspread
+    from google.oauth2 import service_account
+    from oauth2client.service_account import ServiceAccountCredentials
+
+    class _Client:
+        def open(self, name):
+            return spreadsheet
+
+    gspread.authorize = lambda credentials: _Client()
+    ServiceAccountCredentials.from_json_keyfile_name = staticmethod(lambda *args, **kwargs: None)
+    service_account.Credentials.from_service_account_info = staticmethod(lambda *args, **kwargs: None)
+
+
+# --- 3. POSTGRESQL DESECHABLE ---
+
+@contextlib.contextmanager
+def throwaway_postgres(dsn=None, pg_bin=None):
+    """
+    DSN de un PostgreSQL desechable: un esquema temporal en `dsn` (que se borra al terminar), o un clúster
+    nuevo creado con initdb en un directorio temporal, escuchando solo en un socket Unix.
+    """
+    import psycopg2
+
+    if dsn:
+        conn = psycopg2.connect(dsn)
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE; CREATE SCHEMA {SCHEMA}")
+        try:
+            yield f"{dsn} options='-c search_path={SCHEMA}'"
+        finally:
+            with conn.cursor() as cursor:
+                cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+            conn.close()
+        return
+
+    bin_dir = pg_bin or os.path.dirname(shutil.which("initdb") or "")
+    if not os.path.exists(os.path.join(bin_dir, "initdb")):
+        sys.exit("❌ No se encontró initdb: usa --dsn con un PostgreSQL existente o --pg-bin con sus binarios.")
+    data_dir = tempfile.mkdtemp(prefix="bench_pg_")
+    pg_ctl = os.path.join(bin_dir, "pg_ctl")
+    try:
+        subprocess.run([os.path.join(bin_dir, "initdb"), "-D", data_dir, "-U", "postgres", "-A", "trust"],
+                       check=True, capture_output=True)
+        subprocess.run([pg_ctl, "-D", data_dir, "-l", os.path.join(data_dir, "server.log"), "-w",
+                        "-o", f"-k {data_dir} -c listen_addresses=''", "start"], check=True, capture_output=True)
+        try:
+            yield f"host={data_dir} dbname=postgres user=postgres"
+        finally:
+            subprocess.run([pg_ctl, "-D", data_dir, "-m", "fast", "-w", "stop"], capture_output=True)
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+def prepare_database(dsn, city_names):
+    """Esquema vacío como el de producción (tablas particionadas) y city_team_cluster con las ciudades sintéticas."""
+    import psycopg2
+    from psycopg2.extras import execute_values
+    from storage import PARTITIONED_TABLES, ROLLUP_DDL
+
+    conn = psycopg2.connect(dsn)
+    with conn.cursor() as cursor:
+        cursor.execute("DROP TABLE IF EXISTS hourly_weather_data, weather_data, weather_alerts, city_team_cluster, "
+                       "hourly_weather_rollup, weather_group_summary, weather_rankings CASCADE")
+        for spec in PARTITIONED_TABLES.values():
+            cursor.execute(spec["ddl"])
+        for ddl in (ALERTS_DDL, CLUSTERS_DDL, ROLLUP_DDL):
+            cursor.execute(ddl)
+        execute_values(cursor, "INSERT INTO city_team_cluster VALUES %s", synthetic_clusters(city_names))
+    conn.commit()
+    conn.close()
+
+
+# --- 4. ETAPAS (una por proceso) ---
+
+def _table_rows(dsn, tables):
+    import psycopg2
+
+    conn = psycopg2.connect(dsn)
+    with conn.cursor() as cursor:
+        total = 0
+        for table in tables:
+            cursor.execute(f"SELECT COUNT(*) FROM {table}")
+            total += cursor.fetchone()[0]
+    conn.close()
+    return total
+
+
+def stage_fetch(config):
+    import Weather_extract as W
+    from fetch_engine import WeatherFetcher
+
+    latencies = []
+
+    class TimedFetcher(WeatherFetcher):
+        async def fetch(self, city, lat, lon, label=None):
+            start = time.perf_counter()
+            try:
+                return await super().fetch(city, lat, lon, label)
+            finally:
+                latencies.append(time.perf_counter() - start)
+
+    W.WeatherFetcher = TimedFetcher
+    W.cities = synthetic_cities(config["cities"])
+    W.BASE_URL = config["base_url"]
+    W.PG_CONFIG = {"dsn": config["dsn"]}
+    W.CALLS_PER_MINUTE = config["calls_per_minute"]
+    W.CACHE_DIR = os.path.join(config["work_dir"], "cache")
+    W.CACHE_TTL_SECONDS = 0  # Cada repetición vuelve a pedir todas las ciudades
+    start = time.perf_counter()
+    ok = W.fetch_and_store_weather_data()
+    elapsed = time.perf_counter() - start
+    rows = _table_rows(config["dsn"], ["weather_data", "hourly_weather_data", "weather_alerts"])
+    return {"ok": ok, "seconds": elapsed, "latencies": latencies, "rows": rows}
+
+
+def stage_extract(config):
+    import Weather_extract as W
+
+    spreadsheet = FakeSpreadsheet(config["sheets_path"], latency=config["sheets_latency"])
+    patch_gspread(spreadsheet)
+    latencies = []
+
+    def timed(fn):
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                latencies.append(time.perf_counter() - start)
+        return wrapper
+
+    W._read_table = timed(W._read_table)
+    W._sync_sheet = timed(W._sync_sheet)
+    W.PG_CONFIG = {"dsn": config["dsn"]}
+    W.SYNC_STATE_PATH = os.path.join(config["work_dir"], "sync_state.json")
+    W.SHEETS_WRITES_PER_MINUTE = config["sheets_writes_per_minute"]
+    start = time.perf_counter()
+    W.extract_and_upload_data()
+    elapsed = time.perf_counter() - start
+    spreadsheet.save()
+    rows = sum(max(len(ws.rows) - 1, 0) for ws in spreadsheet.sheets.values())
+    return {"ok": rows > 0, "seconds": elapsed, "latencies": latencies, "rows": rows}
+
+
+def stage_dashboard(config):
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(os.path.join(ROOT, "Weather_Dashboard.py"), default_timeout=600)
+    if config["dashboard_source"] == "sheets":
+        # Sin snapshot del extractor: el dashboard lee la hoja falsa y publica su propio snapshot
+        patch_gspread(FakeSpreadsheet(config["sheets_path"]))
+        app.secrets["gcp_service_account"] = {}
+    start = time.perf_counter()
+    app.run()
+    elapsed = time.perf_counter() - start
+    latencies = []
+    for _ in range(config["reruns"]):
+        rerun_start = time.perf_counter()
+        app.run()
+        latencies.append(time.perf_counter() - rerun_start)
+    from snapshot import read_manifest
+
+    manifest = read_manifest()
+    rows = sum(entry["rows"] for entry in manifest["tables"].values()) if manifest else 0
+    cards = sum(m.value.count("Details 📈") for m in app.markdown)
+    return {"ok": cards > 0 and not app.exception and not app.error, "seconds": elapsed, "latencies": latencies,
+            "rows": rows}
+
+
+STAGE_FUNCTIONS = {
+    "fetch_and_store_weather_data": stage_fetch,
+    "extract_and_upload_data": stage_extract,
+    "load_all_data": stage_dashboard,
+}
+
+
+def _peak_rss():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # Linux lo reporta en KB
+
+
+def worker(stage, config):
+    # Los prints del pipeline van a stderr; stdout queda para el resultado en JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        result = STAGE_FUNCTIONS[stage](config)
+    result["peak_rss"] = _peak_rss()
+    print(json.dumps(result))
+
+
+def run_stage(stage, config, verbose=False):
+    env = dict(os.environ)
+    env.pop("WEATHER_PG_DSN", None)  # El dashboard usa las tablas en memoria, no consultas por interacción
+    env["WEATHER_SNAPSHOT_DIR"] = config["snapshot_dirs"][stage]
+    out = subprocess.run([sys.executable, "-W", "ignore", os.path.abspath(__file__), "--stage", stage,
+                          "--config", json.dumps(config)], env=env, text=True, stdout=subprocess.PIPE,
+                         stderr=None if verbose else subprocess.PIPE)
+    if out.returncode != 0:
+        sys.exit(f"❌ La etapa {stage} falló:\n{out.stderr or ''}")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+# --- 5. REPORTE Y REGRESIONES ---
+
+def _percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(q / 100 * (len(ordered) - 1)))]
+
+
+def summarize(n_cities, runs):
+    seconds = [run["seconds"] for run in runs]
+    latencies = [value for run in runs for value in run["latencies"]]
+    p50 = _percentile(seconds, 50)
+    return {
+        "ok": all(run["ok"] for run in runs),
+        "seconds_p50": p50,
+        "seconds_p95": _percentile(seconds, 95),
+        "cities_per_s": n_cities / p50 if p50 else None,
+        "rows_per_s": runs[-1]["rows"] / p50 if p50 else None,
+        "unit_p50": _percentile(latencies, 50),
+        "unit_p95": _percentile(latencies, 95),
+        "unit_p99": _percentile(latencies, 99),
+        "peak_rss_mb": max((run["peak_rss"] or 0) for run in runs) / 2**20,
+    }
+
+
+def _ms(value):
+    return "–" if value is None else f"{value * 1000:.1f}"
+
+
+def print_report(n_cities, report):
+    print(f"\n🏙️ {n_cities} ciudades")
+    print(f"{'etapa':<30} {'p50 s':>8} {'p95 s':>8} {'ciudades/s':>11} {'filas/s':>10} "
+          f"{'unidad':>17} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'RSS máx':>9}")
+    for stage in STAGES:
+        r = report[stage]
+        flag = "" if r["ok"] else "  ⚠️ con errores"
+        print(f"{stage:<30} {r['seconds_p50']:>8.2f} {r['seconds_p95']:>8.2f} {r['cities_per_s']:>11.0f} "
+              f"{r['rows_per_s']:>10.0f} {STAGE_UNITS[stage]:>17} {_ms(r['unit_p50']):>8} {_ms(r['unit_p95']):>8} "
+              f"{_ms(r['unit_p99']):>8} {r['peak_rss_mb']:>7.0f}MB{flag}")
+
+
+def check_regressions(results, baseline, threshold):
+    """
+    Etapas cuyo p50 empeoró más de `threshold` (fracción) respecto a `baseline`.
+    Devuelve (regresiones, etapas comparadas); solo se comparan tamaños presentes en ambos.
+    """
+    regressions, compared = [], 0
+    for n_cities, report in results.items():
+        for stage, current in report.items():
+            previous = baseline.get(str(n_cities), {}).get(stage)
+            if not previous:
+                continue
+            compared += 1
+            if current["seconds_p50"] > previous["seconds_p50"] * (1 + threshold):
+                regressions.append((n_cities, stage, previous["seconds_p50"], current["seconds_p50"]))
+    return regressions, compared
+
+
+# --- 6. EJECUCIÓN ---
+
+def run_suite(args):
+    from mock_onecall_server import MockOneCallServer, load_fixtures
+
+    fixtures = load_fixtures(args.fixtures) if args.fixtures else None
+    if fixtures:
+        print(f"📼 Respuestas grabadas: {len(fixtures)} de '{args.fixtures}'.")
+    else:
+        print("⚠️ Sin grabación de One Call: se usan las respuestas sintéticas del mock (ver --record).")
+    server = MockOneCallServer(("127.0.0.1", 0), latency=args.api_latency, fixtures=fixtures)
+    base_url = server.start()
+    results = {}
+    try:
+        with throwaway_postgres(args.dsn, args.pg_bin) as dsn:
+            for n_cities in args.cities:
+                with tempfile.TemporaryDirectory() as work_dir:
+                    prepare_database(dsn, list(synthetic_cities(n_cities)))
+                    extractor_snapshot = os.path.join(work_dir, "snapshot")
+                    config = {
+                        "cities": n_cities, "dsn": dsn, "base_url": base_url, "work_dir": work_dir,
+                        "calls_per_minute": args.calls_per_minute, "sheets_latency": args.sheets_latency,
+                        "sheets_writes_per_minute": args.sheets_writes_per_minute,
+                        "sheets_path": os.path.join(work_dir, "sheets.pickle"), "reruns": args.reruns,
+                        "dashboard_source": args.dashboard_source,
+                        "snapshot_dirs": {"fetch_and_store_weather_data": extractor_snapshot,
+                                          "extract_and_upload_data": extractor_snapshot,
+                                          "load_all_data": extractor_snapshot},
+                    }
+                    runs = {stage: [] for stage in STAGES}
+                    for repeat in range(args.repeats):
+                        for stage in STAGES:
+                            if stage == "load_all_data" and args.dashboard_source == "sheets":
+                                # Carpeta nueva en cada repetición para medir la carga en frío desde Sheets
+                                config["snapshot_dirs"][stage] = os.path.join(work_dir, f"dashboard-{repeat}")
+                            runs[stage].append(run_stage(stage, config, args.verbose))
+                    results[n_cities] = {stage: summarize(n_cities, stage_runs) for stage, stage_runs in runs.items()}
+                print_report(n_cities, results[n_cities])
+    finally:
+        server.shutdown()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de punta a punta del pipeline del clima.")
+    parser.add_argument("--cities", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--reruns", type=int, default=5, help="Reruns del dashboard después de la carga en frío.")
+    parser.add_argument("--fixtures", default=os.environ.get(FIXTURES_ENV) or
+                        (DEFAULT_FIXTURES if os.path.exists(DEFAULT_FIXTURES) else None),
+                        help="Respuestas One Call grabadas (JSON Lines) para el servidor local "
+                             f"(por defecto ${FIXTURES_ENV} o benchmarks/fixtures.jsonl si existe).")
+    parser.add_argument("--record", metavar="PATH", help="Graba respuestas reales en PATH y termina.")
+    parser.add_argument("--record-cities", type=int, default=20)
+    parser.add_argument("--source-url", default=os.environ.get("OPENWEATHER_BASE_URL",
+                                                               "https://api.openweathermap.org/data/3.0/onecall"))
+    parser.add_argument("--api-key", default=os.environ.get("OPENWEATHER_API_KEY"))
+    parser.add_argument("--dsn", help="PostgreSQL existente donde crear un esquema desechable.")
+    parser.add_argument("--pg-bin", help="Carpeta con initdb/pg_ctl para levantar un clúster desechable.")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="Latencia artificial del servidor local (s).")
+    parser.add_argument("--calls-per-minute", type=int, default=1_000_000,
+                        help="Cuota del token bucket; por defecto sin límite para medir el código y no la cuota.")
+    parser.add_argument("--sheets-latency", type=float, default=0.0, help="Latencia artificial por escritura a Sheets (s).")
+    parser.add_argument("--sheets-writes-per-minute", type=int, default=1_000_000)
+    parser.add_argument("--dashboard-source", choices=["snapshot", "sheets"], default="snapshot")
+    parser.add_argument("--save-baseline", metavar="PATH", help="Guarda los resultados como referencia.")
+    parser.add_argument("--baseline", metavar="PATH", help="Compara contra una referencia y falla si hay regresión.")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Regresión permitida en el p50 de cada etapa (0.25 = 25%% más lento).")
+    parser.add_argument("--verbose", action="store_true", help="Muestra la salida de cada etapa.")
+    parser.add_argument("--stage", choices=STAGES, help=argparse.SUPPRESS)
+    parser.add_argument("--config", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.stage:
+        worker(args.stage, json.loads(args.config))
+        return
+    if args.record:
+        if not args.api_key:
+            sys.exit("❌ --record necesita --api-key (o OPENWEATHER_API_KEY).")
+        record_fixtures(args.record, args.source_url, args.api_key, args.record_cities)
+        return
+
+    results = run_suite(args)
+    payloads = f"recorded:{os.path.basename(args.fixtures)}" if args.fixtures else "synthetic"
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump({"payloads": payloads, **{str(n): report for n, report in results.items()}}, f, indent=2)
+        print(f"\n✅ Referencia guardada en '{args.save_baseline}'.")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("payloads", "synthetic") != payloads:
+            sys.exit(f"❌ '{args.baseline}' se midió con respuestas {baseline.get('payloads', 'synthetic')} "
+                     f"y esta corrida con {payloads}; no son comparables.")
+        regressions, compared = check_regressions(results, baseline, args.threshold)
+        if not compared:
+            sys.exit(f"❌ '{args.baseline}' no tiene resultados para {args.cities} ciudades.")
+        for n_cities, stage, before, after in regressions:
+            print(f"❌ Regresión: {stage} con {n_cities} ciudades pasó de {before:.2f}s a {after:.2f}s "
+                  f"(+{(after / before - 1) * 100:.0f}%, límite {args.threshold * 100:.0f}%).")
+        if regressions:
+            sys.exit(1)
+        print(f"\n✅ Sin regresiones mayores a {args.threshold * 100:.0f}% respecto a '{args.baseline}'.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from mock_onecall_server import build_payload
+from transform import iter_frames
+
+# Microbenchmark de la etapa de transformación: parseo fila por fila (versión anterior de
+# fetch_and_store_weather_data) vs iter_frames vectorizado.
+# Uso: python benchmarks/bench_transform.py --payloads grabados.json   (lista de [city, payload])
+#      python benchmarks/bench_transform.py --cities 1000               (payloads sintéticos)
+
+
+def legacy_parse(results):
+    all_hourly_data, all_alerts_data, all_daily_data = [], [], []
+    for city, data in results:
+        if data:
+            if 'hourly' in data:
+                for hour_data in data['hourly']: all_hourly_data.append(
+                    {'city': city, 'forecast_time': datetime.fromtimestamp(hour_data['dt']),
+                     'temp': round(hour_data.get('temp', 0), 2),
+                     'feels_like': round(hour_data.get('feels_like', 0), 2),
+                     'humidity': round(hour_data.get('humidity', 0), 2),
+                     'weather_condition': hour_data['weather'][0].get('description', ''),
+                     'main_condition': hour_data['weather'][0].get('main', ''),
+                     'rain_probability': round(hour_data.get('pop', 0) * 100, 2),
+                     'rain_1h': hour_data.get('rain', {}).get('1h', 0),
+                     'wind_speed': round(hour_data.get('wind_speed', 0) * 3.6, 2), 'fetched_at': datetime.now()})
+            if 'alerts' in data:
+                for alert in data['alerts']: all_alerts_data.append(
+                    {'city': city, 'event': alert.get('event', 'Alerta'),
+                     'start_time': datetime.fromtimestamp(alert['start']),
+                     'end_time': datetime.fromtimestamp(alert['end']), 'description': alert.get('description', ''),
+                     'sender_name': alert.get('sender_name', 'Fuente desconocida'), 'fetched_at': datetime.now()})
+            if 'daily' in data:
+                for day_data in data['daily']:
+                    summary_text = day_data.get('summary', day_data['weather'][0].get('description', ''))
+                    all_daily_data.append({"date": datetime.fromtimestamp(day_data['dt']).date(), "city": city,
+                                           "temp": round(day_data['temp'].get('day', 0), 2),
+                                           "feels_like": round(day_data['feels_like'].get('day', 0), 2),
+                                           "humidity": day_data.get('humidity', 0),
+                                           "weather_condition": summary_text.capitalize(),
+                                           "main_condition": day_data['weather'][0].get('main', ''),
+                                           "rain_probability": round(day_data.get('pop', 0) * 100, 2),
+                                           "wind_speed": round(day_data.get('wind_speed', 0) * 3.6, 2),
+                                           "fetched_at": datetime.now(), "total_rain_mm": day_data.get('rain', 0),
+                                           "temp_max": round(day_data['temp'].get('max', 0), 2),
+                                           "temp_min": round(day_data['temp'].get('min', 0), 2),
+                                           "uvi": day_data.get('uvi', 0),
+                                           "sunrise": datetime.fromtimestamp(day_data.get('sunrise', 0)),
+                                           "sunset": datetime.fromtimestamp(day_data.get('sunset', 0))})
+    return len(all_hourly_data) + len(all_alerts_data) + len(all_daily_data)
+
+
+def vectorized_parse(results):
+    return sum(len(df) for batch in iter_frames(results) for df in batch.values())
+
+
+def best_of(fn, results, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = fn(results)
+        timings.append(time.perf_counter() - start)
+    return rows, min(timings)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Microbenchmark de la etapa de transformación.")
+    parser.add_argument("--payloads", help="JSON con una lista de [city, payload] grabados de la API.")
+    parser.add_argument("--cities", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.payloads:
+        with open(args.payloads, encoding="utf-8") as f:
+            results = [tuple(item) for item in json.load(f)]
+    else:
+        results = [(f"City {i}", build_payload(i * 0.01, -i * 0.01, with_alert=i % 10 == 0)) for i in range(args.cities)]
+
+    print(f"{'etapa':<12} {'filas':>8} {'ms':>9} {'filas/s':>11}")
+    for name, fn in (("legacy", legacy_parse), ("vectorized", vectorized_parse)):
+        rows, elapsed = best_of(fn, results, args.repeat)
+        print(f"{name:<12} {rows:>8} {elapsed * 1000:>9.1f} {rows / elapsed:>11.0f}")
@@ -0,0 +1,126 @@
+import io
+import pandas as pd
+import psycopg2
+from psycopg2 import sql
+from psycopg2.extras import execute_values
+
+# Carga masiva hacia PostgreSQL: COPY a una tabla temporal + un solo upsert por tabla.
+# Si el servidor no permite COPY se usa execute_values por lotes.
+
+TABLES = {
+    "hourly_weather_data": {
+        "columns": ["city", "forecast_time", "temp", "feels_like", "humidity", "weather_condition", "main_condition",
+                    "rain_probability", "rain_1h", "wind_speed", "fetched_at"],
+        "key": ["city", "forecast_time"],
+        "on_conflict": "update",
+    },
+    "weather_alerts": {
+        "columns": ["city", "event", "start_time", "end_time", "description", "sender_name", "fetched_at"],
+        "key": ["city", "event", "start_time"],
+        "on_conflict": "nothing",
+    },
+    "weather_data": {
+        "columns": ["date", "city", "temp", "feels_like", "humidity", "weather_condition", "main_condition",
+                    "rain_probability", "wind_speed", "fetched_at", "total_rain_mm", "temp_max", "temp_min", "uvi",
+                    "sunrise", "sunset"],
+        "key": ["date", "city"],
+        "on_conflict": "update",
+    },
+}
+
+VALUES_PAGE_SIZE = 1000
+
+
+def _conflict_clause(spec):
+    key = sql.SQL(", ").join(map(sql.Identifier, spec["key"]))
+    if spec["on_conflict"] == "nothing":
+        return sql.SQL("ON CONFLICT ({}) DO NOTHING").format(key)
+    updates = sql.SQL(", ").join(
+        sql.SQL("{0}=EXCLUDED.{0}").format(sql.Identifier(col)) for col in spec["columns"] if col not in spec["key"])
+    return sql.SQL("ON CONFLICT ({}) DO UPDATE SET {}").format(key, updates)
+
+
+def _dedupe(df, spec):
+    # ON CONFLICT no acepta la misma llave dos veces en un solo INSERT; gana la última fila (o la primera si DO NOTHING)
+    keep = "first" if spec["on_conflict"] == "nothing" else "last"
+    return df.drop_duplicates(subset=spec["key"], keep=keep)
+
+
+def _python_rows(df, columns):
+    # Tipos nativos de Python para psycopg2 (NaN/NaT -> None)
+    subset = df[columns].astype(object)
+    return subset.where(subset.notna(), None).values.tolist()
+
+
+def upsert_per_row(cursor, table, rows):
+    """
+    Ruta original: un INSERT ... ON CONFLICT por fila. Se conserva para el benchmark.
+    """
+    spec = TABLES[table]
+    query = sql.SQL("INSERT INTO {} ({}) VALUES ({}) {}").format(
+        sql.Identifier(table), sql.SQL(", ").join(map(sql.Identifier, spec["columns"])),
+        sql.SQL(", ").join(sql.Placeholder(col) for col in spec["columns"]), _conflict_clause(spec))
+    for values in _python_rows(rows, spec["columns"]):
+        cursor.execute(query, dict(zip(spec["columns"], values)))
+    return len(rows)
+
+
+def upsert_values(cursor, table, rows):
+    """
+    Fallback sin COPY: execute_values en páginas de VALUES_PAGE_SIZE filas.
+    """
+    spec = TABLES[table]
+    rows = _dedupe(rows, spec)
+    query = sql.SQL("INSERT INTO {} ({}) VALUES %s {}").format(
+        sql.Identifier(table), sql.SQL(", ").join(map(sql.Identifier, spec["columns"])), _conflict_clause(spec))
+    execute_values(cursor, query.as_string(cursor), _python_rows(rows, spec["columns"]), page_size=VALUES_PAGE_SIZE)
+    return len(rows)
+
+
+def upsert_copy(cursor, table, rows):
+    """
+    COPY a una tabla temporal con la misma estructura y un solo INSERT ... SELECT ... ON CONFLICT.
+    """
+    spec = TABLES[table]
+    rows = _dedupe(rows, spec)
+    staging = f"_stage_{table}"
+    columns = sql.SQL(", ").join(map(sql.Identifier, spec["columns"]))
+    cursor.execute(sql.SQL("CREATE TEMP TABLE IF NOT EXISTS {} (LIKE {} INCLUDING DEFAULTS) ON COMMIT DROP").format(
+        sql.Identifier(staging), sql.Identifier(table)))
+    cursor.execute(sql.SQL("TRUNCATE {}").format(sql.Identifier(staging)))
+
+    buffer = io.StringIO()
+    rows.to_csv(buffer, columns=spec["columns"], header=False, index=False, na_rep="\\N")
+    buffer.seek(0)
+    copy = sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv, NULL '\\N')").format(sql.Identifier(staging), columns)
+    cursor.copy_expert(copy.as_string(cursor), buffer)
+
+    cursor.execute(sql.SQL("INSERT INTO {} ({}) SELECT {} FROM {} {}").format(
+        sql.Identifier(table), columns, columns, sql.Identifier(staging), _conflict_clause(spec)))
+    return len(rows)
+
+
+def bulk_upsert(conn, table, rows, method="copy"):
+    """
+    Inserta `rows` (DataFrame o lista de dicts) en `table` dentro de la transacción abierta de `conn`.
+    Con method="copy" intenta COPY y, si el servidor lo rechaza, vuelve a execute_values.
+    Devuelve (filas escritas, método usado).
+    """
+    if not isinstance(rows, pd.DataFrame):
+        rows = pd.DataFrame(list(rows), columns=TABLES[table]["columns"])
+    if rows.empty:
+        return 0, method
+    with conn.cursor() as cursor:
+        if method == "copy":
+            cursor.execute("SAVEPOINT bulk_copy")
+            try:
+                written = upsert_copy(cursor, table, rows)
+                cursor.execute("RELEASE SAVEPOINT bulk_copy")
+                return written, "copy"
+            except (psycopg2.errors.InsufficientPrivilege, psycopg2.errors.FeatureNotSupported,
+                    psycopg2.errors.QueryCanceled) as e:
+                print(f"⚠️ COPY no disponible para '{table}' ({e.pgcode}), usando execute_values.")
+                cursor.execute("ROLLBACK TO SAVEPOINT bulk_copy")
+        if method == "row":
+            return upsert_per_row(cursor, table, rows), "row"
+        return upsert_values(cursor, table, rows), "values"
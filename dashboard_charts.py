@@ -0,0 +1,92 @@
+import numpy as np
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+# Plotly figure builders for the Detailed Analysis view.
+# Builders are pure functions of the rows they plot, so the page can memoize a figure per
+# (city, date, data version) and hand the same object to every rerun and session.
+# Long ranges are downsampled with LTTB (Largest-Triangle-Three-Buckets), which keeps peaks and troughs
+# that plain striding or bucket means would flatten, so a chart never carries more than `max_points`.
+
+HISTORY_POINTS = 300  # Per trace; a chart is a few hundred pixels wide
+
+
+def lttb(x, y, threshold):
+    """
+    Positions of the `threshold` points of (x, y) that LTTB keeps, first and last included.
+    `x` must be increasing (datetimes are fine); gaps (NaN) in `y` count as the series mean.
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x)
+    x = (x.astype("datetime64[ns]").astype(np.int64) if np.issubdtype(x.dtype, np.datetime64) else x).astype(np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    y = np.nan_to_num(y, nan=np.nanmean(y) if np.isfinite(y).any() else 0.0)
+    # n - 2 inner points split into threshold - 2 buckets; one point is chosen per bucket
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    chosen = np.empty(threshold, dtype=np.int64)
+    chosen[0], chosen[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # The third vertex is the mean of the next bucket (the last point for the final bucket)
+        next_lo, next_hi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        cx, cy = x[next_lo:next_hi].mean(), y[next_lo:next_hi].mean()
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(area.argmax())
+        chosen[i + 1] = a
+    return chosen
+
+
+def hourly_figure(df, timezone):
+    """Temperature line and rain-probability bars for one city's local day."""
+    rain_text_labels = [f'{x:.1f} mm' if x > 0 else '' for x in df['rain_1h']]
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=df['local_time'], y=df['temp'], mode='lines+markers', name='Temperature (°C)', yaxis='y1', line=dict(color='orange')))
+    fig.add_trace(go.Bar(x=df['local_time'], y=df['rain_probability'], name='Rain Probability (%)', yaxis='y2', marker_color='blue', opacity=0.6, text=rain_text_labels, textposition='outside'))
+    fig.update_layout(title_text="Hourly Temperature & Rain Probability", yaxis=dict(title="Temperature (°C)", color='orange'), yaxis2=dict(title="Rain Probability (%)", overlaying='y', side='right', range=[0, 100], color='blue'), legend=dict(x=0, y=1.2, orientation="h"))
+    fig.update_xaxes(title_text=f"Time ({timezone})")
+    return fig
+
+
+def trend_figure(df):
+    """Daily max/min temperature band and UV index bars."""
+    fig = make_subplots(specs=[[{"secondary_y": True}]])
+    fig.add_trace(go.Scatter(x=df['date'], y=df['temp_max'], mode='lines+markers', name='Max Temp', line=dict(color='red')), secondary_y=False)
+    fig.add_trace(go.Scatter(x=df['date'], y=df['temp_min'], mode='lines+markers', name='Min Temp', line=dict(color='lightblue'), fill='tonexty', fillcolor='rgba(255, 165, 0, 0.2)'), secondary_y=False)
+    fig.add_trace(go.Bar(x=df['date'], y=df['uvi'], name='UV Index', marker_color='purple', opacity=0.5, text=df['uvi'].round(1)), secondary_y=True)
+    fig.update_layout(title_text="Temperature Range & UV Index", legend=dict(x=0, y=1.2, orientation="h"))
+    fig.update_yaxes(title_text="Temperature (°C)", secondary_y=False)
+    fig.update_yaxes(title_text="UV Index", secondary_y=True, range=[0, df['uvi'].max() + 2])
+    return fig
+
+
+def history_figure(df, timezone, max_points=HISTORY_POINTS):
+    """
+    Temperature and rain probability over a long hourly range, each trace downsampled with LTTB
+    to at most `max_points` points.
+    """
+    x = df['local_time'].to_numpy()
+    fig = make_subplots(specs=[[{"secondary_y": True}]])
+    for col, name, color, secondary in (('temp', 'Temperature (°C)', 'orange', False),
+                                        ('rain_probability', 'Rain Probability (%)', 'blue', True)):
+        y = df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+        keep = lttb(x, y, max_points)
+        fig.add_trace(go.Scatter(x=x[keep], y=y[keep], mode='lines', name=name, line=dict(color=color)), secondary_y=secondary)
+    shown = min(len(df), max_points)
+    fig.update_layout(title_text=f"Hourly History ({shown} of {len(df)} points per series)", legend=dict(x=0, y=1.2, orientation="h"))
+    fig.update_xaxes(title_text=f"Time ({timezone})")
+    fig.update_yaxes(title_text="Temperature (°C)", secondary_y=False)
+    fig.update_yaxes(title_text="Rain Probability (%)", secondary_y=True, range=[0, 100])
+    return fig
+
+
+def comparison_figure(df, title, y_title, timezone):
+    """One line per city (column) of a wide frame, as built by CityPanel.frame."""
+    fig = go.Figure()
+    for city in df.columns:
+        fig.add_trace(go.Scatter(x=df.index, y=df[city], mode='lines', name=str(city)))
+    fig.update_layout(title_text=title, yaxis=dict(title=y_title), hovermode='x unified')
+    fig.update_xaxes(title_text=f"Time ({timezone})")
+    return fig
@@ -0,0 +1,419 @@
+import threading
+import time
+import numpy as np
+import pandas as pd
+
+# In-memory lookup structures for the dashboards, built once per data refresh in load_all_data.
+
+# Keys are normalized (lowercase, stripped) conditions: OpenWeather descriptions and main groups
+WEATHER_ICONS = {
+    "clouds": "☁️", "rain": "🌧️", "clear": "☀️", "thunderstorm": "⛈️",
+    "snow": "❄️", "drizzle": "🌦️", "mist": "🌫️", "fog": "🌫️", "haze": "🌫️",
+    "smoke": "🌫️", "dust": "💨", "sand": "💨", "ash": "🌋", "squall": "🌬️", "tornado": "🌪️",
+    "clear sky": "☀️", "few clouds": "🌤️", "scattered clouds": "⛅", "broken clouds": "☁️",
+    "overcast clouds": "🌥️", "shower rain": "🌦️", "light rain": "🌦️", "moderate rain": "🌧️",
+    "heavy rain": "🌧️", "volcanic ash": "🌋", "squalls": "🌬️",
+}
+DEFAULT_ICON = "🌎"
+
+
+# Compact in-memory schema, by column name across all dashboard tables
+CATEGORY_COLUMNS = {"city", "weather_condition", "main_condition", "country_code", "team", "cluster", "event",
+                    "sender_name", "metric"}
+FLOAT32_COLUMNS = {"temp", "feels_like", "wind_speed", "rain_1h", "total_rain_mm", "temp_max", "temp_min", "uvi",
+                   "temp_mean", "rain_probability_mean", "rain_probability_max", "uvi_max", "wind_speed_max", "value"}
+INT8_COLUMNS = {"humidity", "rain_probability", "rank"}  # percentages and ranks: 0-100
+INT16_COLUMNS = {"cities", "rainy_cities"}
+TIMESTAMP_COLUMNS = {"forecast_time", "start_time", "end_time", "fetched_at", "sunrise", "sunset"}
+DATE_COLUMNS = {"date"}
+
+
+def _compact_integer(series, dtype):
+    # Integers only when every value is a whole number; otherwise (fractions, gaps) fall back to float32
+    values = pd.to_numeric(series, errors="coerce")
+    if values.isna().any() or (values % 1 != 0).any():
+        return values.astype("float32")
+    return values.astype(dtype)
+
+
+def _is_compact(col, dtype):
+    if col in CATEGORY_COLUMNS:
+        return isinstance(dtype, pd.CategoricalDtype)
+    if col in FLOAT32_COLUMNS:
+        return dtype == "float32"
+    if col in INT8_COLUMNS or col in INT16_COLUMNS:
+        return dtype in ("int8", "int16")
+    if col in DATE_COLUMNS or col in TIMESTAMP_COLUMNS:
+        return pd.api.types.is_datetime64_any_dtype(dtype)
+    return True
+
+
+def compact_frame(df):
+    """
+    Same table with the compact schema: categorical labels, float32 measurements, int8/int16 counts and
+    percentages, and datetime64 (int64 epoch) timestamps and dates instead of Python objects.
+    """
+    columns = {}
+    for col in df.columns:
+        series = df[col]
+        if _is_compact(col, series.dtype):
+            continue  # keep columns that are already compact, e.g. zero-copy views of a mapped snapshot
+        if col in CATEGORY_COLUMNS:
+            columns[col] = series.astype("category")
+        elif col in FLOAT32_COLUMNS:
+            columns[col] = pd.to_numeric(series, errors="coerce").astype("float32")
+        elif col in INT8_COLUMNS:
+            columns[col] = _compact_integer(series, "int8")
+        elif col in INT16_COLUMNS:
+            columns[col] = _compact_integer(series, "int16")
+        elif col in DATE_COLUMNS or col in TIMESTAMP_COLUMNS:
+            columns[col] = series if pd.api.types.is_datetime64_any_dtype(series) else pd.to_datetime(series)
+    return df.assign(**columns) if columns else df
+
+
+def memory_report(tables):
+    """Deep memory usage in bytes per table, e.g. to compare before/after compact_frame."""
+    return {name: int(df.memory_usage(index=True, deep=True).sum())
+            for name, df in tables.items() if isinstance(df, pd.DataFrame)}
+
+
+def _normalized(series):
+    # Same text as str(value).lower().strip(), computed once per distinct value
+    series = series.astype(str).astype("category")
+    return series.map({value: value.lower().strip() for value in series.cat.categories}).astype("category")
+
+
+def resolve_icons(weather_condition, main_condition):
+    """Icon per row: the description's icon, else the main group's, else DEFAULT_ICON."""
+    icons = _normalized(weather_condition).map(WEATHER_ICONS).astype(object)
+    fallback = _normalized(main_condition).map(WEATHER_ICONS).astype(object)
+    return icons.where(icons.notna(), fallback).fillna(DEFAULT_ICON)
+
+
+def _label(series, suffix=""):
+    return series.astype(str) + suffix
+
+
+def add_display_columns(df):
+    """
+    Precomputed, ready-to-print columns for the cards and forecast tiles of a daily table:
+    condition, icon, condition_label, day_label and the temperature and rain labels.
+    """
+    if df.empty:
+        return df.assign(condition=[], icon=[], condition_label=[], day_label=[], temp_label=[],
+                         temp_range_label=[], rain_label=[], rain_total_label=[])
+    condition = df["weather_condition"].astype(str)
+    return df.assign(
+        condition=_normalized(df["weather_condition"]),
+        icon=resolve_icons(df["weather_condition"], df["main_condition"]),
+        condition_label=condition.str.capitalize(),
+        day_label=pd.to_datetime(df["date"]).dt.strftime("%a, %d"),
+        temp_label=_label(df["temp"], "°C"),
+        temp_range_label=_label(df["temp_min"], "°C / ") + _label(df["temp_max"], "°C"),
+        rain_label=_label(df["rain_probability"], "%"),
+        rain_total_label=_label(df["total_rain_mm"], " mm"),
+    )
+
+
+def local_wall_clock(times, cities, timezones, default_tz="UTC"):
+    """
+    Naive local wall-clock datetime64 of the tz-aware (or naive UTC) `times`, each row in the IANA zone of
+    its city (`timezones` maps city -> zone; unknown cities use `default_tz`). Rows are grouped by zone and
+    each group is converted in one vectorized pass, so the cost grows with zones, not cities.
+    """
+    times = pd.to_datetime(times)
+    utc = (times.dt.tz_convert("UTC") if times.dt.tz is not None else times.dt.tz_localize("UTC")).dt.tz_localize(None)
+    values = utc.to_numpy()
+    cities = cities.astype("category")
+    zones = [timezones.get(city, default_tz) for city in cities.cat.categories] + [default_tz]
+    zone_codes, unique_zones = pd.factorize(np.array(zones, dtype=object))
+    city_codes = cities.cat.codes.to_numpy()
+    # Rows without a city (code -1) take the last entry, the default zone
+    row_zones = zone_codes[np.where(city_codes >= 0, city_codes, len(zones) - 1)]
+    local = values.copy()
+    for code, zone in enumerate(unique_zones):
+        positions = np.flatnonzero(row_zones == code)
+        if len(positions):
+            local[positions] = (pd.DatetimeIndex(values[positions]).tz_localize("UTC").tz_convert(zone)
+                                .tz_localize(None).to_numpy())
+    return pd.Series(local, index=times.index, name=times.name)
+
+
+def add_local_time(df, time_col, timezones, default_tz="UTC"):
+    """
+    Same table plus `local_time` (wall clock in each city's zone) and `local_date` (its calendar day,
+    as midnight datetime64) for `time_col`, which stays tz-aware UTC for ordering and windows.
+    """
+    if df.empty:
+        return df.assign(local_time=pd.Series(dtype="datetime64[us]"), local_date=pd.Series(dtype="datetime64[us]"))
+    local = local_wall_clock(df[time_col], df["city"], timezones, default_tz)
+    return df.assign(local_time=local, local_date=local.dt.normalize())
+
+
+def _local_days(series):
+    # Local calendar day of a tz-aware series as datetime64[D] (same result as .dt.date)
+    if series.dt.tz is not None:
+        series = series.dt.tz_localize(None)
+    return series.values.astype("datetime64[D]")
+
+
+class AlertIndex:
+    """
+    Interval index over weather alerts keyed by city.
+
+    Per city, alerts are sorted by start day and carry a running max of the end day, so
+    "alerts active for city X on day D" is two binary searches plus the matches.
+    """
+
+    def __init__(self, alerts_df):
+        self.alerts = alerts_df.reset_index(drop=True)
+        self.by_city = {}
+        if self.alerts.empty or "start_time" not in self.alerts.columns:
+            self.start_days = self.end_days = np.array([], dtype="datetime64[D]")
+            self.cities = np.array([], dtype=object)
+            return
+        self.start_days = _local_days(self.alerts["start_time"])
+        self.end_days = _local_days(self.alerts["end_time"])
+        self.cities = self.alerts["city"].to_numpy(dtype=object)
+        for city, positions in self.alerts.groupby("city", sort=False, observed=True).indices.items():
+            positions = positions[np.argsort(self.start_days[positions], kind="stable")]
+            starts = self.start_days[positions]
+            max_end = np.maximum.accumulate(self.end_days[positions])
+            self.by_city[city] = (positions, starts, max_end)
+
+    def positions(self, city, day):
+        """Row positions in `self.alerts` of the alerts active for `city` on `day`."""
+        entry = self.by_city.get(city)
+        if entry is None:
+            return np.array([], dtype=np.intp)
+        positions, starts, max_end = entry
+        day = np.datetime64(day, "D")
+        hi = np.searchsorted(starts, day, side="right")  # start <= day
+        lo = np.searchsorted(max_end[:hi], day, side="left")  # nothing before lo can still be running
+        candidates = positions[lo:hi]
+        return candidates[self.end_days[candidates] >= day]
+
+    def active(self, city, day):
+        """Alerts (DataFrame) active for `city` on `day`."""
+        return self.alerts.iloc[self.positions(city, day)]
+
+    def cities_active_on(self, day):
+        """Set of cities with at least one alert active on `day`, in one vectorized pass."""
+        day = np.datetime64(day, "D")
+        mask = (self.start_days <= day) & (self.end_days >= day)
+        return set(pd.unique(self.cities[mask]))
+
+
+def _sort_keys(series):
+    # Comparable datetime64 keys (naive UTC) for dates, naive and tz-aware timestamps
+    series = pd.to_datetime(series)
+    if series.dt.tz is not None:
+        series = series.dt.tz_convert("UTC").dt.tz_localize(None)
+    return series.values
+
+
+def _sort_key(value):
+    ts = pd.Timestamp(value)
+    if ts.tz is not None:
+        ts = ts.tz_convert("UTC").tz_localize(None)
+    return ts.to_datetime64()
+
+
+def _city_runs(df, keys):
+    # [(city, start, stop)] when every city is one contiguous run of rows sorted by `keys`, else None
+    codes, uniques = pd.factorize(df["city"])
+    starts = np.flatnonzero(np.diff(codes, prepend=-2))
+    if len(starts) != len(uniques) or (codes < 0).any():
+        return None
+    stops = np.append(starts[1:], len(codes))
+    # Time may only go backwards where a new city starts
+    backwards = np.flatnonzero(np.diff(keys) < np.timedelta64(0)) + 1
+    if not np.isin(backwards, starts).all():
+        return None
+    return [(uniques[codes[lo]], lo, hi) for lo, hi in zip(starts, stops)]
+
+
+class CityStore:
+    """
+    A table laid out by city, each city's rows sorted by `time_col`.
+
+    Switching city is a dict lookup and a time window is two binary searches over the
+    city's sorted keys, instead of boolean masks over the whole table on every rerun.
+    With `day_col` (a local calendar day column), each city's days are also kept as row ranges.
+    """
+
+    def __init__(self, df, time_col, day_col=None):
+        self.time_col = time_col
+        self.empty = df.iloc[0:0].reset_index(drop=True)
+        self.partitions = {}  # city -> (first row, end row)
+        self.days = {}  # city -> {day: (first row, end row)}
+        self.table = df
+        if df.empty:
+            return
+        # Already laid out by city and time (as the snapshot is written), the table is used as is and
+        # every lookup is a slice view of it; sort keys and day runs are computed once for all cities
+        self.keys = _sort_keys(df[time_col])
+        bounds = _city_runs(df, self.keys)
+        if bounds is None:
+            self.table = df[df["city"].notna()].sort_values(["city", time_col], kind="stable", ignore_index=True)
+            self.keys = _sort_keys(self.table[time_col])
+            bounds = _city_runs(self.table, self.keys)
+        self.partitions = {city: (lo, hi) for city, lo, hi in bounds}
+        if day_col is not None:
+            # Local days are non-decreasing in time, so each (city, day) is one contiguous run of rows
+            days = self.table[day_col].to_numpy().astype("datetime64[D]")
+            changes = np.diff(days, prepend=np.datetime64("NaT")) != np.timedelta64(0)
+            changes[[lo for lo, _ in self.partitions.values()]] = True
+            starts = np.flatnonzero(changes)
+            stops = np.append(starts[1:], len(days))
+            first_run = np.searchsorted(starts, [lo for lo, _ in self.partitions.values()])
+            last_run = np.append(first_run[1:], len(starts))
+            for city, first, last in zip(self.partitions, first_run, last_run):
+                self.days[city] = {days[lo]: (lo, hi) for lo, hi in zip(starts[first:last], stops[first:last])}
+
+    def cities(self):
+        return list(self.partitions)
+
+    def get(self, city):
+        """All rows for `city`, sorted by time."""
+        bounds = self.partitions.get(city)
+        return self.empty if bounds is None else self.table.iloc[bounds[0]:bounds[1]]
+
+    def day(self, city, day):
+        """Rows for `city` on local calendar `day` (requires `day_col`): a dict lookup and a slice."""
+        bounds = self.days.get(city, {}).get(np.datetime64(pd.Timestamp(day).date(), "D"))
+        return self.empty if bounds is None else self.table.iloc[bounds[0]:bounds[1]]
+
+    def window(self, city, start=None, end=None):
+        """Rows for `city` with start <= time < end (either bound may be None)."""
+        bounds = self.partitions.get(city)
+        if bounds is None:
+            return self.empty
+        first, last = bounds
+        keys = self.keys[first:last]
+        lo = first if start is None else first + np.searchsorted(keys, _sort_key(start), side="left")
+        hi = last if end is None else first + np.searchsorted(keys, _sort_key(end), side="left")
+        return self.table.iloc[lo:hi]
+
+
+class CityPanel:
+    """
+    Hourly series laid out column-per-city: one (hour x city) float32 matrix per metric, on a UTC grid
+    shared by all cities.
+
+    Comparing cities is a row slice and a column selection of these matrices, instead of one boolean
+    filter of the long table per city; resampling then runs on the small wide frame that results.
+    """
+
+    def __init__(self, df, time_col, metrics):
+        self.columns = {}  # city -> matrix column
+        self.times = np.array([], dtype="datetime64[ns]")
+        # metric -> (hours, cities) matrix, NaN where a city has no row
+        self.values = {metric: np.empty((0, 0), dtype=np.float32) for metric in metrics}
+        # Rows without a city or a time (blank Sheets cells) have no place on the grid
+        df = df[df["city"].notna() & df[time_col].notna()]
+        if df.empty:
+            return
+        hours = _sort_keys(df[time_col]).astype("datetime64[h]")
+        start = hours.min()
+        rows = (hours - start).astype(np.int64)
+        self.times = (start + np.arange(rows.max() + 1)).astype("datetime64[ns]")
+        codes, names = pd.factorize(df["city"], sort=True)
+        self.columns = {city: i for i, city in enumerate(names)}
+        for metric in metrics:
+            matrix = np.full((len(self.times), len(names)), np.nan, dtype=np.float32)
+            matrix[rows, codes] = df[metric].to_numpy(dtype=np.float32, na_value=np.nan)
+            self.values[metric] = matrix
+
+    def cities(self):
+        return list(self.columns)
+
+    def frame(self, cities, metric, start=None, end=None, rule=None, how="mean", tz="UTC"):
+        """
+        Wide frame (one column per city) of `metric` with start <= time < end, indexed by naive wall-clock
+        time in `tz`. With a pandas `rule` ("3h", "D"), rows are aggregated with `how` into buckets aligned
+        to local midnight in `tz`.
+        """
+        cities = [city for city in cities if city in self.columns]
+        lo = 0 if start is None else np.searchsorted(self.times, _sort_key(start), side="left")
+        hi = len(self.times) if end is None else np.searchsorted(self.times, _sort_key(end), side="left")
+        index = pd.DatetimeIndex(self.times[lo:hi]).tz_localize("UTC").tz_convert(tz)
+        df = pd.DataFrame(self.values[metric][lo:hi, [self.columns[city] for city in cities]],
+                          index=index, columns=cities)
+        if rule is not None:
+            df = df.resample(rule).agg(how)
+        df.index = df.index.tz_localize(None)
+        return df
+
+
+def group_index(df, keys):
+    """{tuple(key values): rows} for a table that is always read one group at a time."""
+    if df is None or df.empty:
+        return {}
+    return {key: part.reset_index(drop=True) for key, part in df.groupby(keys, sort=False, observed=True)}
+
+
+class BackgroundRefresher:
+    """
+    Holds the last loaded value together with the data version it was built from.
+
+    When a newer version shows up, `get` keeps returning the previous value and loads the new one in
+    a background thread, swapping it in once it is ready. Only the very first load blocks, and only one
+    thread runs it: concurrent first sessions wait for it and share its result.
+    A failed load is not retried before `retry_at`, which backs off exponentially (from `retry_seconds` up
+    to `max_retry_seconds`) while loads keep failing, so a broken source is not hammered on every rerun.
+    """
+
+    def __init__(self, loader, retry_seconds=30.0, max_retry_seconds=900.0):
+        self.loader = loader
+        self.retry_seconds = retry_seconds
+        self.max_retry_seconds = max_retry_seconds
+        self.value = None
+        self.version = None
+        self.error = None
+        self.loading = None
+        self.failed_version = None
+        self.failures = 0
+        self.retry_at = 0.0
+        self._lock = threading.Lock()
+        self._first_load = threading.Lock()
+
+    def _backing_off(self):
+        return self.failures and time.monotonic() < self.retry_at
+
+    def get(self, version):
+        with self._lock:
+            if self.value is not None:
+                if (version is not None and version != self.version and self.loading is None
+                        and not self._backing_off()):
+                    self.loading = version
+                    threading.Thread(target=self._refresh, args=(version,), daemon=True).start()
+                return self.value
+        with self._first_load:
+            with self._lock:
+                if self.value is not None:
+                    return self.value
+                if self._backing_off():
+                    raise self.error
+            self._refresh(version)
+            with self._lock:
+                if self.value is None:
+                    raise self.error
+                return self.value
+
+    def _refresh(self, version):
+        try:
+            value, error = self.loader(version), None
+        except Exception as e:
+            value, error = None, e
+        with self._lock:
+            self.error = error
+            if error is None:
+                self.value, self.version = value, version
+                self.failed_version, self.failures = None, 0
+            else:
+                self.failed_version = version
+                self.failures += 1
+                delay = min(self.max_retry_seconds, self.retry_seconds * 2 ** (self.failures - 1))
+                self.retry_at = time.monotonic() + delay
+            self.loading = None
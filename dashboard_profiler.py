@@ -0,0 +1,128 @@
+import argparse
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from html import escape
+
+# Opt-in rerun profiler for the dashboards.
+# The page calls profiler.lap("section") at the end of each section; every lap is the time since the
+# previous one, so sections are timed without re-indenting the page. Enabled with ?profile=1 or with
+#   [dashboard]
+#   profile = true
+# in .streamlit/secrets.toml. When enabled, each run shows a breakdown panel and appends one JSON line
+# to $WEATHER_PROFILE_LOG (default profile_log.jsonl); `python dashboard_profiler.py` aggregates the log
+# into p50/p95 per section, per release ($WEATHER_RELEASE).
+# Disabled, lap() is one attribute check.
+
+PROFILE_PARAM = "profile"
+PROFILE_LOG_ENV = "WEATHER_PROFILE_LOG"
+RELEASE_ENV = "WEATHER_RELEASE"
+DEFAULT_LOG = "profile_log.jsonl"
+
+_log_lock = threading.Lock()
+
+
+def profiling_requested(query_params, secrets):
+    """True if ?profile=1 (or true/yes) is in the URL or `dashboard.profile` is set in the secrets."""
+    if str(query_params.get(PROFILE_PARAM, "")).lower() in ("1", "true", "yes"):
+        return True
+    try:
+        return bool(secrets.get("dashboard", {}).get("profile", False))
+    except Exception:
+        return False  # No secrets file
+
+
+class RerunProfiler:
+    """
+    Lap timer for one script run (scope "script") or one fragment rerun (scope = fragment name).
+    """
+
+    def __init__(self, enabled, page=None, scope="script", log_path=None):
+        self.enabled = enabled
+        self.page = page
+        self.scope = scope
+        self.log_path = log_path or os.environ.get(PROFILE_LOG_ENV, DEFAULT_LOG)
+        self.started = self.last = time.perf_counter()
+        self.laps = []
+        self.finished = False
+
+    def lap(self, name):
+        """Close the current section as `name`."""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.laps.append((name, now - self.last))
+        self.last = now
+
+    def fragment(self, name):
+        """
+        Profiler for a fragment body: this one while the full script run is still going, a new one when
+        the fragment reruns on its own (the script run it belongs to has already finished).
+        """
+        if not self.finished:
+            return self
+        return RerunProfiler(self.enabled, self.page, name, self.log_path)
+
+    def finish(self):
+        """Stop timing and append the run to the log. Returns the record, or None when disabled."""
+        if not self.enabled or self.finished:
+            return None
+        self.finished = True
+        record = {"ts": datetime.now(timezone.utc).isoformat(), "release": os.environ.get(RELEASE_ENV, "dev"),
+                  "page": self.page, "scope": self.scope, "total": time.perf_counter() - self.started,
+                  "sections": {name: seconds for name, seconds in self.laps}}
+        try:
+            with _log_lock, open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+        except OSError:
+            pass  # Profiling must never break the page
+        return record
+
+
+def breakdown_html(record):
+    """HTML table of a finished run: each section's time and share of the total, slowest first."""
+    total = record["total"] or 1e-9
+    rows = "".join(
+        f'<tr><td>{escape(name)}</td><td style="text-align: right;">{seconds * 1000:.1f} ms</td>'
+        f'<td style="text-align: right;">{seconds / total * 100:.0f}%</td></tr>'
+        for name, seconds in sorted(record["sections"].items(), key=lambda item: -item[1]))
+    return (f'<p style="font-size: 13px;">⏱️ <b>{escape(str(record["scope"]))}</b> on '
+            f'<b>{escape(str(record["page"]))}</b>: {record["total"] * 1000:.1f} ms</p>'
+            f'<table style="font-size: 13px;"><tr><th>Section</th><th>Time</th><th>Share</th></tr>{rows}</table>')
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(q * (len(ordered) - 1)))]
+
+
+def aggregate(path):
+    """{(release, page, scope): {"runs": n, "total": (p50, p95), section: (p50, p95), ...}} from a profile log."""
+    samples = defaultdict(lambda: defaultdict(list))
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            group = samples[(record.get("release", "dev"), record["page"], record["scope"])]
+            group["total"].append(record["total"])
+            for name, seconds in record["sections"].items():
+                group[name].append(seconds)
+    return {key: {"runs": len(group["total"]),
+                  **{name: (_percentile(values, 0.5), _percentile(values, 0.95)) for name, values in group.items()}}
+            for key, group in samples.items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="p50/p95 rerun latency per section from the dashboard profile log.")
+    parser.add_argument("log", nargs="?", default=os.environ.get(PROFILE_LOG_ENV, DEFAULT_LOG))
+    args = parser.parse_args()
+
+    for (release, page, scope), stats in sorted(aggregate(args.log).items(), key=lambda item: str(item[0])):
+        print(f"\n{release} · {page} · {scope} ({stats.pop('runs')} runs)")
+        print(f"  {'section':<28} {'p50 ms':>9} {'p95 ms':>9}")
+        for name, (p50, p95) in sorted(stats.items(), key=lambda item: -item[1][1]):
+            print(f"  {name:<28} {p50 * 1000:>9.1f} {p95 * 1000:>9.1f}")
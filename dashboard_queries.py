@@ -0,0 +1,163 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+import pandas as pd
+import psycopg2
+import psycopg2.extensions
+from psycopg2.pool import ThreadedConnectionPool
+
+# Server-side query API for the dashboards.
+# Every lookup a page makes is a prepared statement over a pooled connection, and its result is kept
+# in an LRU cache keyed by (statement, parameters). The cache is dropped as soon as the data version
+# (latest fetched_at written by the extractor) moves, so an interaction is one indexed query or a hit.
+
+PG_DSN_ENV = "WEATHER_PG_DSN"
+
+OVERVIEW_FILTERS = ("country_code", "team", "cluster")
+
+STATEMENTS = {
+    "daily_window": ("(text, date, date)",
+                     "SELECT * FROM weather_data WHERE city = $1 AND date >= $2 AND date < $3 ORDER BY date"),
+    "hourly_window": ("(text, timestamp, timestamp)",
+                      "SELECT * FROM hourly_weather_data WHERE city = $1 AND forecast_time >= $2 "
+                      "AND forecast_time < $3 ORDER BY forecast_time"),
+    "group_summary": ("(date, text, text, text)",
+                      "SELECT * FROM weather_group_summary WHERE date = $1 AND country_code = $2 AND team = $3 "
+                      "AND cluster = $4"),
+    "rankings": ("(date, text, text, text)",
+                 "SELECT metric, rank, city, value FROM weather_rankings WHERE date = $1 AND country_code = $2 "
+                 "AND team = $3 AND cluster = $4 ORDER BY metric, rank"),
+    # The newest rows always include today's forecast, so only the live partition is probed
+    "data_version": ("", "SELECT MAX(fetched_at) FROM weather_data WHERE date >= CURRENT_DATE"),
+}
+
+
+def _overview_statement(active):
+    # One statement per filter combination so each gets its own plan on the (date, city) key
+    conditions = "".join(f" AND c.{col} = ${i}" for i, col in enumerate(active, start=2))
+    types = ", ".join(["date"] + ["text"] * len(active))
+    query = (f"SELECT w.*, c.country_code, c.team, c.cluster FROM weather_data w "
+             f"LEFT JOIN city_team_cluster c ON c.city = w.city WHERE w.date = $1{conditions} "
+             f"ORDER BY w.rain_probability DESC NULLS LAST, w.city")
+    return f"({types})", query
+
+
+class _PreparingConnection(psycopg2.extensions.connection):
+    # Remembers which statements were already prepared on this server session
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+
+class WeatherQueries:
+    """
+    Pooled, prepared and cached access to the weather tables. Safe to share between Streamlit
+    sessions (one instance per process via st.cache_resource).
+    """
+
+    def __init__(self, dsn=None, maxconn=4, cache_size=256, version_ttl=30.0, **pg_config):
+        self.pool = ThreadedConnectionPool(1, maxconn, dsn, connection_factory=_PreparingConnection, **pg_config)
+        self.cache_size = cache_size
+        self.version_ttl = version_ttl
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._version = None
+        self._version_checked = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, **kwargs):
+        """Instance for the DSN in $WEATHER_PG_DSN, or None when no database is configured."""
+        dsn = os.environ.get(PG_DSN_ENV)
+        return cls(dsn, **kwargs) if dsn else None
+
+    def close(self):
+        self.pool.closeall()
+
+    def _execute(self, name, definition, params):
+        conn = self.pool.getconn()
+        try:
+            with conn.cursor() as cursor:
+                if name not in conn.prepared:
+                    types, query = definition
+                    cursor.execute(f"PREPARE {name} {types} AS {query}")
+                    conn.prepared.add(name)
+                placeholders = f" ({', '.join(['%s'] * len(params))})" if params else ""
+                cursor.execute(f"EXECUTE {name}{placeholders}", params)
+                columns = [col.name for col in cursor.description]
+                rows = cursor.fetchall()
+            conn.rollback()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.pool.putconn(conn)
+        return pd.DataFrame(rows, columns=columns)
+
+    def data_version(self):
+        """Latest fetched_at in weather_data, re-probed at most every `version_ttl` seconds."""
+        now = time.monotonic()
+        with self._lock:
+            if self._version_checked and now - self._version_checked < self.version_ttl:
+                return self._version
+        version = self._execute("data_version", STATEMENTS["data_version"], ()).iat[0, 0]
+        with self._lock:
+            if version != self._version:
+                self.cache.clear()
+                self._version = version
+            self._version_checked = now
+        return version
+
+    def _cached(self, name, definition, params):
+        self.data_version()
+        key = (name, params)
+        with self._lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                self.hits += 1
+                return self.cache[key]
+            self.misses += 1
+        df = self._execute(name, definition, params)
+        with self._lock:
+            self.cache[key] = df
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return df
+
+    def overview(self, day, country="All", team="All", cluster="All"):
+        """Daily rows for `day` joined with city_team_cluster, riskiest first; "All"/None disables a filter."""
+        values = dict(zip(OVERVIEW_FILTERS, (country, team, cluster)))
+        active = [col for col in OVERVIEW_FILTERS if values[col] not in (None, "All")]
+        name = "overview" + "".join(f"_{col}" for col in active)
+        params = (pd.Timestamp(day).date(),) + tuple(values[col] for col in active)
+        return self._cached(name, _overview_statement(active), params)
+
+    def daily_window(self, city, start, end):
+        """Daily rows for `city` with start <= date < end."""
+        params = (city, pd.Timestamp(start).date(), pd.Timestamp(end).date())
+        return self._cached("daily_window", STATEMENTS["daily_window"], params)
+
+    def hourly_window(self, city, start, end):
+        """Hourly rows for `city` with start <= forecast_time < end; bounds may be tz-aware, rows are naive UTC."""
+        bounds = []
+        for value in (start, end):
+            ts = pd.Timestamp(value)
+            if ts.tz is not None:
+                ts = ts.tz_convert("UTC").tz_localize(None)
+            bounds.append(ts.to_pydatetime())
+        return self._cached("hourly_window", STATEMENTS["hourly_window"], (city, *bounds))
+
+    def _group_params(self, day, country, team, cluster):
+        return (pd.Timestamp(day).date(), country or "All", team or "All", cluster or "All")
+
+    def group_summary(self, day, country="All", team="All", cluster="All"):
+        """The weather_group_summary row (dict) for one filter combination, or None."""
+        df = self._cached("group_summary", STATEMENTS["group_summary"],
+                          self._group_params(day, country, team, cluster))
+        return None if df.empty else df.iloc[0].to_dict()
+
+    def rankings(self, day, country="All", team="All", cluster="All"):
+        """Top-N rows (metric, rank, city, value) of weather_rankings for one filter combination."""
+        return self._cached("rankings", STATEMENTS["rankings"], self._group_params(day, country, team, cluster))
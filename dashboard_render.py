@@ -0,0 +1,93 @@
+from html import escape
+from urllib.parse import quote, urlencode
+
+# HTML builders for the dashboard card grids.
+# A whole grid is sent as one markdown element instead of a container, several markdown blocks, an
+# expander and a button per card, so the number of elements on the page no longer grows with cities.
+# "Details" is a plain link carrying ?city=..., which the page turns into navigation on the next run.
+# Trade-off: following a link is a full browser navigation, which starts a new Streamlit session, so
+# session state (filters, the sticky ?profile flag) does not survive it. Whatever must survive goes in
+# the link's query string (`link_params`); the header search box navigates within the session.
+
+GRID_STYLE = "display: grid; grid-template-columns: repeat({columns}, minmax(0, 1fr)); gap: 1rem;"
+PANEL_STYLE = "border: 1px solid rgba(128, 128, 128, 0.3); border-radius: 0.5rem; padding: 1rem;"
+CARD_STYLE = PANEL_STYLE + " height: 300px; overflow-y: auto; display: flex; flex-direction: column;"
+LINK_STYLE = ("margin-top: auto; display: block; text-align: center; padding: 0.25rem; "
+              "border: 1px solid rgba(128, 128, 128, 0.4); border-radius: 0.5rem; text-decoration: none;")
+
+
+def _alert_block(alert):
+    if alert is None:
+        return ""
+    event, description = alert
+    return (f'<details><summary>View Alert</summary>'
+            f'<p style="font-size: 13px;"><b>{escape(str(event))}</b><br><i>{escape(str(description))}</i></p></details>')
+
+
+def detail_href(city, link_params=None):
+    """Link to the Detailed Analysis of `city`, carrying `link_params` ({name: value}) into the new session."""
+    return "?" + urlencode({"city": str(city), **(link_params or {})}, quote_via=quote)
+
+
+def city_card(row, alert=None, link_params=None):
+    """One overview card. `alert` is an (event, description) pair for the card's expandable warning."""
+    alert_icon = " 🚨" if alert is not None else ""
+    return (f'<div style="{CARD_STYLE}">'
+            f'<h6>{row.icon} {escape(str(row.city))}{alert_icon}</h6>'
+            f'<p style="font-size: 14px; margin-bottom: 5px;">'
+            f'🌡️ Temp: <b>{row.temp_range_label}</b><br>'
+            f'☀️ UV Index: <b>{row.uvi}</b><br>'
+            f'💧 Humidity: {row.humidity}%<br>'
+            f'🌧️ Rain: <b>{row.rain_label}</b> ({row.rain_total_label})</p>'
+            f'{_alert_block(alert)}'
+            f'<a href="{escape(detail_href(row.city, link_params))}" target="_self" style="{LINK_STYLE}">Details 📈</a>'
+            f'</div>')
+
+
+def card_grid(df, alerts=None, num_columns=4, link_params=None):
+    """
+    HTML for the whole City Overview grid, one card per row of `df` (with the columns added by
+    dashboard_data.add_display_columns).
+    `alerts` maps city -> (event, description) for the cities with an active alert.
+    """
+    alerts = alerts or {}
+    cards = "".join(city_card(row, alerts.get(row.city), link_params) for row in df.itertuples(index=False))
+    # No newlines: indented lines inside a markdown payload would be rendered as code blocks
+    return f'<div style="{GRID_STYLE.format(columns=num_columns)}">{cards}</div>'
+
+
+# Ranking metrics as materialized by the extractor (summaries.RANKING_METRICS): title and unit
+RANKING_LABELS = {
+    "rain": ("🌧️ Rain Probability", "%"),
+    "uv": ("☀️ UV Index", ""),
+    "wind": ("🌬️ Wind Speed", " km/h"),
+    "heat": ("🔥 Max Temperature", "°C"),
+}
+
+
+def _number(value):
+    return "–" if value is None or value != value else f"{value:.1f}"
+
+
+def summary_panel(summary, rankings, top_n=5, link_params=None):
+    """
+    HTML for the group summary strip and the top-N riskiest cities per metric.
+    `summary` is one weather_group_summary row (mapping) or None; `rankings` the matching weather_rankings rows.
+    """
+    parts = []
+    if summary is not None:
+        parts.append(f'<p style="font-size: 14px;">🏙️ <b>{summary["cities"]}</b> cities · '
+                     f'🌧️ <b>{summary["rainy_cities"]}</b> likely to rain · '
+                     f'🌡️ {_number(summary["temp_min"])}°C to {_number(summary["temp_max"])}°C · '
+                     f'💧 {_number(summary["total_rain_mm"])} mm total · ☀️ UV max {_number(summary["uvi_max"])} · '
+                     f'🌬️ wind max {_number(summary["wind_speed_max"])} km/h</p>')
+    if rankings is not None and not rankings.empty:
+        columns = []
+        for metric, (title, unit) in RANKING_LABELS.items():
+            top = rankings[(rankings["metric"] == metric) & (rankings["rank"] <= top_n)]
+            items = "".join(f'<li><a href="{escape(detail_href(city, link_params))}" target="_self">{escape(str(city))}</a> '
+                            f'<b>{_number(value)}{unit}</b></li>' for city, value in zip(top["city"], top["value"]))
+            columns.append(f'<div style="{PANEL_STYLE}"><h6>{title}</h6>'
+                           f'<ol style="font-size: 14px; margin-bottom: 0;">{items}</ol></div>')
+        parts.append(f'<div style="{GRID_STYLE.format(columns=len(columns))}">{"".join(columns)}</div>')
+    return "".join(parts)
@@ -0,0 +1,156 @@
+import asyncio
+import time
+import aiohttp
+from metrics import METRICS
+
+# Motor asíncrono para la API One Call de OpenWeather.
+# Un solo ClientSession (conexiones keep-alive reutilizadas) + un token bucket que
+# respeta la cuota de llamadas por minuto + un semáforo como techo de concurrencia.
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+DEFAULT_PARAMS = {'units': 'metric', 'exclude': 'minutely', 'lang': 'en'}
+
+
+class TokenBucket:
+    """
+    Limitador de tasa: `calls_per_minute` tokens por minuto con una ráfaga máxima de `burst`.
+    """
+
+    def __init__(self, calls_per_minute, burst=None):
+        self.rate = calls_per_minute / 60.0
+        self.capacity = burst or max(1, int(self.rate))
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def pause(self, seconds):
+        # Un 429 detiene a todos los workers, no solo al que lo recibió
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                wait = self.paused_until - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class WeatherFetcher:
+    """
+    Cliente One Call con sesión compartida. Usar como `async with WeatherFetcher(...) as fetcher`.
+    """
+
+    def __init__(self, api_key, base_url, calls_per_minute=600, concurrency=20, timeout=15, max_retries=3,
+                 params=None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.bucket = TokenBucket(calls_per_minute)
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.concurrency = concurrency
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.max_retries = max_retries
+        self.params = params or DEFAULT_PARAMS
+        self.session = None
+        self.retries = 0
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def open(self):
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.concurrency, ttl_dns_cache=300, keepalive_timeout=60)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def fetch(self, city, lat, lon, label=None):
+        """
+        Devuelve (city, data), con data=None si la API falló. `city` es la llave con la que se entrega el
+        resultado (en el pipeline, la llave de la celda de la grilla); `label` es el nombre que se muestra en
+        los errores y entre las llamadas más lentas del reporte (por defecto, `city`).
+        """
+        label = label or city
+        params = {'lat': lat, 'lon': lon, 'appid': self.api_key, **self.params}
+        async with self.semaphore:
+            # Latencia por ciudad: desde que obtiene un lugar de concurrencia, con cuota y reintentos incluidos
+            with METRICS.span("api", detail=label):
+                return await self._fetch_with_retries(city, params, label)
+
+    async def _fetch_with_retries(self, city, params, label):
+        for attempt in range(self.max_retries + 1):
+            await self.bucket.acquire()
+            try:
+                async with self.session.get(self.base_url, params=params) as response:
+                    METRICS.count("api_responses", status=response.status)
+                    if response.status in RETRY_STATUS and attempt < self.max_retries:
+                        delay = _retry_after(response) or 2 ** attempt
+                        if response.status == 429:
+                            self.bucket.pause(delay)
+                        self.retries += 1
+                        METRICS.count("api_retries", reason=response.status)
+                        await asyncio.sleep(delay)
+                        continue
+                    response.raise_for_status()
+                    return city, await response.json()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt < self.max_retries and not isinstance(e, aiohttp.ClientResponseError):
+                    self.retries += 1
+                    METRICS.count("api_retries", reason=type(e).__name__)
+                    await asyncio.sleep(2 ** attempt)
+                    continue
+                # No imprimir la URL completa: incluye el appid
+                reason = f"HTTP {e.status}" if isinstance(e, aiohttp.ClientResponseError) else repr(e)
+                METRICS.count("api_errors")
+                print(f"❌ Error en la API para {label}: {reason}")
+                return city, None
+        return city, None
+
+    async def fetch_many(self, city_items):
+        """
+        Generador asíncrono: entrega (city, data) conforme cada ciudad termina.
+        `city_items` es un iterable de (city, (lat, lon, ...)) como `cities.items()`.
+        """
+        tasks = [asyncio.ensure_future(self.fetch(city, coords[0], coords[1])) for city, coords in city_items]
+        try:
+            for future in asyncio.as_completed(tasks):
+                yield await future
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+def _retry_after(response):
+    try:
+        return float(response.headers.get('Retry-After', ''))
+    except ValueError:
+        return None
+
+
+def fetch_all(city_items, api_key, base_url, **kwargs):
+    """
+    Envoltura síncrona: descarga todas las ciudades y devuelve una lista de (city, data).
+    """
+    async def _run():
+        async with WeatherFetcher(api_key, base_url, **kwargs) as fetcher:
+            return [item async for item in fetcher.fetch_many(city_items)]
+
+    return asyncio.run(_run())
@@ -0,0 +1,211 @@
+import heapq
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+# Instrumentación del extractor: spans (duraciones por etapa) y contadores.
+# Al terminar cada corrida (o cada ciclo del daemon) se escriben en `directory`:
+#  - weather_extract.prom: formato de texto de Prometheus (para el textfile collector de node_exporter);
+#    conteos, sumas y contadores son acumulados desde que arrancó el proceso
+#  - run_report.json: solo la corrida/ciclo que termina: percentiles por span, contadores y las unidades más
+#    lentas (p. ej. ciudades). Al escribirlo, muestras y started_at se reinician para el ciclo siguiente.
+# Apagada por defecto: METRICS.span() devuelve un context manager vacío y count() retorna de inmediato,
+# así que el costo con la instrumentación desactivada es una llamada y un if.
+# Se activa con --metrics-dir en Weather_extract.py o con $WEATHER_METRICS_DIR.
+
+METRICS_ENV = "WEATHER_METRICS_DIR"
+PREFIX = "weather_extract"
+QUANTILES = (0.5, 0.95, 0.99)
+SAMPLES_PER_SPAN = 10000  # Muestras recientes para los percentiles; suma y conteo son acumulados
+SLOWEST_PER_SPAN = 10
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("metrics", "key", "detail", "started")
+
+    def __init__(self, metrics, key, detail):
+        self.metrics = metrics
+        self.key = key
+        self.detail = detail
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        self.metrics._observe(self.key, time.perf_counter() - self.started, self.detail)
+        if exc_type is not None:
+            self.metrics._add((f"{self.key[0]}_errors", self.key[1]), 1)
+        return False
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, round(q * (len(ordered) - 1)))] if ordered else None
+
+
+def _escape(value):
+    # Formato de texto de Prometheus: en los valores de etiqueta se escapan la barra invertida, " y el salto de línea
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(pairs, extra=()):
+    pairs = list(pairs) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class Metrics:
+    """
+    Registro de spans y contadores, seguro entre hilos. `span(name, detail=..., **labels)` mide un bloque;
+    `detail` (p. ej. la ciudad) no es una etiqueta de Prometheus, solo aparece entre los más lentos del reporte.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.enabled = directory is not None
+        self.process_started_at = self.started_at = datetime.now(timezone.utc)
+        # key -> [count, sum acumulados, count, sum del ciclo, deque de muestras del ciclo, heap de los más lentos]
+        self.spans = {}
+        self.counters = {}  # Acumulados
+        self.cycle_counters = {}  # Desde el último write()
+        self._lock = threading.Lock()
+
+    def enable(self, directory):
+        self.directory = directory
+        self.enabled = True
+
+    def span(self, name, detail=None, **labels):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, _key(name, labels), detail)
+
+    def observe(self, name, seconds, detail=None, **labels):
+        if self.enabled:
+            self._observe(_key(name, labels), seconds, detail)
+
+    def count(self, name, value=1, **labels):
+        if self.enabled and value:
+            self._add(_key(name, labels), value)
+
+    def _observe(self, key, seconds, detail):
+        with self._lock:
+            entry = self.spans.get(key)
+            if entry is None:
+                entry = self.spans[key] = [0, 0.0, 0, 0.0, deque(maxlen=SAMPLES_PER_SPAN), []]
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] += 1
+            entry[3] += seconds
+            entry[4].append(seconds)
+            if detail is not None:
+                slowest = entry[5]
+                if len(slowest) < SLOWEST_PER_SPAN:
+                    heapq.heappush(slowest, (seconds, str(detail)))
+                elif seconds > slowest[0][0]:
+                    heapq.heapreplace(slowest, (seconds, str(detail)))
+
+    def _add(self, key, value):
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+            self.cycle_counters[key] = self.cycle_counters.get(key, 0) + value
+
+    def _snapshot(self, reset=False):
+        # Copia consistente de spans y contadores; con reset=True empieza un ciclo nuevo
+        with self._lock:
+            spans = {key: (count, total, cycle_count, cycle_total, sorted(samples), sorted(slowest, reverse=True))
+                     for key, (count, total, cycle_count, cycle_total, samples, slowest) in self.spans.items()}
+            counters, cycle_counters = dict(self.counters), dict(self.cycle_counters)
+            started_at, finished_at = self.started_at, datetime.now(timezone.utc)
+            if reset:
+                for entry in self.spans.values():
+                    entry[2], entry[3] = 0, 0.0
+                    entry[4].clear()
+                    entry[5].clear()
+                self.cycle_counters = {}
+                self.started_at = finished_at
+        return spans, counters, cycle_counters, started_at, finished_at
+
+    def report(self, snapshot=None):
+        """Resumen de la corrida/ciclo en curso (desde el último write()) como dict serializable a JSON."""
+        spans, _, cycle_counters, started_at, finished_at = snapshot or self._snapshot()
+        return {
+            "process_started_at": self.process_started_at.isoformat(),
+            "started_at": started_at.isoformat(),
+            "finished_at": finished_at.isoformat(),
+            "spans": [{"name": name, "labels": dict(labels), "count": count, "sum": round(total, 6),
+                       **{f"p{int(q * 100)}": _percentile(ordered, q) for q in QUANTILES},
+                       "max": ordered[-1] if ordered else None,
+                       "slowest": [{"detail": detail, "seconds": seconds} for seconds, detail in slowest]}
+                      for (name, labels), (_, _, count, total, ordered, slowest) in sorted(spans.items()) if count],
+            "counters": [{"name": name, "labels": dict(labels), "value": value}
+                         for (name, labels), value in sorted(cycle_counters.items())],
+        }
+
+    def prometheus_text(self, snapshot=None):
+        """
+        Spans como summaries (`<prefix>_<span>_seconds`) y contadores como `<prefix>_<nombre>_total`.
+        Conteos, sumas y contadores son acumulados; los cuantiles son los de la corrida/ciclo en curso.
+        """
+        spans, counters, _, _, _ = snapshot or self._snapshot()
+        lines = []
+        for name in sorted({name for name, _ in spans}):
+            metric = f"{PREFIX}_{name}_seconds"
+            lines.append(f"# TYPE {metric} summary")
+            for (_, labels), (count, total, _, _, ordered, _) in sorted(item for item in spans.items()
+                                                                        if item[0][0] == name):
+                pairs = list(labels)
+                for q in QUANTILES:
+                    value = _percentile(ordered, q)
+                    lines.append(f"{metric}{_labels(pairs, [('quantile', q)])} "
+                                 f"{'NaN' if value is None else f'{value:.6f}'}")
+                lines.append(f"{metric}_sum{_labels(pairs)} {total:.6f}")
+                lines.append(f"{metric}_count{_labels(pairs)} {count}")
+        for name in sorted({name for name, _ in counters}):
+            metric = f"{PREFIX}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            for (_, labels), value in sorted(item for item in counters.items() if item[0][0] == name):
+                lines.append(f"{metric}{_labels(labels)} {value}")
+        lines.append(f"# TYPE {PREFIX}_last_run_timestamp_seconds gauge")
+        lines.append(f"{PREFIX}_last_run_timestamp_seconds {time.time():.0f}")
+        return "\n".join(lines) + "\n"
+
+    def write(self):
+        """
+        Escribe weather_extract.prom y run_report.json (reemplazo atómico) y cierra el ciclo: las muestras,
+        los más lentos y started_at del reporte JSON se reinician. No hace nada si está apagada.
+        """
+        if not self.enabled:
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+        snapshot = self._snapshot(reset=True)
+        outputs = {f"{PREFIX}.prom": self.prometheus_text(snapshot),
+                   "run_report.json": json.dumps(self.report(snapshot), indent=2)}
+        for filename, content in outputs.items():
+            path = os.path.join(self.directory, filename)
+            with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+                f.write(content)
+            os.replace(f"{path}.tmp", path)
+        return self.directory
+
+
+# Registro del proceso; los módulos del extractor lo importan directamente
+METRICS = Metrics(os.environ.get(METRICS_ENV) or None)
@@ -0,0 +1,153 @@
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# Servidor HTTP local que imita /data/3.0/onecall para pruebas sin gastar cuota.
+# Uso: python mock_onecall_server.py --port 8765 --rate-limit 120
+# y luego OPENWEATHER_BASE_URL=http://127.0.0.1:8765/data/3.0/onecall python Weather_extract.py
+# Con --fixtures reproduce respuestas reales grabadas (ver benchmarks/bench_pipeline.py --record).
+
+
+def build_payload(lat, lon, now=None, hours=48, days=8, with_alert=False):
+    now = int(now or time.time())
+    now -= now % 3600
+    rng = random.Random(f"{lat:.2f},{lon:.2f}")
+    conditions = [("Clouds", "broken clouds"), ("Rain", "light rain"), ("Clear", "clear sky")]
+    hourly = []
+    for h in range(hours):
+        main, desc = rng.choice(conditions)
+        hour = {"dt": now + h * 3600, "temp": round(rng.uniform(5, 35), 2), "feels_like": round(rng.uniform(5, 35), 2),
+                "humidity": rng.randint(20, 100), "pop": round(rng.random(), 2), "wind_speed": round(rng.uniform(0, 12), 2),
+                "weather": [{"main": main, "description": desc}]}
+        if main == "Rain":
+            hour["rain"] = {"1h": round(rng.uniform(0.1, 5), 2)}
+        hourly.append(hour)
+    daily = []
+    for d in range(days):
+        main, desc = rng.choice(conditions)
+        t_min, t_max = sorted((round(rng.uniform(0, 20), 2), round(rng.uniform(15, 38), 2)))
+        day = {"dt": now + d * 86400, "sunrise": now + d * 86400 - 6 * 3600, "sunset": now + d * 86400 + 6 * 3600,
+               "summary": f"Expect {desc}", "temp": {"day": round((t_min + t_max) / 2, 2), "min": t_min, "max": t_max},
+               "feels_like": {"day": round((t_min + t_max) / 2, 2)}, "humidity": rng.randint(20, 100),
+               "pop": round(rng.random(), 2), "wind_speed": round(rng.uniform(0, 12), 2), "uvi": round(rng.uniform(0, 11), 2),
+               "weather": [{"main": main, "description": desc}]}
+        if main == "Rain":
+            day["rain"] = round(rng.uniform(0.5, 30), 2)
+        daily.append(day)
+    payload = {"lat": lat, "lon": lon, "timezone": "UTC", "hourly": hourly, "daily": daily}
+    if with_alert:
+        payload["alerts"] = [{"sender_name": "Mock Service", "event": "Heavy rain", "start": now, "end": now + 86400,
+                              "description": "Synthetic alert."}]
+    return payload
+
+
+def replay_payload(fixture, lat, lon, now=None):
+    """
+    Respuesta grabada reubicada en (lat, lon) y desplazada en el tiempo para que empiece en la hora actual,
+    así un mismo archivo de fixtures sirve para cualquier número de ciudades y cualquier día.
+    """
+    now = int(now or time.time())
+    now -= now % 3600
+    hourly = fixture.get("hourly") or [{"dt": now}]
+    shift = now - hourly[0]["dt"]
+    payload = json.loads(json.dumps(fixture))
+    payload["lat"], payload["lon"] = lat, lon
+    for section in ("hourly", "daily"):
+        for item in payload.get(section, []):
+            for key in ("dt", "sunrise", "sunset"):
+                if key in item:
+                    item[key] += shift
+    for alert in payload.get("alerts", []):
+        alert["start"] += shift
+        alert["end"] += shift
+    return payload
+
+
+def load_fixtures(path):
+    """Respuestas One Call grabadas, una por línea (JSON Lines)."""
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class MockOneCallServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # Con el backlog por defecto (5) las ráfagas de conexiones se rechazan y se reintentan
+
+    def __init__(self, address, rate_limit=None, latency=0.0, alert_ratio=0.1, fixtures=None):
+        super().__init__(address, MockOneCallHandler)
+        self.fixtures = fixtures
+        self.rate_limit = rate_limit
+        self.latency = latency
+        self.alert_ratio = alert_ratio
+        self.window_start = time.monotonic()
+        self.window_calls = 0
+        self.total_calls = 0
+        self.rejected_calls = 0
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            self.total_calls += 1
+            if self.rate_limit is None:
+                return True
+            now = time.monotonic()
+            if now - self.window_start >= 60:
+                self.window_start, self.window_calls = now, 0
+            if self.window_calls >= self.rate_limit:
+                self.rejected_calls += 1
+                return False
+            self.window_calls += 1
+            return True
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return f"http://{self.server_address[0]}:{self.server_address[1]}/data/3.0/onecall"
+
+
+class MockOneCallHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if not url.path.endswith("/onecall") or "lat" not in query or "lon" not in query:
+            return self._send(400, {"cod": 400, "message": "Nothing to geocode"})
+        if not self.server.allow():
+            return self._send(429, {"cod": 429, "message": "Too many requests"}, {"Retry-After": "1"})
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        lat, lon = float(query["lat"][0]), float(query["lon"][0])
+        if self.server.fixtures:
+            fixture = self.server.fixtures[random.Random(f"{lat},{lon}").randrange(len(self.server.fixtures))]
+            return self._send(200, replay_payload(fixture, lat, lon))
+        with_alert = random.Random(f"{lat},{lon}").random() < self.server.alert_ratio
+        self._send(200, build_payload(lat, lon, with_alert=with_alert))
+
+    def _send(self, status, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor local que imita la API One Call de OpenWeather.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--rate-limit", type=int, default=None, help="Llamadas por minuto antes de responder 429.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Latencia artificial por respuesta (segundos).")
+    parser.add_argument("--fixtures", help="Archivo JSON Lines con respuestas grabadas para reproducir.")
+    args = parser.parse_args()
+    server = MockOneCallServer(("127.0.0.1", args.port), rate_limit=args.rate_limit, latency=args.latency,
+                               fixtures=load_fixtures(args.fixtures) if args.fixtures else None)
+    print(f"🌦️ Mock One Call escuchando en http://127.0.0.1:{args.port}/data/3.0/onecall")
+    server.serve_forever()
@@ -0,0 +1,117 @@
+import asyncio
+import contextlib
+import time
+
+# Pipeline productor/consumidor para PASO 1.
+# Los workers de descarga dejan cada respuesta en una cola acotada; un solo escritor las junta y
+# las guarda por lotes cada `flush_rows` filas o `flush_seconds` segundos, en un hilo aparte para
+# que la escritura en PostgreSQL se solape con la espera de red. Como la cola es acotada y los
+# workers se bloquean cuando está llena, la memoria no crece con el número de ciudades.
+
+_DONE = object()
+
+
+def _row_count(data):
+    return len(data.get('hourly', ())) + len(data.get('daily', ())) + len(data.get('alerts', ()))
+
+
+class PipelineStats:
+    def __init__(self):
+        self.cities_written = 0
+        self.cities_failed = 0
+        self.cities_without_data = 0
+        self.rows = 0
+        self.flushes = 0
+        self.written_keys = set()  # Llaves cuyas filas ya quedaron guardadas (commit hecho)
+
+    def summary(self):
+        return (f"{self.cities_written} ciudades guardadas en {self.flushes} lotes ({self.rows} filas), "
+                f"{self.cities_failed} con error al guardar, {self.cities_without_data} sin datos de la API")
+
+
+async def stream_to_db(fetcher, requests, groups, write_batch, flush_rows=5000, flush_seconds=5.0, queue_size=200,
+                       on_result=None, on_written=None):
+    """
+    Descarga `requests` ([(key, (lat, lon))]) con `fetcher` y entrega lotes [(city, data)] a `write_batch`,
+    que corre en un hilo y debe lanzar excepción si el lote no se guardó. Un lote fallido se reintenta
+    ciudad por ciudad para aislar la respuesta problemática sin perder el resto.
+    `on_result(key, data)` se llama con cada respuesta recibida (data=None si la API falló), antes de
+    guardarla; `on_written(key, data)` solo con las respuestas cuyo lote ya hizo commit. Quien necesite
+    saber qué ciudades llegaron a PostgreSQL debe usar on_written (o stats.written_keys), no on_result:
+    una respuesta recibida puede fallar al guardarse.
+    """
+    queue = asyncio.Queue(maxsize=queue_size)
+    stats = PipelineStats()
+    pending_requests = iter(requests)
+
+    async def worker():
+        for key, coords in pending_requests:
+            # La llave solo agrupa; en los errores se muestran las ciudades de la celda
+            label = ", ".join(groups.get(key, ())) or key
+            await queue.put(await fetcher.fetch(key, coords[0], coords[1], label))
+
+    async def producer():
+        try:
+            await asyncio.gather(*(worker() for _ in range(fetcher.concurrency)))
+        finally:
+            await queue.put(_DONE)
+
+    async def flush(batch):
+        per_key = [(key, [(city, data) for city in groups.get(key, ())]) for key, data in batch]
+        try:
+            await asyncio.to_thread(write_batch, [item for _, results in per_key for item in results])
+            written = per_key
+        except Exception as e:
+            print(f"⚠️ Falló un lote de {len(batch)} respuestas ({e}); reintentando una por una.")
+            written = []
+            for key, single in per_key:
+                try:
+                    await asyncio.to_thread(write_batch, single)
+                    written.append((key, single))
+                except Exception as e:
+                    stats.cities_failed += len(single)
+                    print(f"❌ No se pudo guardar {', '.join(city for city, _ in single)}: {e}")
+        for key, results in written:
+            stats.written_keys.add(key)
+            if on_written:
+                on_written(key, results[0][1])
+            stats.cities_written += len(results)
+            stats.rows += sum(_row_count(data) for _, data in results)
+        stats.flushes += 1
+
+    async def consumer():
+        batch, rows, batch_started = [], 0, None
+        while True:
+            timeout = None if not batch else max(0.0, flush_seconds - (time.monotonic() - batch_started))
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout=timeout)
+            except asyncio.TimeoutError:
+                item = None
+            if item is _DONE:
+                break
+            if item is not None:
+                key, data = item
+                if on_result:
+                    on_result(key, data)
+                if data:
+                    if not batch:
+                        batch_started = time.monotonic()
+                    batch.append((key, data))
+                    rows += _row_count(data) * len(groups.get(key, ()))
+                else:
+                    stats.cities_without_data += len(groups.get(key, ()))
+            if batch and (rows >= flush_rows or time.monotonic() - batch_started >= flush_seconds):
+                await flush(batch)
+                batch, rows = [], 0
+        if batch:
+            await flush(batch)
+
+    producer_task = asyncio.ensure_future(producer())
+    try:
+        await consumer()
+    finally:
+        producer_task.cancel()
+        # Esperar al productor: sin esto, un error de un worker se pierde y la tarea queda pendiente
+        with contextlib.suppress(asyncio.CancelledError):
+            await producer_task
+    return stats
@@ -0,0 +1,95 @@
+import hashlib
+import os
+import time
+
+# Caché en disco de respuestas One Call.
+# La llave es (lat, lon, exclude, units) con las coordenadas redondeadas a una celda de GRID_DECIMALS
+# decimales: ciudades que caen en la misma celda comparten una sola llamada. Una respuesta más joven
+# que el TTL se considera fresca y la ciudad se omite en la corrida.
+# Los datos ya quedan en PostgreSQL, así que por celda solo se guarda un marcador vacío cuya fecha de
+# modificación es la de la última respuesta guardada. Los marcadores vencidos se borran solos.
+
+GRID_DECIMALS = 2  # ~1.1 km
+
+
+def cache_key(lat, lon, params):
+    return (f"{round(lat, GRID_DECIMALS):.{GRID_DECIMALS}f},{round(lon, GRID_DECIMALS):.{GRID_DECIMALS}f}"
+            f"|{params.get('exclude', '')}|{params.get('units', '')}")
+
+
+class ResponseCache:
+    """
+    `ttl`: edad máxima de una celda fresca (0 = nunca se omite). `retention`: edad a partir de la cual se
+    borran los marcadores (por defecto el TTL); se revisa como mucho una vez por `retention`.
+    """
+
+    def __init__(self, directory, ttl, retention=None):
+        self.directory = directory
+        self.ttl = ttl
+        self.retention = retention or ttl
+        self.last_prune = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.collapsed = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest() + ".mark")
+
+    def is_fresh(self, key, now=None):
+        try:
+            return (now or time.time()) - os.path.getmtime(self._path(key)) < self.ttl
+        except OSError:
+            return False
+
+    def mark(self, key, data=None):
+        """Registra que la respuesta de la celda `key` ya se guardó (firma compatible con on_written)."""
+        path = self._path(key)
+        with open(path, "a"):
+            pass
+        os.utime(path)
+
+    def prune(self, now=None):
+        """Borra los archivos del directorio más viejos que `retention` (incluye respuestas JSON de versiones anteriores)."""
+        now = now or time.time()
+        removed = 0
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_file() and now - entry.stat().st_mtime >= self.retention:
+                        os.remove(entry.path)
+                        removed += 1
+                except OSError:
+                    pass  # Otro proceso lo borró o lo reescribió
+        self.last_prune = now
+        return removed
+
+    def plan(self, city_items, params):
+        """
+        Decide qué pedir a la API. Devuelve:
+          - requests: [(key, (lat, lon))] una entrada por celda que no está fresca
+          - groups:   {key: [city, ...]} ciudades que recibirán cada respuesta
+        Las ciudades con respuesta fresca no aparecen en ninguno de los dos.
+        """
+        now = time.time()
+        if self.retention and now - self.last_prune >= self.retention:
+            self.prune(now)
+        groups = {}
+        requests = []
+        for city, coords in city_items:
+            key = cache_key(coords[0], coords[1], params)
+            if key in groups:
+                groups[key].append(city)
+                self.collapsed += 1
+                continue
+            if self.is_fresh(key, now):
+                self.hits += 1
+                continue
+            self.misses += 1
+            groups[key] = [city]
+            requests.append((key, (coords[0], coords[1])))
+        return requests, groups
+
+    def summary(self):
+        return f"caché: {self.hits} frescas (omitidas), {self.misses} pedidas, {self.collapsed} fusionadas por celda"
+
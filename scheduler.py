@@ -0,0 +1,58 @@
+import heapq
+import random
+
+# Planificador de refresco por ciudad para el modo daemon.
+# Cada ciudad tiene su propio vencimiento. Al arrancar, los vencimientos se reparten de manera
+# uniforme dentro del intervalo base para no pedir todas las ciudades en ráfaga. Las ciudades
+# con alertas activas o alta probabilidad de lluvia próxima se refrescan con el intervalo rápido.
+
+
+def needs_fast_refresh(data, now, rain_threshold, lookahead_hours):
+    """True si la respuesta trae una alerta vigente o lluvia probable en las próximas horas."""
+    if not data:
+        return True
+    if any(alert.get('end', 0) > now for alert in data.get('alerts', ())):
+        return True
+    horizon = now + lookahead_hours * 3600
+    return any(hour.get('pop', 0) * 100 >= rain_threshold
+               for hour in data.get('hourly', ()) if now <= hour['dt'] <= horizon)
+
+
+class RefreshScheduler:
+    def __init__(self, city_items, base_interval, fast_interval, rain_threshold=60, lookahead_hours=6, now=0.0,
+                 jitter=0.05):
+        self.locations = dict(city_items)
+        self.base_interval = base_interval
+        self.fast_interval = fast_interval
+        self.rain_threshold = rain_threshold
+        self.lookahead_hours = lookahead_hours
+        self.jitter = jitter
+        self.fast_cities = set()
+        step = base_interval / max(1, len(self.locations))
+        self.next_due = {city: now + i * step for i, city in enumerate(self.locations)}
+        self.heap = [(due, city) for city, due in self.next_due.items()]
+        heapq.heapify(self.heap)
+
+    def due(self, now):
+        """Saca del plan y devuelve [(city, coords)] de las ciudades vencidas."""
+        cities = []
+        while self.heap and self.heap[0][0] <= now:
+            due, city = heapq.heappop(self.heap)
+            if self.next_due.get(city) == due:
+                cities.append((city, self.locations[city]))
+        return cities
+
+    def mark_refreshed(self, city, data, now):
+        """Reprograma `city` según la respuesta recién obtenida (None = falló, se reintenta pronto)."""
+        fast = needs_fast_refresh(data, now, self.rain_threshold, self.lookahead_hours)
+        if fast:
+            self.fast_cities.add(city)
+        else:
+            self.fast_cities.discard(city)
+        interval = self.fast_interval if fast else self.base_interval
+        due = now + interval * (1 + random.uniform(-self.jitter, self.jitter))
+        self.next_due[city] = due
+        heapq.heappush(self.heap, (due, city))
+
+    def seconds_until_next(self, now):
+        return max(0.0, self.heap[0][0] - now) if self.heap else self.base_interval
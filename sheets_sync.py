@@ -0,0 +1,187 @@
+import bisect
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import gspread
+from gspread.utils import rowcol_to_a1
+from metrics import METRICS
+
+# Sincronización incremental DataFrame -> Google Sheets.
+# Se guarda localmente una huella (hash) por fila, indexada por la llave natural de cada hoja,
+# junto con la fila que ocupa en la hoja. En cada corrida solo se envían las filas nuevas o
+# modificadas y se borran en bloque las que ya no existen en la base de datos.
+
+# Columnas que cambian en cada corrida sin que cambie el pronóstico; no cuentan para la huella
+IGNORED_COLUMNS = {"fetched_at"}
+# Cuota de escritura de la API de Sheets (por usuario y por minuto) y tamaño máximo de cada escritura
+WRITE_REQUESTS_PER_MINUTE = 60
+CHUNK_ROWS = 5000
+RETRY_STATUS = {429, 500, 503}
+
+
+class SheetsWriter:
+    """
+    Punto único para las llamadas de escritura a Sheets, compartido entre hilos: espacia las llamadas
+    para respetar la cuota y reintenta los 429/5xx con backoff exponencial y jitter.
+    """
+
+    def __init__(self, requests_per_minute=WRITE_REQUESTS_PER_MINUTE, max_retries=6, base_delay=1.0,
+                 chunk_rows=CHUNK_ROWS):
+        self.interval = 60.0 / requests_per_minute
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.chunk_rows = chunk_rows
+        self.next_slot = 0.0
+        self.calls = 0
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def _wait_for_slot(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+            self.calls += 1
+        if slot > now:
+            time.sleep(slot - now)
+
+    def call(self, fn, *args, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            self._wait_for_slot()
+            try:
+                with METRICS.span("sheets_call", method=getattr(fn, "__name__", "call")):
+                    return fn(*args, **kwargs)
+            except gspread.exceptions.APIError as e:
+                status = getattr(getattr(e, "response", None), "status_code", None)
+                if status not in RETRY_STATUS or attempt == self.max_retries:
+                    METRICS.count("sheets_errors", status=status)
+                    raise
+                with self._lock:
+                    self.retries += 1
+                METRICS.count("sheets_retries", status=status)
+                time.sleep(self.base_delay * 2 ** attempt + random.uniform(0, self.base_delay))
+
+    def chunks(self, rows):
+        for start in range(0, len(rows), self.chunk_rows):
+            yield start, rows[start:start + self.chunk_rows]
+
+
+def _fingerprint(values):
+    return hashlib.blake2b("\x1f".join(values).encode(), digest_size=8).hexdigest()
+
+
+def load_state(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(path, state):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+def _contiguous(row_numbers):
+    """Agrupa números de fila ordenados en rangos [inicio, fin]."""
+    ranges = []
+    for n in sorted(row_numbers):
+        if ranges and n == ranges[-1][1] + 1:
+            ranges[-1][1] = n
+        else:
+            ranges.append([n, n])
+    return ranges
+
+
+def _full_refresh(worksheet, header, values, keys, hashes, writer):
+    rows = [header] + values
+    writer.call(worksheet.clear)
+    writer.call(worksheet.resize, rows=len(rows), cols=len(header))
+    for start, chunk in writer.chunks(rows):
+        writer.call(worksheet.update, values=chunk, range_name=rowcol_to_a1(start + 1, 1),
+                    value_input_option='USER_ENTERED')
+    # La fila 1 es el encabezado; los datos empiezan en la fila 2
+    return {"header": header, "rows": {k: [i + 2, h] for i, (k, h) in enumerate(zip(keys, hashes))}}
+
+
+def sync_worksheet(worksheet, df, key_columns, state, writer=None):
+    """
+    Sincroniza `df` con `worksheet` usando la huella guardada en `state[worksheet.title]`.
+    Modifica `state` en sitio y devuelve un dict con los conteos de filas enviadas, omitidas y borradas.
+    Todas las escrituras pasan por `writer` (SheetsWriter) en bloques de a lo más `writer.chunk_rows` filas.
+    """
+    writer = writer or SheetsWriter()
+    df = df.fillna('').astype(str)
+    header = df.columns.values.tolist()
+    values = df.values.tolist()
+    key_idx = [header.index(col) for col in key_columns]
+    hash_idx = [i for i, col in enumerate(header) if col not in IGNORED_COLUMNS]
+    keys = ["|".join(row[i] for i in key_idx) for row in values]
+    hashes = [_fingerprint([row[i] for i in hash_idx]) for row in values]
+
+    sheet_state = state.get(worksheet.title)
+    if not sheet_state or sheet_state.get("header") != header:
+        # Sin huella previa o cambió el esquema: reemplazo completo una sola vez
+        state[worksheet.title] = _full_refresh(worksheet, header, values, keys, hashes, writer)
+        return {"sent": len(values), "skipped": 0, "deleted": 0, "full_refresh": True}
+
+    known = sheet_state["rows"]
+    incoming = dict(zip(keys, range(len(values))))
+
+    # 1. Borrar en bloque las filas que ya no existen (de abajo hacia arriba para no mover índices)
+    expired = [known[k][0] for k in known if k not in incoming]
+    if expired:
+        requests = [{"deleteDimension": {"range": {"sheetId": worksheet.id, "dimension": "ROWS",
+                                                   "startIndex": start - 1, "endIndex": end}}}
+                    for start, end in reversed(_contiguous(expired))]
+        writer.call(worksheet.spreadsheet.batch_update, {"requests": requests})
+        expired_sorted = sorted(expired)
+        for k in [k for k in known if k not in incoming]:
+            del known[k]
+        for entry in known.values():
+            # Corrimiento = filas borradas por encima de esta
+            entry[0] -= bisect.bisect_left(expired_sorted, entry[0])
+
+    # 2. Filas modificadas: batch_update con un rango por bloque contiguo, hasta chunk_rows filas por llamada
+    changed = {}
+    new_rows = []
+    skipped = 0
+    for key, i in incoming.items():
+        if key not in known:
+            new_rows.append(i)
+        elif known[key][1] != hashes[i]:
+            changed[known[key][0]] = i
+            known[key][1] = hashes[i]
+        else:
+            skipped += 1
+    if changed:
+        last_col = len(header)
+        data, data_rows = [], 0
+        for start, end in _contiguous(changed):
+            # Un bloque contiguo más grande que chunk_rows se parte en varios rangos
+            for chunk_start in range(start, end + 1, writer.chunk_rows):
+                chunk_end = min(end, chunk_start + writer.chunk_rows - 1)
+                data.append({"range": f"{rowcol_to_a1(chunk_start, 1)}:{rowcol_to_a1(chunk_end, last_col)}",
+                             "values": [values[changed[n]] for n in range(chunk_start, chunk_end + 1)]})
+                data_rows += chunk_end - chunk_start + 1
+                if data_rows >= writer.chunk_rows:
+                    writer.call(worksheet.batch_update, data, value_input_option='USER_ENTERED')
+                    data, data_rows = [], 0
+        if data:
+            writer.call(worksheet.batch_update, data, value_input_option='USER_ENTERED')
+
+    # 3. Filas nuevas: append al final de la tabla, en bloques de chunk_rows
+    if new_rows:
+        next_row = max((entry[0] for entry in known.values()), default=1) + 1
+        for _, chunk in writer.chunks([values[i] for i in new_rows]):
+            writer.call(worksheet.append_rows, chunk, value_input_option='USER_ENTERED', table_range="A1")
+        for offset, i in enumerate(new_rows):
+            known[keys[i]] = [next_row + offset, hashes[i]]
+
+    return {"sent": len(changed) + len(new_rows), "skipped": skipped, "deleted": len(expired), "full_refresh": False}
+
@@ -0,0 +1,116 @@
+import json
+import os
+from datetime import datetime, timezone
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc
+
+# Snapshot columnar y tipado de las tablas del dashboard.
+# El extractor (o, si no hay extractor, un solo proceso del dashboard que lee Sheets) escribe un archivo
+# Arrow IPC sin comprimir por tabla más un manifiesto. Los lectores mapean los archivos en memoria y los
+# convierten sin copiar las columnas de ancho fijo, así todas las sesiones y todos los procesos comparten
+# las mismas páginas del caché del sistema operativo en vez de tener cada uno su copia de las tablas.
+
+SNAPSHOT_DIR = os.environ.get("WEATHER_SNAPSHOT_DIR",
+                              os.path.join(os.path.dirname(os.path.abspath(__file__)), "snapshot"))
+MANIFEST = "manifest.json"
+
+TIMESTAMP = pa.timestamp("us", tz="UTC")
+LABEL = pa.dictionary(pa.int32(), pa.string())  # etiquetas repetidas: una copia de cada texto por archivo
+REAL = pa.float32()  # columnas REAL de Postgres, con su precisión nativa
+SCHEMAS = {
+    "daily": {"date": pa.date32(), "city": LABEL, "temp": REAL, "feels_like": REAL, "humidity": REAL,
+              "weather_condition": LABEL, "main_condition": LABEL, "rain_probability": REAL, "wind_speed": REAL,
+              "fetched_at": TIMESTAMP, "total_rain_mm": REAL, "temp_max": REAL, "temp_min": REAL, "uvi": REAL,
+              "sunrise": TIMESTAMP, "sunset": TIMESTAMP},
+    "hourly": {"city": LABEL, "forecast_time": TIMESTAMP, "temp": REAL, "feels_like": REAL, "humidity": REAL,
+               "weather_condition": LABEL, "main_condition": LABEL, "rain_probability": REAL, "rain_1h": REAL,
+               "wind_speed": REAL, "fetched_at": TIMESTAMP},
+    "alerts": {"city": LABEL, "event": LABEL, "start_time": TIMESTAMP, "end_time": TIMESTAMP,
+               "description": pa.string(), "sender_name": LABEL, "fetched_at": TIMESTAMP},
+    "clusters": {"city": pa.string(), "country_code": LABEL, "team": LABEL, "cluster": LABEL},
+    "summary": {"date": pa.date32(), "country_code": LABEL, "team": LABEL, "cluster": LABEL,
+                "cities": pa.int16(), "rainy_cities": pa.int16(), "temp_min": REAL, "temp_max": REAL,
+                "temp_mean": REAL, "rain_probability_mean": REAL, "rain_probability_max": REAL,
+                "total_rain_mm": REAL, "uvi_max": REAL, "wind_speed_max": REAL},
+    "rankings": {"date": pa.date32(), "country_code": LABEL, "team": LABEL, "cluster": LABEL,
+                 "metric": LABEL, "rank": pa.int16(), "city": LABEL, "value": REAL},
+}
+
+
+def _to_table(name, df):
+    schema = SCHEMAS.get(name, {})
+    df = df.copy()
+    for col, arrow_type in schema.items():
+        if col not in df.columns:
+            continue
+        if pa.types.is_timestamp(arrow_type):
+            # Postgres guarda timestamps UTC sin zona
+            series = pd.to_datetime(df[col])
+            df[col] = series.dt.tz_localize("UTC") if series.dt.tz is None else series.dt.tz_convert("UTC")
+        elif pa.types.is_floating(arrow_type):
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype("float64")
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    for i, field in enumerate(table.schema):
+        if pa.types.is_dictionary(schema.get(field.name, field.type)) and not pa.types.is_dictionary(field.type):
+            table = table.set_column(i, field.name, table.column(i).cast(pa.string()).dictionary_encode())
+    return table.cast(pa.schema([pa.field(col, schema.get(col, table.schema.field(col).type)) for col in df.columns]))
+
+
+def write_snapshot(tables, directory=SNAPSHOT_DIR, version=None, source="extractor"):
+    """
+    Escribe `tables` ({"daily": df, "hourly": df, ...}) como archivos Arrow IPC con un nombre de generación nuevo.
+    `source` queda en el manifiesto ("extractor" o "sheets") para que los lectores sepan quién lo refresca.
+    El manifiesto se reemplaza al final de forma atómica: los lectores ven el juego anterior o el nuevo, nunca
+    una mezcla. Se borran los archivos de generaciones anteriores a la previa.
+    """
+    os.makedirs(directory, exist_ok=True)
+    version = version or datetime.now(timezone.utc).isoformat()
+    previous = read_manifest(directory)
+    generation = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+    files = {}
+    for name, df in tables.items():
+        table = _to_table(name, df)
+        filename = f"{name}-{generation}.arrow"
+        tmp_path = os.path.join(directory, f".{filename}.tmp")
+        with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(tmp_path, os.path.join(directory, filename))
+        files[name] = {"file": filename, "rows": table.num_rows}
+    manifest_tmp = os.path.join(directory, f".{MANIFEST}.tmp")
+    with open(manifest_tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": version, "source": source, "tables": files}, f)
+    os.replace(manifest_tmp, os.path.join(directory, MANIFEST))
+
+    # Se conserva la generación previa para los lectores que acaban de leer el manifiesto anterior
+    keep = {entry["file"] for entry in files.values()}
+    if previous:
+        keep |= {entry["file"] for entry in previous["tables"].values()}
+    for filename in os.listdir(directory):
+        if filename.endswith(".arrow") and filename not in keep:
+            os.remove(os.path.join(directory, filename))
+    return version
+
+
+def read_manifest(directory=SNAPSHOT_DIR):
+    path = os.path.join(directory, MANIFEST)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def read_snapshot(directory=SNAPSHOT_DIR):
+    """
+    Mapea en memoria cada tabla del manifiesto y devuelve ({nombre: DataFrame}, versión), o None si todavía
+    no se publicó ningún snapshot. Las columnas numéricas y de fecha sin nulos son vistas de solo lectura
+    sobre el mapeo (sin copia); el mapeo sigue abierto mientras ellas existan.
+    """
+    manifest = read_manifest(directory)
+    if manifest is None:
+        return None
+    tables = {}
+    for name, entry in manifest["tables"].items():
+        source = pa.memory_map(os.path.join(directory, entry["file"]), "r")
+        tables[name] = pa.ipc.open_file(source).read_all().to_pandas(split_blocks=True)
+    return tables, manifest["version"]
@@ -0,0 +1,192 @@
+import argparse
+from datetime import date, datetime, timedelta
+from psycopg2 import sql
+from bulk_loader import TABLES
+
+# Gestión del almacenamiento en PostgreSQL:
+#  - hourly_weather_data particionada por día (forecast_time) y weather_data por mes (date)
+#  - retención configurable: las particiones vencidas se borran completas (DROP, sin DELETE fila a fila)
+#  - antes de borrar una partición horaria se resume en hourly_weather_rollup (min/max/promedio, lluvia total)
+
+HOURLY_RETENTION_DAYS = 14
+DAILY_RETENTION_DAYS = 120
+
+PARTITIONED_TABLES = {
+    "hourly_weather_data": {
+        "column": "forecast_time", "period": "day",
+        "ddl": """CREATE TABLE hourly_weather_data (
+            city TEXT NOT NULL, forecast_time TIMESTAMP NOT NULL, temp REAL, feels_like REAL, humidity REAL,
+            weather_condition TEXT, main_condition TEXT, rain_probability REAL, rain_1h REAL, wind_speed REAL,
+            fetched_at TIMESTAMP, PRIMARY KEY (city, forecast_time)) PARTITION BY RANGE (forecast_time)""",
+    },
+    "weather_data": {
+        "column": "date", "period": "month",
+        "ddl": """CREATE TABLE weather_data (
+            date DATE NOT NULL, city TEXT NOT NULL, temp REAL, feels_like REAL, humidity REAL,
+            weather_condition TEXT, main_condition TEXT, rain_probability REAL, wind_speed REAL,
+            fetched_at TIMESTAMP, total_rain_mm REAL, temp_max REAL, temp_min REAL, uvi REAL,
+            sunrise TIMESTAMP, sunset TIMESTAMP, PRIMARY KEY (date, city)) PARTITION BY RANGE (date)""",
+    },
+}
+
+ROLLUP_DDL = """CREATE TABLE IF NOT EXISTS hourly_weather_rollup (
+    city TEXT NOT NULL, date DATE NOT NULL, temp_min REAL, temp_max REAL, temp_mean REAL,
+    total_rain_mm REAL, hours INTEGER, PRIMARY KEY (city, date))"""
+
+
+def _period_start(value, period):
+    value = value.date() if isinstance(value, datetime) else value
+    return value.replace(day=1) if period == "month" else value
+
+
+def _next_period(start, period):
+    if period == "month":
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def _partition_name(table, start, period):
+    return f"{table}_p{start.strftime('%Y%m' if period == 'month' else '%Y%m%d')}"
+
+
+def is_partitioned(cursor, table):
+    cursor.execute("SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+                   "WHERE c.relname = %s AND pg_table_is_visible(c.oid)", (table,))
+    return cursor.fetchone() is not None
+
+
+def list_partitions(cursor, table):
+    """Devuelve [(nombre, inicio)] de las particiones de `table`, ordenadas por inicio."""
+    cursor.execute("SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                   "JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = %s AND pg_table_is_visible(p.oid)",
+                   (table,))
+    period = PARTITIONED_TABLES[table]["period"]
+    fmt = "%Y%m" if period == "month" else "%Y%m%d"
+    partitions = []
+    for (name,) in cursor.fetchall():
+        suffix = name.rsplit("_p", 1)[-1]
+        try:
+            partitions.append((name, datetime.strptime(suffix, fmt).date()))
+        except ValueError:
+            continue
+    return sorted(partitions, key=lambda p: p[1])
+
+
+def ensure_partitions(cursor, table, first, last):
+    """Crea las particiones que falten para cubrir [first, last]."""
+    period = PARTITIONED_TABLES[table]["period"]
+    start = _period_start(first, period)
+    last = _period_start(last, period)
+    created = 0
+    while start <= last:
+        end = _next_period(start, period)
+        cursor.execute(sql.SQL("CREATE TABLE IF NOT EXISTS {} PARTITION OF {} FOR VALUES FROM (%s) TO (%s)").format(
+            sql.Identifier(_partition_name(table, start, period)), sql.Identifier(table)), (start, end))
+        created += 1
+        start = end
+    return created
+
+
+def prepare_partitions(conn, frames):
+    """
+    Antes de cargar: crea las particiones que necesitan las filas de `frames` ({tabla: DataFrame}).
+    No hace nada si la tabla todavía no fue migrada a particionada.
+    """
+    with conn.cursor() as cursor:
+        for table, spec in PARTITIONED_TABLES.items():
+            df = frames.get(table)
+            if df is None or df.empty or not is_partitioned(cursor, table):
+                continue
+            ensure_partitions(cursor, table, df[spec["column"]].min(), df[spec["column"]].max())
+
+
+def migrate_to_partitioned(conn):
+    """
+    Convierte hourly_weather_data y weather_data en tablas particionadas conservando sus filas.
+    Es idempotente: las tablas que ya están particionadas se dejan como están.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(ROLLUP_DDL)
+        for table, spec in PARTITIONED_TABLES.items():
+            if is_partitioned(cursor, table):
+                continue
+            column = sql.Identifier(spec["column"])
+            legacy = f"{table}_legacy"
+            cursor.execute("SELECT to_regclass(%s)", (table,))
+            exists = cursor.fetchone()[0] is not None
+            if exists:
+                cursor.execute(sql.SQL("ALTER TABLE {} RENAME TO {}").format(sql.Identifier(table),
+                                                                            sql.Identifier(legacy)))
+                # El índice de la llave primaria conserva el nombre original; se renombra para que no choque
+                cursor.execute(sql.SQL("ALTER INDEX IF EXISTS {} RENAME TO {}").format(
+                    sql.Identifier(f"{table}_pkey"), sql.Identifier(f"{legacy}_pkey")))
+            cursor.execute(spec["ddl"])
+            if exists:
+                cursor.execute(sql.SQL("SELECT MIN({0}), MAX({0}) FROM {1}").format(column, sql.Identifier(legacy)))
+                first, last = cursor.fetchone()
+                if first is not None:
+                    ensure_partitions(cursor, table, first, last)
+                    columns = sql.SQL(", ").join(map(sql.Identifier, TABLES[table]["columns"]))
+                    cursor.execute(sql.SQL("INSERT INTO {} ({}) SELECT {} FROM {}").format(
+                        sql.Identifier(table), columns, columns, sql.Identifier(legacy)))
+                cursor.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(legacy)))
+            print(f"✅ '{table}' migrada a tabla particionada por {spec['period']}.")
+    conn.commit()
+
+
+def _rollup_partition(cursor, partition):
+    cursor.execute(sql.SQL("""
+        INSERT INTO hourly_weather_rollup (city, date, temp_min, temp_max, temp_mean, total_rain_mm, hours)
+        SELECT city, forecast_time::date, MIN(temp), MAX(temp), ROUND(AVG(temp)::numeric, 2),
+               COALESCE(SUM(rain_1h), 0), COUNT(*)
+        FROM {} GROUP BY city, forecast_time::date
+        ON CONFLICT (city, date) DO UPDATE SET temp_min=EXCLUDED.temp_min, temp_max=EXCLUDED.temp_max,
+            temp_mean=EXCLUDED.temp_mean, total_rain_mm=EXCLUDED.total_rain_mm, hours=EXCLUDED.hours""").format(
+        sql.Identifier(partition)))
+    return cursor.rowcount
+
+
+def apply_retention(conn, today=None, hourly_days=HOURLY_RETENTION_DAYS, daily_days=DAILY_RETENTION_DAYS):
+    """
+    Resume y borra las particiones que quedaron completas fuera de la ventana de retención.
+    Devuelve un dict {tabla: particiones borradas} y el número de filas de resumen escritas.
+    """
+    today = today or date.today()
+    cutoffs = {"hourly_weather_data": today - timedelta(days=hourly_days),
+               "weather_data": today - timedelta(days=daily_days)}
+    dropped = {table: 0 for table in PARTITIONED_TABLES}
+    rolled_up = 0
+    with conn.cursor() as cursor:
+        cursor.execute(ROLLUP_DDL)
+        for table, spec in PARTITIONED_TABLES.items():
+            for name, start in list_partitions(cursor, table):
+                if _next_period(start, spec["period"]) > cutoffs[table]:
+                    break
+                if table == "hourly_weather_data":
+                    rolled_up += _rollup_partition(cursor, name)
+                cursor.execute(sql.SQL("ALTER TABLE {} DETACH PARTITION {}").format(sql.Identifier(table),
+                                                                                   sql.Identifier(name)))
+                cursor.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(name)))
+                dropped[table] += 1
+    conn.commit()
+    return dropped, rolled_up
+
+
+if __name__ == "__main__":
+    from Weather_extract import connect_db
+
+    parser = argparse.ArgumentParser(description="Particionado, retención y resumen de las tablas del clima.")
+    parser.add_argument("--migrate", action="store_true", help="Convierte las tablas existentes a particionadas.")
+    parser.add_argument("--retention", action="store_true", help="Resume y borra las particiones vencidas.")
+    args = parser.parse_args()
+
+    db_conn = connect_db()
+    if db_conn:
+        try:
+            if args.migrate:
+                migrate_to_partitioned(db_conn)
+            if args.retention:
+                dropped, rolled_up = apply_retention(db_conn)
+                print(f"✅ Retención aplicada: {dropped} particiones borradas, {rolled_up} filas de resumen.")
+        finally:
+            db_conn.close()
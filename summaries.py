@@ -0,0 +1,115 @@
+import argparse
+
+# Tablas de resumen que el extractor materializa después de cada carga, para que el dashboard
+# las lea tal cual en vez de recalcular sobre el frame diario completo en cada rerun:
+#  - weather_group_summary: agregados por fecha × país × equipo × cluster
+#  - weather_rankings: top-N de ciudades por lluvia, UV, viento y calor para cada combinación
+# En ambas, 'All' en country_code/team/cluster significa "sin filtrar por esa columna", de modo que
+# cada combinación de filtros del dashboard es una sola fila (o N filas) por llave.
+
+SUMMARY_PAST_DAYS = 7  # Días hacia atrás que se resumen; las fechas futuras se resumen todas
+RANKING_TOP_N = 10
+RAINY_PROBABILITY = 60  # Una ciudad cuenta como lluviosa desde esta probabilidad de lluvia (%)
+# Grupo de las ciudades sin fila (o con nulos) en city_team_cluster: igual que el merge izquierdo del
+# dashboard, cuentan en los alcances 'All' en vez de quedar fuera de los resúmenes
+UNASSIGNED = "Unassigned"
+
+# Métrica del ranking y expresión con la que se ordena (mayor = más riesgo)
+RANKING_METRICS = {
+    "rain": "rain_probability",
+    "uv": "uvi",
+    "wind": "wind_speed",
+    "heat": "temp_max",
+}
+
+SUMMARY_DDL = """CREATE TABLE IF NOT EXISTS weather_group_summary (
+    date DATE NOT NULL, country_code TEXT NOT NULL, team TEXT NOT NULL, cluster TEXT NOT NULL,
+    cities INTEGER, rainy_cities INTEGER, temp_min REAL, temp_max REAL, temp_mean REAL,
+    rain_probability_mean REAL, rain_probability_max REAL, total_rain_mm REAL, uvi_max REAL, wind_speed_max REAL,
+    PRIMARY KEY (date, country_code, team, cluster))"""
+
+RANKINGS_DDL = """CREATE TABLE IF NOT EXISTS weather_rankings (
+    date DATE NOT NULL, country_code TEXT NOT NULL, team TEXT NOT NULL, cluster TEXT NOT NULL,
+    metric TEXT NOT NULL, rank SMALLINT NOT NULL, city TEXT NOT NULL, value REAL,
+    PRIMARY KEY (date, country_code, team, cluster, metric, rank))"""
+
+# Filas diarias con su país/equipo/cluster, una copia por cada combinación de filtros que las incluye
+_SCOPED = f"""
+    WITH base AS (
+        SELECT w.date, w.city, w.temp, w.temp_min, w.temp_max, w.rain_probability, w.total_rain_mm, w.uvi,
+               w.wind_speed, COALESCE(c.country_code, '{UNASSIGNED}') AS country_code,
+               COALESCE(c.team, '{UNASSIGNED}') AS team, COALESCE(c.cluster, '{UNASSIGNED}') AS cluster
+        FROM weather_data w LEFT JOIN city_team_cluster c ON c.city = w.city
+        WHERE w.date >= CURRENT_DATE - {SUMMARY_PAST_DAYS}
+    )
+    SELECT b.*, s.country_scope, s.team_scope, s.cluster_scope
+    FROM base b CROSS JOIN LATERAL (VALUES
+        ('All', 'All', 'All'), (b.country_code, 'All', 'All'), ('All', b.team, 'All'), ('All', 'All', b.cluster),
+        (b.country_code, b.team, 'All'), (b.country_code, 'All', b.cluster), ('All', b.team, b.cluster),
+        (b.country_code, b.team, b.cluster)) AS s(country_scope, team_scope, cluster_scope)"""
+
+SUMMARY_INSERT = f"""
+    INSERT INTO weather_group_summary
+    SELECT date, country_scope, team_scope, cluster_scope, COUNT(*),
+           COUNT(*) FILTER (WHERE rain_probability >= {RAINY_PROBABILITY}), MIN(temp_min), MAX(temp_max),
+           ROUND(AVG(temp)::numeric, 2), ROUND(AVG(rain_probability)::numeric, 2), MAX(rain_probability),
+           ROUND(COALESCE(SUM(total_rain_mm), 0)::numeric, 2), MAX(uvi), MAX(wind_speed)
+    FROM ({_SCOPED}) scoped
+    GROUP BY date, country_scope, team_scope, cluster_scope"""
+
+_METRIC_VALUES = ", ".join(f"('{metric}', {column})" for metric, column in RANKING_METRICS.items())
+
+RANKINGS_INSERT = f"""
+    INSERT INTO weather_rankings
+    SELECT date, country_scope, team_scope, cluster_scope, metric, rank, city, value
+    FROM (
+        SELECT scoped.date, scoped.country_scope, scoped.team_scope, scoped.cluster_scope, m.metric, scoped.city,
+               m.value, ROW_NUMBER() OVER (
+                   PARTITION BY scoped.date, scoped.country_scope, scoped.team_scope, scoped.cluster_scope, m.metric
+                   ORDER BY m.value DESC NULLS LAST, scoped.city) AS rank
+        FROM ({_SCOPED}) scoped CROSS JOIN LATERAL (VALUES {_METRIC_VALUES}) AS m(metric, value)
+    ) ranked
+    WHERE rank <= %(top_n)s"""
+
+
+def ensure_summary_tables(conn):
+    """
+    Crea las tablas de resumen si no existen, en su propia transacción: si después falla el recálculo,
+    el rollback no se lleva las tablas y la lectura del snapshot las encuentra (vacías o con la corrida anterior).
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(SUMMARY_DDL)
+        cursor.execute(RANKINGS_DDL)
+    conn.commit()
+
+
+def refresh_summaries(conn, top_n=RANKING_TOP_N):
+    """
+    Recalcula weather_group_summary y weather_rankings desde weather_data en una sola transacción,
+    así el dashboard nunca lee una mezcla de la corrida anterior y la nueva. Devuelve las filas escritas.
+    """
+    ensure_summary_tables(conn)
+    with conn.cursor() as cursor:
+        cursor.execute("DELETE FROM weather_group_summary")
+        cursor.execute(SUMMARY_INSERT)
+        summary_rows = cursor.rowcount
+        cursor.execute("DELETE FROM weather_rankings")
+        cursor.execute(RANKINGS_INSERT, {"top_n": top_n})
+        ranking_rows = cursor.rowcount
+    conn.commit()
+    return {"weather_group_summary": summary_rows, "weather_rankings": ranking_rows}
+
+
+if __name__ == "__main__":
+    from Weather_extract import connect_db
+
+    parser = argparse.ArgumentParser(description="Recalcula las tablas de resumen y rankings del clima.")
+    parser.add_argument("--top", type=int, default=RANKING_TOP_N, help="Ciudades por ranking.")
+    args = parser.parse_args()
+
+    db_conn = connect_db()
+    if db_conn:
+        try:
+            print(f"✅ Resúmenes recalculados: {refresh_summaries(db_conn, args.top)}")
+        finally:
+            db_conn.close()
@@ -0,0 +1,138 @@
+import numpy as np
+import pandas as pd
+from datetime import datetime
+
+# Etapa de transformación: payloads One Call -> DataFrames columnares listos para bulk_loader.
+# Se recorre cada payload una sola vez acumulando listas por columna; el redondeo, la conversión
+# de unidades (m/s -> km/h, pop -> %) y la conversión de timestamps se hacen vectorizadas por lote.
+
+HOURLY_FIELDS = ["city", "dt", "temp", "feels_like", "humidity", "weather_condition", "main_condition", "pop",
+                 "rain_1h", "wind_speed"]
+ALERT_FIELDS = ["city", "event", "start", "end", "description", "sender_name"]
+DAILY_FIELDS = ["city", "dt", "temp", "feels_like", "humidity", "summary", "main_condition", "pop", "wind_speed",
+                "rain", "temp_max", "temp_min", "uvi", "sunrise", "sunset"]
+
+
+def _to_datetime(values):
+    # Epoch (UTC) -> datetime naive en UTC, que es como el dashboard interpreta las columnas
+    return pd.to_datetime(np.asarray(values, dtype="int64"), unit="s")
+
+
+def _rounded(values, factor=1.0):
+    return np.round(np.asarray(values, dtype="float64") * factor, 2)
+
+
+def _hourly_frame(cols, fetched_at):
+    return pd.DataFrame({
+        "city": cols["city"],
+        "forecast_time": _to_datetime(cols["dt"]),
+        "temp": _rounded(cols["temp"]),
+        "feels_like": _rounded(cols["feels_like"]),
+        "humidity": _rounded(cols["humidity"]),
+        "weather_condition": cols["weather_condition"],
+        "main_condition": cols["main_condition"],
+        "rain_probability": _rounded(cols["pop"], 100),
+        "rain_1h": np.asarray(cols["rain_1h"], dtype="float64"),
+        "wind_speed": _rounded(cols["wind_speed"], 3.6),
+        "fetched_at": fetched_at,
+    })
+
+
+def _alerts_frame(cols, fetched_at):
+    return pd.DataFrame({
+        "city": cols["city"],
+        "event": cols["event"],
+        "start_time": _to_datetime(cols["start"]),
+        "end_time": _to_datetime(cols["end"]),
+        "description": cols["description"],
+        "sender_name": cols["sender_name"],
+        "fetched_at": fetched_at,
+    })
+
+
+def _daily_frame(cols, fetched_at):
+    return pd.DataFrame({
+        "date": _to_datetime(cols["dt"]).date,
+        "city": cols["city"],
+        "temp": _rounded(cols["temp"]),
+        "feels_like": _rounded(cols["feels_like"]),
+        "humidity": np.asarray(cols["humidity"], dtype="float64"),
+        "weather_condition": pd.Series(cols["summary"], dtype="object").str.capitalize(),
+        "main_condition": cols["main_condition"],
+        "rain_probability": _rounded(cols["pop"], 100),
+        "wind_speed": _rounded(cols["wind_speed"], 3.6),
+        "fetched_at": fetched_at,
+        "total_rain_mm": np.asarray(cols["rain"], dtype="float64"),
+        "temp_max": _rounded(cols["temp_max"]),
+        "temp_min": _rounded(cols["temp_min"]),
+        "uvi": np.asarray(cols["uvi"], dtype="float64"),
+        "sunrise": _to_datetime(cols["sunrise"]),
+        "sunset": _to_datetime(cols["sunset"]),
+    })
+
+
+def _collect(city, data, hourly, alerts, daily):
+    for h in data.get('hourly', ()):
+        weather = h['weather'][0]
+        hourly["city"].append(city)
+        hourly["dt"].append(h['dt'])
+        hourly["temp"].append(h.get('temp', 0))
+        hourly["feels_like"].append(h.get('feels_like', 0))
+        hourly["humidity"].append(h.get('humidity', 0))
+        hourly["weather_condition"].append(weather.get('description', ''))
+        hourly["main_condition"].append(weather.get('main', ''))
+        hourly["pop"].append(h.get('pop', 0))
+        hourly["rain_1h"].append(h.get('rain', {}).get('1h', 0))
+        hourly["wind_speed"].append(h.get('wind_speed', 0))
+    for a in data.get('alerts', ()):
+        alerts["city"].append(city)
+        alerts["event"].append(a.get('event', 'Alerta'))
+        alerts["start"].append(a['start'])
+        alerts["end"].append(a['end'])
+        alerts["description"].append(a.get('description', ''))
+        alerts["sender_name"].append(a.get('sender_name', 'Fuente desconocida'))
+    for d in data.get('daily', ()):
+        weather = d['weather'][0]
+        daily["city"].append(city)
+        daily["dt"].append(d['dt'])
+        daily["temp"].append(d['temp'].get('day', 0))
+        daily["feels_like"].append(d['feels_like'].get('day', 0))
+        daily["humidity"].append(d.get('humidity', 0))
+        daily["summary"].append(d.get('summary', weather.get('description', '')))
+        daily["main_condition"].append(weather.get('main', ''))
+        daily["pop"].append(d.get('pop', 0))
+        daily["wind_speed"].append(d.get('wind_speed', 0))
+        daily["rain"].append(d.get('rain', 0))
+        daily["temp_max"].append(d['temp'].get('max', 0))
+        daily["temp_min"].append(d['temp'].get('min', 0))
+        daily["uvi"].append(d.get('uvi', 0))
+        daily["sunrise"].append(d.get('sunrise', 0))
+        daily["sunset"].append(d.get('sunset', 0))
+
+
+def iter_frames(results, fetched_at=None, batch_size=50):
+    """
+    Generador: consume (city, data) y entrega cada `batch_size` ciudades un dict
+    {tabla: DataFrame} con las filas de hourly_weather_data, weather_alerts y weather_data.
+    Todas las filas de la corrida comparten el mismo `fetched_at`.
+    """
+    fetched_at = fetched_at or datetime.now()
+    pending = 0
+    hourly, alerts, daily = ({f: [] for f in fields} for fields in (HOURLY_FIELDS, ALERT_FIELDS, DAILY_FIELDS))
+    for city, data in results:
+        if not data:
+            continue
+        _collect(city, data, hourly, alerts, daily)
+        pending += 1
+        if pending >= batch_size:
+            yield _frames(hourly, alerts, daily, fetched_at)
+            pending = 0
+            hourly, alerts, daily = ({f: [] for f in fields} for fields in (HOURLY_FIELDS, ALERT_FIELDS, DAILY_FIELDS))
+    if pending:
+        yield _frames(hourly, alerts, daily, fetched_at)
+
+
+def _frames(hourly, alerts, daily, fetched_at):
+    return {"hourly_weather_data": _hourly_frame(hourly, fetched_at),
+            "weather_alerts": _alerts_frame(alerts, fetched_at),
+            "weather_data": _daily_frame(daily, fetched_at)}